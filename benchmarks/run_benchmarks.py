@@ -1,20 +1,45 @@
 """Run benchmark suite against different python libraries"""
 
-from typing import Any
+from typing import Any, Dict, List, Optional, Sequence
+import argparse
 import difflib
+import fnmatch
+import functools
+import gc
+import importlib.util
 import json
+import math
 from pathlib import Path
-from timeit import timeit
+import platform
+import statistics
+import sys
+import sysconfig
+import threading
+from timeit import Timer
+import time
+import tracemalloc
 import chevron
 import moosetash
+from moosetash.template import LAMBDA_CACHE, PARTIAL_CACHE
+from moosetash.tokenizer import TOKEN_CACHE
 
 DEFAULT_SAMPLES = 10000
+DEFAULT_REPEATS = 5
+DEFAULT_WARMUP = 100
+# Renders timed together, so the timer's overhead stays small while the spread of times is kept
+DEFAULT_BATCH_SIZE = 10
+DEFAULT_THRESHOLD = 0.05
+DEFAULT_MEMORY_SAMPLES = 100
+DEFAULT_DISTINCT_TEMPLATES = 5000
+DEFAULT_CHECKPOINT = 1000
+DEFAULT_THREAD_SAMPLES = 2000
+DEFAULT_THREADS = [1, 2, 4, 8]
 BENCHMARK_FOLDER = Path(__file__).parent / 'templates'
 
 
 def moosetash_test(template: str, context: Any):
     """Basic moostash rendering"""
-    return moosetash.render(template, context)
+    return moosetash.render(template, context, cache_tokens=False)
 
 
 def moosetash_test_fast(template: str, context: Any):
@@ -22,6 +47,30 @@ def moosetash_test_fast(template: str, context: Any):
     return moosetash.render(template, context, cache_tokens=True)
 
 
+# Compiled templates are held in caches bounded like moosetash's own, so the distinct_templates
+# memory benchmark shows the memory an application keeping compiled templates would retain
+@functools.lru_cache(maxsize=1024)
+def moosetash_compiled(template: str) -> moosetash.Template:
+    """Compile a template once per benchmark"""
+    return moosetash.compile(template)
+
+
+@functools.lru_cache(maxsize=1024)
+def moosetash_compiled_python(template: str) -> moosetash.PythonTemplate:
+    """Compile a template to Python once per benchmark"""
+    return moosetash.compile_python(template)
+
+
+def moosetash_test_compiled(template: str, context: Any):
+    """Compiled moostash rendering"""
+    return moosetash_compiled(template).render(context)
+
+
+def moosetash_test_python(template: str, context: Any):
+    """Moostash rendering with a generated Python function"""
+    return moosetash_compiled_python(template).render(context)
+
+
 def chevron_test(template: str, context: Any):
     """Chevron rendering"""
     return chevron.render(template, context)
@@ -30,10 +79,52 @@ def chevron_test(template: str, context: Any):
 TESTS = [
     ('Moostash', moosetash_test),
     ('Moostash [Tokens Cached]', moosetash_test_fast),
+    ('Moostash [Compiled]', moosetash_test_compiled),
+    ('Moostash [Python Codegen]', moosetash_test_python),
     ('Chevron', chevron_test),
 ]
 
 
+# moosetash's caches, by the name reported in memory benchmarks
+CACHES = {
+    'token_cache': TOKEN_CACHE,
+    'partial_cache': PARTIAL_CACHE,
+    'lambda_cache': LAMBDA_CACHE,
+}
+
+# The name of the memory benchmark scenario rendering many different templates
+DISTINCT_TEMPLATES = 'distinct_templates'
+
+
+def matches(name: str, patterns: Optional[List[str]]) -> bool:
+    """Whether a scenario or library name matches any of a list of glob patterns, if given"""
+    return not patterns or any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+def environment() -> Dict[str, Any]:
+    """The versions benchmarks were run with"""
+    return {
+        'moosetash': moosetash.__version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'free_threaded': bool(sysconfig.get_config_var('Py_GIL_DISABLED')),
+        # Free-threaded builds can still run with the GIL enabled, such as with PYTHON_GIL=1
+        'gil_enabled': getattr(sys, '_is_gil_enabled', lambda: True)(),
+    }
+
+
+def load_context_module(path: Path) -> Any:
+    """Build a benchmark context with the context() function of a Python module, for contexts
+    that can't be expressed in JSON, such as objects"""
+    spec = importlib.util.spec_from_file_location(f'benchmark_{path.stem}', path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f'Cannot load benchmark context from {path}')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.context()
+
+
 def get_benchmarks():
     benchmarks = []
     for file in BENCHMARK_FOLDER.glob('*.mustache'):
@@ -41,12 +132,15 @@ def get_benchmarks():
             template = template_file.read()
 
         context_file_path = BENCHMARK_FOLDER / f'{file.stem}.json'
+        context_module_path = BENCHMARK_FOLDER / f'{file.stem}.py'
         output_file_path = BENCHMARK_FOLDER / f'{file.stem}.txt'
 
         context = {}
         if context_file_path.is_file():
             with open(context_file_path, 'r') as context_file:
                 context = json.load(context_file)
+        elif context_module_path.is_file():
+            context = load_context_module(context_module_path)
 
         if not output_file_path.is_file():
             raise FileNotFoundError(f'No output file found at {output_file_path}')
@@ -57,42 +151,518 @@ def get_benchmarks():
     return benchmarks
 
 
-def run_benchmarks(samples: int):
-    """Run the benchmark suite for each library"""
+def check_output(lib_name: str, name: str, rendered: str, expected: str):
+    """Raise ValueError, printing a diff, if a library rendered a benchmark incorrectly"""
+    if rendered == expected:
+        return
+
+    print(repr(rendered))
+    print(repr(expected))
+    raw_diff = difflib.Differ().compare(expected.splitlines(), rendered.splitlines())
+    content_diff = [item for item in raw_diff if item and item[0] in ['-', '+', '?']]
+    for line in content_diff:
+        print(line)
+    raise ValueError(f'Unexpected output from lib {lib_name} for benchmark {name}')
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """The nearest-rank percentile of a list of values"""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def time_renders(
+    test: Any, samples: int, repeats: int, warmup: int, batch_size: int = DEFAULT_BATCH_SIZE
+) -> Dict[str, float]:
+    """Time repeats runs of samples renders, after warmup untimed renders
+
+    Each run is timed in small batches of batch_size renders, so the minimum, median and 95th
+    percentile are taken over the time per render of every batch, rather than over the mean of
+    each run. Times are per render, in seconds, so results with different numbers of samples
+    compare.
+    """
+    for _ in range(warmup):
+        test()
+
+    timer = Timer(test)
+    batches = max(samples // batch_size, 1)
+    times: List[float] = []
+    for _ in range(repeats):
+        batch_times = timer.repeat(repeat=batches, number=batch_size)
+        times.extend(batch / batch_size for batch in batch_times)
+
+    median = statistics.median(times)
+    return {
+        'min': min(times),
+        'median': median,
+        'p95': percentile(times, 0.95),
+        'renders_per_second': 1 / median if median else math.inf,
+    }
+
+
+def run_benchmarks(
+    samples: int = DEFAULT_SAMPLES,
+    repeats: int = DEFAULT_REPEATS,
+    warmup: int = DEFAULT_WARMUP,
+    scenarios: Optional[List[str]] = None,
+    libraries: Optional[List[str]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Dict[str, Any]:
+    """Run the benchmark suite for each library, returning the results of each scenario
+
+    Scenarios and libraries can be filtered by glob patterns of their names.
+    """
+
+    tests = [(lib_name, test_func) for lib_name, test_func in TESTS if matches(lib_name, libraries)]
+    max_lib_name = max((len(name) for name, _ in tests), default=0)
+    results: Dict[str, Any] = {}
 
-    max_lib_name = max(len(name) for name, _ in TESTS)
     for name, template, context, expected in get_benchmarks():
+        if not matches(name, scenarios):
+            continue
+
         print(f'Benchmark {name}:')
-        for lib_name, test_func in TESTS:
+        results[name] = {}
+        for lib_name, test_func in tests:
             print(f'\t{lib_name}:', end='', flush=True)
 
-            def test(
-                test_func=test_func,
-                template=template,
-                context=context,
-                expected=expected,
-                lib_name=lib_name,
-                name=name,
-            ):
-                rendered = test_func(template, context)
-                if rendered != expected:
-                    print(repr(rendered))
-                    print(repr(expected))
-                    raw_diff = difflib.Differ().compare(
-                        expected.splitlines(), rendered.splitlines()
-                    )
-                    content_diff = [
-                        item for item in raw_diff if item and item[0] in ['-', '+', '?']
-                    ]
-                    for line in content_diff:
-                        print(line)
-                    raise ValueError(f'Unexpected output from lib {lib_name} for benchmark {name}')
-
-            time = timeit(test, number=samples)
-
-            print(' ' * (max_lib_name - len(lib_name)), 'Time:', round(time, 3))
+            rendered = test_func(template, context)
+            check_output(lib_name, name, rendered, expected)
+
+            result = time_renders(
+                functools.partial(test_func, template, context),
+                samples,
+                repeats,
+                warmup,
+                batch_size,
+            )
+            result['output_bytes'] = len(rendered.encode('utf-8'))
+            results[name][lib_name] = result
+
+            print(
+                ' ' * (max_lib_name - len(lib_name)),
+                f'Median: {result["median"] * 1e6:10.2f}us',
+                f'p95: {result["p95"] * 1e6:10.2f}us',
+                f'Renders/s: {result["renders_per_second"]:12.1f}',
+            )
+
+    return {
+        'environment': environment(),
+        'settings': {
+            'samples': samples,
+            'repeats': repeats,
+            'warmup': warmup,
+            'batch_size': batch_size,
+        },
+        'scenarios': results,
+    }
+
+
+def clear_caches():
+    """Empty moosetash's caches, and the compiled templates held by the benchmarks"""
+    for cache in CACHES.values():
+        cache.clear()
+    moosetash_compiled.cache_clear()
+    moosetash_compiled_python.cache_clear()
+    gc.collect()
+
+
+def cache_sizes() -> Dict[str, Dict[str, int]]:
+    """The number of entries in each of moosetash's caches, and their estimated size in bytes"""
+    sizes = {}
+    for name, cache in CACHES.items():
+        info = cache.cache_info()
+        sizes[name] = {'entries': info.currsize, 'estimated_bytes': info.currbytes}
+    return sizes
+
+
+def measure_memory(test: Any, samples: int) -> Dict[str, Any]:
+    """Measure the memory allocated while rendering samples times, starting with empty caches
+
+    The peak is the most memory in use at once above the starting point, including the
+    intermediate strings of a render. Net memory is what is still retained after the renders,
+    such as cache entries.
+    """
+    clear_caches()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        for _ in range(samples):
+            test()
+        peak = tracemalloc.get_traced_memory()[1]
+        gc.collect()
+        end = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    return {'peak_bytes': peak - start, 'net_bytes': end - start, 'caches': cache_sizes()}
+
+
+def distinct_template(index: int) -> str:
+    """A template that differs from every other index, as with user supplied templates"""
+    return (
+        f'<h1>{{{{title}}}} #{index}</h1>\n<ul>{{{{#items}}}}<li>{{{{name}}}} '
+        f'({index})</li>{{{{/items}}}}</ul>\n'
+    )
+
+
+DISTINCT_CONTEXT = {'title': 'Distinct', 'items': [{'name': 'one'}, {'name': 'two'}]}
+
+
+def measure_distinct_templates(test: Any, count: int, checkpoint: int) -> List[Dict[str, Any]]:
+    """Render count different templates, recording the memory retained every checkpoint renders
+
+    Retained memory levels off once the caches are full, if they are bounded.
+    """
+    clear_caches()
+    checkpoints = []
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        for index in range(1, count + 1):
+            test(distinct_template(index), DISTINCT_CONTEXT)
+            if index % checkpoint == 0 or index == count:
+                gc.collect()
+                current, peak = tracemalloc.get_traced_memory()
+                checkpoints.append(
+                    {
+                        'templates': index,
+                        'net_bytes': current - start,
+                        'peak_bytes': peak - start,
+                        'caches': cache_sizes(),
+                    }
+                )
+    finally:
+        tracemalloc.stop()
+    return checkpoints
+
+
+def run_memory_benchmarks(
+    samples: int = DEFAULT_MEMORY_SAMPLES,
+    distinct_templates: int = DEFAULT_DISTINCT_TEMPLATES,
+    checkpoint: int = DEFAULT_CHECKPOINT,
+    scenarios: Optional[List[str]] = None,
+    libraries: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Measure peak and retained memory for each scenario and library, and the memory retained
+    while rendering many distinct templates"""
+
+    tests = [(lib_name, test_func) for lib_name, test_func in TESTS if matches(lib_name, libraries)]
+    max_lib_name = max((len(name) for name, _ in tests), default=0)
+    results: Dict[str, Any] = {}
+
+    for name, template, context, expected in get_benchmarks():
+        if not matches(name, scenarios):
+            continue
+
+        print(f'Benchmark {name}:')
+        results[name] = {}
+        for lib_name, test_func in tests:
+            print(f'\t{lib_name}:', end='', flush=True)
+            check_output(lib_name, name, test_func(template, context), expected)
+
+            result = measure_memory(functools.partial(test_func, template, context), samples)
+            results[name][lib_name] = result
+            print(
+                ' ' * (max_lib_name - len(lib_name)),
+                f'Peak: {result["peak_bytes"] / 1024:10.1f}KiB',
+                f'Net: {result["net_bytes"] / 1024:10.1f}KiB',
+            )
+
+    distinct: Dict[str, Any] = {}
+    if matches(DISTINCT_TEMPLATES, scenarios):
+        print(f'Benchmark {DISTINCT_TEMPLATES}:')
+        for lib_name, test_func in tests:
+            print(f'\t{lib_name}:', end='', flush=True)
+            checkpoints = measure_distinct_templates(test_func, distinct_templates, checkpoint)
+            distinct[lib_name] = checkpoints
+            print(
+                ' ' * (max_lib_name - len(lib_name)),
+                'Net:',
+                ', '.join(f'{point["net_bytes"] / 1024:.0f}KiB' for point in checkpoints),
+            )
+
+    return {
+        'environment': environment(),
+        'settings': {
+            'samples': samples,
+            'distinct_templates': distinct_templates,
+            'checkpoint': checkpoint,
+        },
+        'scenarios': results,
+        DISTINCT_TEMPLATES: distinct,
+    }
+
+
+def measure_threads(test: Any, threads: int, samples: int, repeats: int) -> Dict[str, float]:
+    """Time threads threads rendering samples times each, all started together
+
+    Throughput is total renders per second of wall clock time, from the best of repeats runs.
+    """
+
+    def worker(barrier: threading.Barrier):
+        barrier.wait()
+        for _ in range(samples):
+            test()
+
+    best = math.inf
+    for _ in range(repeats):
+        barrier = threading.Barrier(threads + 1)
+        workers = [threading.Thread(target=worker, args=(barrier,)) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        best = min(best, time.perf_counter() - start)
+
+    return {
+        'seconds': best,
+        'renders_per_second': threads * samples / best if best else math.inf,
+    }
+
+
+def run_thread_benchmarks(
+    samples: int = DEFAULT_THREAD_SAMPLES,
+    repeats: int = DEFAULT_REPEATS,
+    warmup: int = DEFAULT_WARMUP,
+    thread_counts: Sequence[int] = tuple(DEFAULT_THREADS),
+    scenarios: Optional[List[str]] = None,
+    libraries: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Measure the throughput of each scenario and library with several threads rendering at
+    once, sharing compiled templates and caches
+
+    Scaling is the throughput relative to the fewest threads. With the GIL, it stays around 1;
+    free-threaded builds of Python can scale with the number of cores.
+    """
+
+    tests = [(lib_name, test_func) for lib_name, test_func in TESTS if matches(lib_name, libraries)]
+    max_lib_name = max((len(name) for name, _ in tests), default=0)
+    thread_counts = sorted(thread_counts)
+    results: Dict[str, Any] = {}
+
+    for name, template, context, expected in get_benchmarks():
+        if not matches(name, scenarios):
+            continue
+
+        print(f'Benchmark {name}:')
+        results[name] = {}
+        for lib_name, test_func in tests:
+            print(f'\t{lib_name}:', end='', flush=True)
+            check_output(lib_name, name, test_func(template, context), expected)
+
+            test = functools.partial(test_func, template, context)
+            for _ in range(warmup):
+                test()
+
+            by_threads: Dict[str, Dict[str, float]] = {}
+            for threads in thread_counts:
+                result = measure_threads(test, threads, samples, repeats)
+                result['scaling'] = (
+                    result['renders_per_second']
+                    / by_threads[str(thread_counts[0])]['renders_per_second']
+                    if by_threads
+                    else 1.0
+                )
+                by_threads[str(threads)] = result
+            results[name][lib_name] = by_threads
+
+            print(
+                ' ' * (max_lib_name - len(lib_name)),
+                '  '.join(
+                    f'{threads} threads: {result["renders_per_second"]:10.1f}/s '
+                    f'({result["scaling"]:.2f}x)'
+                    for threads, result in by_threads.items()
+                ),
+            )
+
+    return {
+        'environment': environment(),
+        'settings': {
+            'samples': samples,
+            'repeats': repeats,
+            'warmup': warmup,
+            'threads': thread_counts,
+        },
+        'scenarios': results,
+    }
+
+
+def parse_thread_counts(thread_counts: str) -> List[int]:
+    """Parse a comma separated list of thread counts, such as 1,2,4,8"""
+    counts = [int(count) for count in thread_counts.split(',')]
+    if not counts or min(counts) < 1:
+        raise ValueError(f'Invalid thread counts "{thread_counts}"')
+    return counts
+
+
+def parse_threshold(threshold: str) -> float:
+    """Parse a regression threshold given as a percentage, such as "5%", or a fraction"""
+    if threshold.endswith('%'):
+        return float(threshold[:-1]) / 100
+    return float(threshold)
+
+
+def compare_results(
+    results: Dict[str, Any], baseline: Dict[str, Any], threshold: float
+) -> List[str]:
+    """Compare median render times with a baseline, returning a description of each regression
+
+    A regression is a scenario and library whose median is more than threshold (a fraction)
+    slower than in the baseline. Scenarios and libraries missing from either are skipped.
+    """
+    regressions = []
+    for name, libraries in results['scenarios'].items():
+        for lib_name, result in libraries.items():
+            baseline_result = baseline['scenarios'].get(name, {}).get(lib_name)
+            if baseline_result is None:
+                continue
+
+            change = result['median'] / baseline_result['median'] - 1
+            status = 'REGRESSION' if change > threshold else 'ok'
+            print(f'{name} / {lib_name}: {change:+.1%} {status}')
+            if change > threshold:
+                regressions.append(f'{name} / {lib_name} is {change:.1%} slower than the baseline')
+    return regressions
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the parser for the benchmark command"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '-k',
+        '--filter',
+        action='append',
+        dest='scenarios',
+        help='Only run scenarios matching this glob pattern (can be repeated)',
+    )
+    parser.add_argument(
+        '-l',
+        '--library',
+        action='append',
+        dest='libraries',
+        help='Only benchmark libraries matching this glob pattern (can be repeated)',
+    )
+    parser.add_argument(
+        '-n',
+        '--samples',
+        type=int,
+        help=f'Renders timed per repeat (default: {DEFAULT_SAMPLES}), measured in memory '
+        f'mode (default: {DEFAULT_MEMORY_SAMPLES}), or per thread in threads mode '
+        f'(default: {DEFAULT_THREAD_SAMPLES})',
+    )
+    parser.add_argument(
+        '-r', '--repeats', type=int, default=DEFAULT_REPEATS, help='Number of timed repeats'
+    )
+    parser.add_argument(
+        '-w',
+        '--warmup',
+        type=int,
+        default=DEFAULT_WARMUP,
+        help='Untimed renders before timing each library',
+    )
+    parser.add_argument(
+        '-b',
+        '--batch-size',
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help='Renders timed together, whose mean time is one sample of the distribution '
+        f'(default: {DEFAULT_BATCH_SIZE})',
+    )
+    parser.add_argument(
+        '-m',
+        '--memory',
+        action='store_true',
+        help='Measure peak and retained memory with tracemalloc, instead of timing',
+    )
+    parser.add_argument(
+        '--distinct-templates',
+        type=int,
+        default=DEFAULT_DISTINCT_TEMPLATES,
+        help='Templates rendered by the distinct_templates memory scenario',
+    )
+    parser.add_argument(
+        '--checkpoint',
+        type=int,
+        default=DEFAULT_CHECKPOINT,
+        help='Record retained memory every this many distinct templates',
+    )
+    parser.add_argument(
+        '-t',
+        '--threads',
+        type=parse_thread_counts,
+        nargs='?',
+        const=DEFAULT_THREADS,
+        help='Measure throughput with several threads rendering at once, for a comma separated '
+        'list of thread counts (default: 1,2,4,8)',
+    )
+    parser.add_argument('-o', '--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Compare the results with a baseline JSON file')
+    parser.add_argument(
+        '--threshold',
+        type=parse_threshold,
+        default=DEFAULT_THRESHOLD,
+        help='Slowdown of the median counted as a regression, such as 5%% (default: 5%%)',
+    )
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Run the benchmarks, returning a non-zero exit status if there are regressions"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.memory and args.threads:
+        parser.error('--memory and --threads can\'t be used together')
+
+    if args.compare and (args.memory or args.threads):
+        parser.error('--compare compares timings, and can\'t be used with --memory or --threads')
+
+    if args.threads:
+        results = run_thread_benchmarks(
+            samples=args.samples or DEFAULT_THREAD_SAMPLES,
+            repeats=args.repeats,
+            warmup=args.warmup,
+            thread_counts=args.threads,
+            scenarios=args.scenarios,
+            libraries=args.libraries,
+        )
+    elif args.memory:
+        results = run_memory_benchmarks(
+            samples=args.samples or DEFAULT_MEMORY_SAMPLES,
+            distinct_templates=args.distinct_templates,
+            checkpoint=args.checkpoint,
+            scenarios=args.scenarios,
+            libraries=args.libraries,
+        )
+    else:
+        results = run_benchmarks(
+            samples=args.samples or DEFAULT_SAMPLES,
+            repeats=args.repeats,
+            warmup=args.warmup,
+            scenarios=args.scenarios,
+            libraries=args.libraries,
+            batch_size=args.batch_size,
+        )
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r') as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare_results(results, baseline, args.threshold)
+        for regression in regressions:
+            print(regression, file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
 
 
 def run():
     """Run all the benchmarks against all the libraries"""
-    run_benchmarks(DEFAULT_SAMPLES)
+    sys.exit(main())
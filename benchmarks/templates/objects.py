@@ -0,0 +1,61 @@
+"""Context for the objects benchmark: nested dataclasses, __slots__ objects and named tuples"""
+from dataclasses import dataclass
+from typing import List, NamedTuple
+
+
+class Price(NamedTuple):
+    amount: str
+    currency: str
+
+
+class Person:
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+@dataclass
+class Product:
+    sku: str
+    name: str
+    price: Price
+    on_sale: bool
+
+
+@dataclass
+class Department:
+    name: str
+    manager: Person
+    products: List[Product]
+
+
+@dataclass
+class Store:
+    name: str
+    departments: List[Department]
+
+
+def context():
+    """Build the benchmark context"""
+    return {
+        'store': Store(
+            name='Moose Mart',
+            departments=[
+                Department(
+                    name=f'Department {department}',
+                    manager=Person(f'Manager {department}'),
+                    products=[
+                        Product(
+                            sku=f'{department}-{product}',
+                            name=f'Product {product}',
+                            price=Price(f'{product}.99', 'GBP'),
+                            on_sale=product % 3 == 0,
+                        )
+                        for product in range(10)
+                    ],
+                )
+                for department in range(5)
+            ],
+        )
+    }
@@ -1,4 +1,14 @@
 """Moostash - a Python Mustache template renderer"""
+from .context import MISSING, register_accessor
+from .escaping import SafeString
 from .exceptions import *
 from .handlers import *
-from .render import render
+from .loaders import ChoiceLoader, DictLoader, FileSystemLoader
+from .profiler import Profiler
+from .render import render, render_iter, render_to
+from .template import Template, compile
+from .codegen import PythonTemplate, compile_python
+from .async_render import render_async
+from .batch import render_many, render_many_iter
+from .storage import TemplateCache
+from .version import __version__
@@ -0,0 +1,6 @@
+"""Run the moosetash command with python -m moosetash"""
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,278 @@
+"""Render a Mustache template asynchronously, awaiting context values as they are needed"""
+import asyncio
+import inspect
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Tuple, Union
+from typing import Callable as CallableType
+
+from . import metrics
+from .context import MISSING, ContextAccessError, Path, find_in_context, get_unit
+from .escaping import escape, escape_value
+from .limits import MAX_DEPTH, check_output, check_start
+from .loaders import Partials
+from .template import Node, RenderState, Template, compile
+from .tokenizer import Token
+from .types import invoke_lambda_async, is_lambda, should_iterate
+
+LOOKUP_TOKENS = (Token.VARIABLE, Token.NO_ESCAPE, Token.SECTION, Token.INVERTED)
+
+
+class AsyncRenderState(RenderState):
+    """Render state that awaits awaitable context values and async lambdas
+
+    Every awaitable is wrapped in a single future, so a coroutine used by several tags is only
+    awaited once, and the lookups of sibling tags are awaited together.
+    """
+
+    __slots__ = ('futures',)
+
+    def __init__(self, **options: Any):
+        super().__init__(**options)
+        self.futures: Dict[int, Tuple[Awaitable, 'asyncio.Future[Any]']] = {}
+
+    def schedule(self, value: Awaitable) -> 'asyncio.Future[Any]':
+        """Schedule an awaitable, returning the same future each time it is scheduled"""
+        try:
+            return self.futures[id(value)][1]
+        except KeyError:
+            future = asyncio.ensure_future(value)
+            # Keep a reference to the awaitable so that its id can't be reused
+            self.futures[id(value)] = (value, future)
+            return future
+
+    async def resolve(self, value: Any) -> Any:
+        """Await a value if it is awaitable"""
+        if inspect.isawaitable(value):
+            return await self.schedule(value)
+        return value
+
+    async def lookup_awaitable(self, value: Awaitable, name: str, tag: str) -> Any:
+        """Await a variable fetched from the context, treating None as missing"""
+        value = await self.schedule(value)
+        if value is None:
+            return self.missing_variable_handler(name, tag)
+        return value
+
+    async def lookup_dotted(self, context_stack: List[Any], name: str, path: Path, tag: str) -> Any:
+        """Fetch a dotted name from the context, awaiting each part of the name in turn"""
+        value = find_in_context(context_stack, name, path[:1])
+        if value is MISSING:
+            return self.missing_variable_handler(name, tag)
+        value = await self.resolve(value)
+
+        for unit, index in path[1:]:
+            try:
+                value = get_unit(value, unit, index)
+            except RecursionError:
+                raise
+            except Exception as ex:
+                raise ContextAccessError(name) from ex
+            if value is MISSING:
+                return self.missing_variable_handler(name, tag)
+            value = await self.resolve(value)
+
+        if value is None:
+            return self.missing_variable_handler(name, tag)
+        return value
+
+    async def prefetch(self, nodes: Tuple[Node, ...], context_stack: List[Any]) -> List[Any]:
+        """Look up the variables for a sequence of sibling nodes, awaiting them concurrently"""
+        values: List[Any] = [None] * len(nodes)
+        pending_indexes: List[int] = []
+        pending: List[Awaitable] = []
+
+        for index, node in enumerate(nodes):
+            if node.token not in LOOKUP_TOKENS:
+                continue
+
+            if len(node.path) > 1:
+                pending_indexes.append(index)
+                pending.append(self.lookup_dotted(context_stack, node.value, node.path, node.tag))
+                continue
+
+            value = self.lookup(context_stack, node.value, node.path, node.tag)
+            if inspect.isawaitable(value):
+                pending_indexes.append(index)
+                pending.append(self.lookup_awaitable(value, node.value, node.tag))
+            values[index] = value
+
+        if pending:
+            for index, value in zip(pending_indexes, await asyncio.gather(*pending)):
+                values[index] = value
+        return values
+
+    async def render_nested_nodes(
+        self, nodes: Tuple[Node, ...], context_stack: List[Any]
+    ) -> AsyncIterator[str]:
+        """Render the nodes of a partial, parent or lambda result, yielding chunks of output"""
+        try:
+            self.nest()
+            async for chunk in self.render_nodes(nodes, context_stack):
+                yield chunk
+        except RecursionError as ex:
+            raise self.too_deep() from ex
+        finally:
+            self.depth -= 1
+
+    async def render_string(
+        self, template: str, context_stack: List[Any], delimiters: Tuple[str, str] = ('{{', '}}')
+    ) -> AsyncIterator[str]:
+        """Render a template returned by a lambda"""
+        nodes = self.compile_lambda_result(template, delimiters).nodes
+        async for chunk in self.render_nested_nodes(nodes, context_stack):
+            yield chunk
+
+    async def render_lambda_async(self, func: Any, name: str, context_stack: List[Any]) -> str:
+        """Invoke an interpolation lambda, and render the template it returns"""
+        template = await invoke_lambda_async(func, name=name)
+        return ''.join([chunk async for chunk in self.render_string(template, context_stack)])
+
+    # pylint:disable=too-many-branches
+    async def render_nodes(
+        self, nodes: Tuple[Node, ...], context_stack: List[Any]
+    ) -> AsyncIterator[str]:
+        """Render a sequence of nodes, yielding chunks of output"""
+
+        values = await self.prefetch(nodes, context_stack)
+
+        for node, variable in zip(nodes, values):
+            token = node.token
+
+            if token is Token.LITERAL:
+                yield node.value
+
+            elif token is Token.VARIABLE or token is Token.NO_ESCAPE:
+                if type(variable) is str and self.pass_strings:
+                    if token is Token.VARIABLE and self.escape_html:
+                        yield escape(variable)
+                    else:
+                        yield variable
+                    continue
+
+                if is_lambda(variable):
+                    variable = await self.render_lambda_async(variable, node.value, context_stack)
+
+                if token is Token.VARIABLE and self.escape_html:
+                    yield escape_value(variable, self.serializer)
+                else:
+                    yield self.serializer(variable)
+
+            elif token is Token.SECTION:
+                if not variable:
+                    continue
+
+                if is_lambda(variable):
+                    lambda_template = await invoke_lambda_async(
+                        variable, name=node.value, template=node.section_text
+                    )
+                    async for chunk in self.render_string(
+                        lambda_template, context_stack, node.delimiters
+                    ):
+                        yield chunk
+                    continue
+
+                if hasattr(variable, '__aiter__'):
+                    async for item in variable:
+                        if self.deadline is not None:
+                            self.check_deadline()
+                        context_stack.append(await self.resolve(item))
+                        async for chunk in self.render_nodes(node.children, context_stack):
+                            yield chunk
+                        context_stack.pop()
+                    continue
+
+                items = variable if should_iterate(variable) else (variable,)
+                for item in items:
+                    if self.deadline is not None:
+                        self.check_deadline()
+                    context_stack.append(await self.resolve(item))
+                    async for chunk in self.render_nodes(node.children, context_stack):
+                        yield chunk
+                    context_stack.pop()
+
+            elif token is Token.INVERTED:
+                if not variable and not is_lambda(variable):
+                    async for chunk in self.render_nodes(node.children, context_stack):
+                        yield chunk
+
+            elif token is Token.PARTIAL or token is Token.PARENT:
+                if token is Token.PARENT:
+                    partial = self.get_parent(node)
+                else:
+                    partial = self.get_partial(node.value, node.tag, node.indentation)
+                if partial is not None:
+                    async for chunk in self.render_nested_nodes(partial.nodes, context_stack):
+                        yield chunk
+
+            elif token is Token.SUBSTITUTION:
+                async for chunk in self.render_nodes(node.children, context_stack):
+                    yield chunk
+
+
+async def limit_output_async(
+    chunks: AsyncIterator[str], max_output_chars: int
+) -> AsyncIterator[str]:
+    """Yield chunks of output, raising once there are more than max_output_chars characters"""
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+        check_output(size, max_output_chars)
+        yield chunk
+
+
+async def render_root(
+    state: AsyncRenderState, nodes: Tuple[Node, ...], context: Any
+) -> AsyncIterator[str]:
+    """Render a template's nodes as the root of a render, yielding chunks of output"""
+    try:
+        async for chunk in state.render_nodes(nodes, [context]):
+            yield chunk
+    except RecursionError as ex:
+        raise state.too_deep() from ex
+
+
+# pylint:disable=too-many-arguments
+def render_async(
+    template: Union[str, Template],
+    context: Any,
+    serializer: Optional[CallableType[[Any], str]] = None,
+    partials: Optional[Partials] = None,
+    missing_variable_handler: Optional[CallableType[[str, str], str]] = None,
+    missing_partial_handler: Optional[CallableType[[str, str], str]] = None,
+    left_delimiter: Optional[str] = None,
+    right_delimiter: Optional[str] = None,
+    escape_html: bool = True,
+    max_output_chars: Optional[int] = None,
+    max_depth: Optional[int] = MAX_DEPTH,
+    deadline: Optional[float] = None,
+) -> AsyncIterator[str]:
+    """Render a mustache template asynchronously, returning an async iterator of output chunks
+
+    Awaitable context values, including those found part way through a dotted name, are awaited
+    when they are looked up, so values in skipped sections are never awaited. Lambdas may be
+    coroutine functions. Renders are limited as by the render function, though the deadline
+    isn't checked while a context value or lambda is being awaited.
+    """
+    check_start(deadline)
+
+    if isinstance(template, str):
+        template = compile(template, left_delimiter, right_delimiter)
+
+    recorder = metrics.RECORDER
+    if recorder is not None:
+        missing_variable_handler, missing_partial_handler = recorder.count_handlers(
+            missing_variable_handler, missing_partial_handler
+        )
+
+    state = AsyncRenderState(
+        serializer=serializer,
+        partials=partials,
+        missing_variable_handler=missing_variable_handler,
+        missing_partial_handler=missing_partial_handler,
+        escape_html=escape_html,
+        max_depth=max_depth,
+        deadline=deadline,
+    )
+    chunks = render_root(state, template.nodes, context)
+    if max_output_chars is not None:
+        chunks = limit_output_async(chunks, max_output_chars)
+    return chunks
@@ -0,0 +1,90 @@
+"""Render one template against many contexts, optionally across a pool of processes"""
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sized, Union
+
+from .template import Template, compile
+
+# Template and render options for the current worker process, set by initialize_worker
+WORKER: Dict[str, Any] = {}
+
+
+def initialize_worker(template: Template, options: Dict[str, Any]) -> None:
+    """Receive the template and render options once, when a worker process starts"""
+    WORKER['template'] = template
+    WORKER['options'] = options
+
+
+def render_chunk(contexts: List[Any]) -> List[str]:
+    """Render the worker's template against a chunk of contexts"""
+    template = WORKER['template']
+    options = WORKER['options']
+    return [template.render(context, **options) for context in contexts]
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Split an iterable into lists of at most size items"""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# pylint:disable=too-many-arguments
+def render_many_iter(
+    template: Union[str, Template],
+    contexts: Iterable[Any],
+    workers: Optional[int] = None,
+    chunksize: int = 256,
+    serial_threshold: int = 1024,
+    **options: Any,
+) -> Iterator[str]:
+    """Render a template against each context, yielding the outputs in order
+
+    The template is compiled once. Batches of at least serial_threshold contexts are split into
+    chunks of chunksize contexts and rendered across workers processes (by default, one per
+    CPU), so contexts and render options must be picklable. Smaller batches, and batches with
+    workers set to 0 or 1, are rendered in this process.
+    """
+
+    if isinstance(template, str):
+        template = compile(template)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1 or (isinstance(contexts, Sized) and len(contexts) < serial_threshold):
+        for context in contexts:
+            yield template.render(context, **options)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=initialize_worker, initargs=(template, options)
+    ) as executor:
+        for outputs in executor.map(render_chunk, chunked(contexts, chunksize)):
+            yield from outputs
+
+
+# pylint:disable=too-many-arguments
+def render_many(
+    template: Union[str, Template],
+    contexts: Iterable[Any],
+    workers: Optional[int] = None,
+    chunksize: int = 256,
+    serial_threshold: int = 1024,
+    **options: Any,
+) -> List[str]:
+    """Render a template against each context, returning a list of outputs in order"""
+    return list(
+        render_many_iter(
+            template,
+            contexts,
+            workers=workers,
+            chunksize=chunksize,
+            serial_threshold=serial_threshold,
+            **options,
+        )
+    )
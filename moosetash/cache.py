@@ -0,0 +1,125 @@
+"""Bounded least recently used caches"""
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Hashable, NamedTuple, Optional
+
+
+class CacheInfo(NamedTuple):
+    """Statistics for a cache"""
+
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: Optional[int]
+    currsize: int
+    max_bytes: Optional[int]
+    currbytes: int
+
+
+class LRUCache:
+    """A least recently used cache, bounded by a number of entries and/or a size in bytes
+
+    Entries are evicted, least recently used first, once either limit is exceeded. A limit of
+    None is unbounded. Sizes are estimates supplied by the caller when an entry is stored.
+
+    Caches can be shared between threads: every change is made holding a lock, which is only
+    held for a dictionary operation, never while a value is built. Threads missing the same key
+    at once may each build the value, and the last one stored is kept.
+    """
+
+    def __init__(self, maxsize: Optional[int] = 128, max_bytes: Optional[int] = None):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.currbytes = 0
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._sizes: dict = {}
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Fetch a value from the cache, marking it as recently used"""
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, size: int = 0) -> None:
+        """Store a value in the cache, evicting old entries to stay within the limits"""
+        with self._lock:
+            if key in self._entries:
+                self.currbytes -= self._sizes[key]
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            self.currbytes += size
+            self._evict()
+
+    def get_or_set(
+        self,
+        key: Hashable,
+        factory: Callable[[], Any],
+        sizeof: Optional[Callable[[Any], int]] = None,
+    ) -> Any:
+        """Fetch a value from the cache, creating and storing it with factory if it is missing"""
+        with self._lock:
+            try:
+                value = self._entries[key]
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            except KeyError:
+                self.misses += 1
+
+        value = factory()
+        self.set(key, value, sizeof(value) if sizeof is not None else 0)
+        return value
+
+    def resize(self, maxsize: Optional[int] = None, max_bytes: Optional[int] = None) -> None:
+        """Change the limits of the cache, evicting entries if necessary"""
+        with self._lock:
+            self.maxsize = maxsize
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def cache_info(self) -> CacheInfo:
+        """Report cache statistics"""
+        with self._lock:
+            return CacheInfo(
+                self.hits,
+                self.misses,
+                self.evictions,
+                self.maxsize,
+                len(self._entries),
+                self.max_bytes,
+                self.currbytes,
+            )
+
+    def clear(self) -> None:
+        """Remove every entry from the cache, and reset the statistics"""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.hits = self.misses = self.evictions = self.currbytes = 0
+
+    def _evict(self) -> None:
+        """Evict least recently used entries until the cache is within its limits"""
+        while self._entries and (
+            (self.maxsize is not None and len(self._entries) > self.maxsize)
+            or (self.max_bytes is not None and self.currbytes > self.max_bytes)
+        ):
+            key, _ = self._entries.popitem(last=False)
+            self.currbytes -= self._sizes.pop(key)
+            self.evictions += 1
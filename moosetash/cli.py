@@ -0,0 +1,138 @@
+"""The moosetash command line interface"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sys
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from .codegen import PythonTemplate
+from .exceptions import MustacheSyntaxError
+from .storage import TemplateCache
+from .template import Template
+
+
+class CompileJob(NamedTuple):
+    """A template file to compile into a cache directory"""
+
+    name: str
+    path: str
+    output: str
+    python: bool
+    encoding: str
+
+
+class CompileResult(NamedTuple):
+    """The outcome of compiling one template file"""
+
+    name: str
+    path: str
+    compiled: bool
+    error: Optional[str]
+
+
+def find_templates(directory: str, extension: str) -> Iterator[Tuple[str, str]]:
+    """Find every template file in a directory tree, with its name as a partial name"""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file_name in sorted(files):
+            if file_name.endswith(extension):
+                path = os.path.join(root, file_name)
+                name = os.path.relpath(path, directory)[: -len(extension)]
+                yield name.replace(os.sep, '/'), path
+
+
+def compile_template(job: CompileJob) -> CompileResult:
+    """Tokenize and compile a template file into the cache, unless its entries are up to date"""
+    try:
+        with open(job.path, encoding=job.encoding) as template_file:
+            source = template_file.read()
+
+        cache = TemplateCache(job.output, PythonTemplate if job.python else Template)
+        compiled = cache.load(job.name, source) is None
+        if compiled:
+            cache.store(job.name, cache.template_class.compile(source))
+        cache.get_tokens(job.name, source)
+    except (MustacheSyntaxError, OSError, UnicodeDecodeError) as ex:
+        return CompileResult(job.name, job.path, False, str(ex))
+    return CompileResult(job.name, job.path, compiled, None)
+
+
+def compile_directory(
+    directory: str,
+    output: str,
+    jobs: Optional[int] = None,
+    python: bool = False,
+    extension: str = '.mustache',
+    encoding: str = 'utf-8',
+) -> List[CompileResult]:
+    """Compile every template in a directory into a TemplateCache, across a pool of processes"""
+    compile_jobs = [
+        CompileJob(name, path, output, python, encoding)
+        for name, path in find_templates(directory, extension)
+    ]
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    if jobs <= 1 or len(compile_jobs) <= 1:
+        return [compile_template(job) for job in compile_jobs]
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(compile_template, compile_jobs, chunksize=16))
+
+
+def compile_command(args: argparse.Namespace) -> int:
+    """Run the compile command, returning the exit status"""
+    results = compile_directory(
+        args.directory,
+        args.output,
+        jobs=args.jobs,
+        python=args.python,
+        extension=args.extension,
+        encoding=args.encoding,
+    )
+
+    errors = [result for result in results if result.error is not None]
+    for result in errors:
+        print(f'{result.path}: {result.error}', file=sys.stderr)
+
+    compiled = sum(result.compiled for result in results)
+    print(
+        f'Compiled {compiled} of {len(results)} templates into {args.output} '
+        f'({len(results) - compiled - len(errors)} up to date, {len(errors)} failed)'
+    )
+    return 1 if errors else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the parser for the moosetash command"""
+    parser = argparse.ArgumentParser(prog='moosetash', description=__doc__)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    compile_parser = commands.add_parser(
+        'compile',
+        help='Validate and precompile a directory of templates into a persistent template cache',
+    )
+    compile_parser.add_argument('directory', help='Directory of templates to compile')
+    compile_parser.add_argument(
+        '-o', '--output', default='.moosetash-cache', help='Cache directory to write'
+    )
+    compile_parser.add_argument(
+        '-j', '--jobs', type=int, default=None, help='Number of processes (default: one per CPU)'
+    )
+    compile_parser.add_argument(
+        '--python', action='store_true', help='Compile templates to Python functions'
+    )
+    compile_parser.add_argument(
+        '--extension', default='.mustache', help='Extension of template files'
+    )
+    compile_parser.add_argument('--encoding', default='utf-8', help='Encoding of template files')
+    compile_parser.set_defaults(run=compile_command)
+
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Run the moosetash command"""
+    args = build_parser().parse_args(argv)
+    return args.run(args)
@@ -0,0 +1,225 @@
+"""Generate a Python function from a compiled template"""
+from types import CodeType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .escaping import escape, escape_value
+from .template import (
+    Node,
+    Output,
+    Overrides,
+    RenderState,
+    Template,
+    find_parents,
+    parse,
+    resolve_blocks,
+)
+from .tokenizer import Token
+from .types import is_lambda, should_iterate
+
+RenderFunction = Callable[[List[Any], Output, RenderState], None]
+
+PROLOGUE = [
+    'append = output.append',
+    'lookup = state.lookup',
+    'serializer = state.serializer',
+    'pass_strings = state.pass_strings',
+    'escape_html = state.escape_html',
+]
+
+LOOP_PROLOGUE = [
+    'push = context_stack.append',
+    'pop = context_stack.pop',
+    'deadline = state.deadline',
+]
+
+
+class CodeGenerator:
+    """Generate Python source for a node tree, with one function per section body
+
+    Each section body is emitted as its own function so that the nesting depth of the
+    generated code stays constant, however deeply sections are nested in the template.
+    Parent tags are rendered from the parents tuple in the function's namespace, indexed in the
+    order that find_parents returns them.
+    """
+
+    def __init__(self) -> None:
+        self.functions: List[List[str]] = []
+        self.parents: Dict[int, int] = {}
+
+    def generate(self, nodes: Tuple[Node, ...]) -> str:
+        """Generate the source for a module defining a render_template function"""
+        self.parents = {id(parent): index for index, parent in enumerate(find_parents(nodes))}
+        self.add_function('render_template', nodes)
+        return '\n\n'.join('\n'.join(function) for function in self.functions) + '\n'
+
+    def add_function(self, name: str, nodes: Tuple[Node, ...], iterate: bool = False) -> str:
+        """Add a function rendering nodes, optionally once for each item pushed onto the stack"""
+        lines: List[str] = []
+        self.functions.append(lines)
+
+        if iterate:
+            lines.append(f'def {name}(context_stack, output, state, items):')
+            body = [f'    {line}' for line in PROLOGUE + LOOP_PROLOGUE]
+            body.append('    for item in items:')
+            body.append('        if deadline is not None:')
+            body.append('            state.check_deadline()')
+            body.append('        push(item)')
+            body += [f'        {line}' for line in self.generate_nodes(nodes)]
+            body.append('        pop()')
+        else:
+            lines.append(f'def {name}(context_stack, output, state):')
+            body = [f'    {line}' for line in PROLOGUE + self.generate_nodes(nodes)]
+
+        lines += body
+        return name
+
+    def next_name(self, prefix: str) -> str:
+        """Reserve a unique function name"""
+        return f'{prefix}_{len(self.functions)}'
+
+    def generate_nodes(self, nodes: Tuple[Node, ...]) -> List[str]:
+        """Generate the statements rendering a sequence of nodes"""
+        lines: List[str] = []
+
+        for node in nodes:
+            token = node.token
+            lookup = (
+                f'variable = lookup(context_stack, {node.value!r}, {node.path!r}, {node.tag!r})'
+            )
+
+            if token is Token.LITERAL:
+                lines.append(f'append({node.value!r})')
+
+            elif token is Token.VARIABLE or token is Token.NO_ESCAPE:
+                lines.append(lookup)
+                lines.append('if type(variable) is str and pass_strings:')
+                if token is Token.VARIABLE:
+                    lines.append('    append(escape(variable) if escape_html else variable)')
+                else:
+                    lines.append('    append(variable)')
+                lines.append('else:')
+                lines.append('    if is_lambda(variable):')
+                lines.append(
+                    f'        variable = state.render_lambda(variable, {node.value!r}, '
+                    'context_stack)'
+                )
+                if token is Token.VARIABLE:
+                    lines.append('    if escape_html:')
+                    lines.append('        append(escape_value(variable, serializer))')
+                    lines.append('    else:')
+                    lines.append('        append(serializer(variable))')
+                else:
+                    lines.append('    append(serializer(variable))')
+
+            elif token is Token.SECTION:
+                function_name = self.next_name('section')
+                self.add_function(function_name, node.children, iterate=True)
+                lines.append(lookup)
+                lines.append('if variable:')
+                lines.append('    if is_lambda(variable):')
+                lines.append(
+                    f'        state.render_lambda_section(variable, {node.value!r}, '
+                    f'{node.section_text!r}, {node.delimiters!r}, context_stack, output)'
+                )
+                lines.append('    else:')
+                lines.append(
+                    f'        {function_name}(context_stack, output, state, '
+                    'variable if should_iterate(variable) else (variable,))'
+                )
+
+            elif token is Token.INVERTED:
+                function_name = self.next_name('inverted')
+                self.add_function(function_name, node.children)
+                lines.append(lookup)
+                lines.append('if not variable and not is_lambda(variable):')
+                lines.append(f'    {function_name}(context_stack, output, state)')
+
+            elif token is Token.PARTIAL:
+                lines.append(
+                    f'state.render_partial({node.value!r}, {node.tag!r}, '
+                    f'{node.indentation!r}, context_stack, output)'
+                )
+
+            elif token is Token.PARENT:
+                lines.append(
+                    f'state.render_parent(parents[{self.parents[id(node)]}], context_stack, output)'
+                )
+
+            elif token is Token.SUBSTITUTION:
+                function_name = self.next_name('block')
+                self.add_function(function_name, node.children)
+                lines.append(f'{function_name}(context_stack, output, state)')
+
+        return lines or ['pass']
+
+
+def generate_python(nodes: Tuple[Node, ...]) -> str:
+    """Generate Python source for a node tree"""
+    return CodeGenerator().generate(nodes)
+
+
+def compile_source(python_source: str) -> CodeType:
+    """Compile generated Python source to a code object"""
+    return compile(python_source, '<moosetash template>', 'exec')
+
+
+def build_function(code: CodeType, parents: Tuple[Node, ...] = ()) -> RenderFunction:
+    """Execute compiled generated code, and return its render_template function"""
+    namespace: Dict[str, Any] = {
+        'escape': escape,
+        'escape_value': escape_value,
+        'is_lambda': is_lambda,
+        'should_iterate': should_iterate,
+        'parents': parents,
+    }
+    exec(code, namespace)  # pylint:disable=exec-used
+    return namespace['render_template']
+
+
+class PythonTemplate(Template):
+    """A template compiled to a Python function
+
+    Literals become constants, and each tag becomes a direct lookup followed by serialization
+    and escaping, removing the per-node dispatch of the tree walking renderer.
+    """
+
+    __slots__ = ('python_source', 'code', 'function')
+
+    def __init__(
+        self,
+        source: str,
+        nodes: Tuple[Node, ...],
+        python_source: Optional[str] = None,
+        code: Optional[CodeType] = None,
+    ):
+        super().__init__(source, nodes)
+        self.python_source = python_source or generate_python(nodes)
+        self.code = code or compile_source(self.python_source)
+        self.function = build_function(self.code, find_parents(nodes))
+
+    def __reduce__(self):
+        # The generated function can't be pickled, so it is rebuilt from its source
+        return (type(self), (self.source, self.nodes, self.python_source))
+
+    def render_into(self, context_stack: List[Any], output: Output, state: RenderState) -> None:
+        self.function(context_stack, output, state)
+
+    @classmethod
+    def compile(
+        cls,
+        template: str,
+        left_delimiter: Optional[str] = None,
+        right_delimiter: Optional[str] = None,
+        overrides: Optional[Overrides] = None,
+    ) -> 'PythonTemplate':
+        nodes = parse(template, left_delimiter or '{{', right_delimiter or '}}')
+        return cls(template, resolve_blocks(nodes, overrides))
+
+
+def compile_python(
+    template: str,
+    left_delimiter: Optional[str] = None,
+    right_delimiter: Optional[str] = None,
+) -> PythonTemplate:
+    """Compile a mustache template to a Python function"""
+    return PythonTemplate.compile(template, left_delimiter, right_delimiter)
@@ -1,6 +1,7 @@
 """Utilities for accessing rendering context"""
 
-from typing import Any, List, Optional
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from .exceptions import ContextAccessError, MissingVariable
 
@@ -54,20 +55,182 @@ def deep_get(context: Any, variable: str, units: Optional[List[str]] = None) ->
     return value
 
 
-def get_from_context(contexts: List[Any], variable: str) -> Any:
-    """Search list of context for a variable"""
+# Returned instead of raising MissingVariable on the fast lookup path
+MISSING: Any = object()
+
+# The units of a dotted name, each paired with its integer value if it has one
+Path = Tuple[Tuple[str, Optional[int]], ...]
+
+
+@lru_cache(maxsize=4096)
+def split_name(variable: str) -> Path:
+    """Split a dotted variable name into the path used by find_in_context"""
+    if variable == '.':
+        return ()
+
+    path = []
+    for unit in variable.split('.'):
+        try:
+            index: Optional[int] = int(unit)
+        except ValueError:
+            index = None
+        path.append((unit, index))
+    return tuple(path)
+
+
+# Fetches a name, given as a string and its integer value if it has one, from an object,
+# returning MISSING if the object doesn't have it
+Accessor = Callable[[Any, str, Optional[int]], Any]
+
+
+def get_any(obj: Any, unit: str, index: Optional[int]) -> Any:
+    """Accessor trying every strategy, as get does, for types without a faster accessor"""
+    try:
+        return get(obj, unit)
+    except MissingVariable:
+        return MISSING
 
-    value = None
-    units = variable.split(".")
 
-    for context in reversed(contexts):
+def get_mapping(obj: Any, unit: str, index: Optional[int]) -> Any:
+    """Accessor for dicts, and dict subclasses that don't change how items are fetched"""
+    return dict.get(obj, unit, MISSING)
+
+
+def get_attribute(obj: Any, unit: str, index: Optional[int]) -> Any:
+    """Accessor for objects that can't be indexed, such as dataclasses and __slots__ objects"""
+    if index is not None:
+        return get_any(obj, unit, index)
+    try:
+        return getattr(obj, unit, MISSING)
+    except TypeError:
+        return MISSING
+
+
+def get_sequence(obj: Any, unit: str, index: Optional[int]) -> Any:
+    """Accessor for lists, tuples (including named tuples), strings and ranges"""
+    if index is None:
         try:
-            value = deep_get(context, variable, units)
+            return getattr(obj, unit, MISSING)
+        except TypeError:
+            return MISSING
+    try:
+        return obj[index]
+    except IndexError:
+        return MISSING
+
+
+SEQUENCE_TYPES = (list, tuple, str, range)
+
+# Accessors registered with register_accessor, which also apply to subclasses
+REGISTERED_ACCESSORS: Dict[type, Accessor] = {}
+
+# The accessor chosen for each concrete type that has been looked up
+ACCESSORS: Dict[type, Accessor] = {}
+MAX_ACCESSOR_TYPES = 4096
+
+
+def default_accessor(obj_type: type) -> Accessor:
+    """Choose the fastest built-in accessor that behaves like get for a type"""
+    getitem = getattr(obj_type, '__getitem__', None)
+    if getitem is None:
+        return get_attribute
+
+    if hasattr(obj_type, '__getattr__'):
+        return get_any
+
+    if (
+        issubclass(obj_type, dict)
+        and getitem is dict.__getitem__
+        and not hasattr(obj_type, '__missing__')
+    ):
+        return get_mapping
+
+    for sequence_type in SEQUENCE_TYPES:
+        if issubclass(obj_type, sequence_type) and getitem is getattr(
+            sequence_type, '__getitem__', None
+        ):
+            return get_sequence
+
+    return get_any
+
+
+def find_accessor(obj_type: type) -> Accessor:
+    """Find the accessor for a type, remembering it for the next lookup"""
+    for base in obj_type.__mro__:
+        if base in REGISTERED_ACCESSORS:
+            accessor = REGISTERED_ACCESSORS[base]
             break
-        except MissingVariable:
-            pass
+    else:
+        accessor = default_accessor(obj_type)
+
+    if len(ACCESSORS) >= MAX_ACCESSOR_TYPES:
+        # Types created on the fly, such as mocks, shouldn't grow the cache without bound
+        ACCESSORS.clear()
+    ACCESSORS[obj_type] = accessor
+    return accessor
+
+
+def register_accessor(obj_type: type, accessor: Accessor) -> None:
+    """Use a custom accessor to look up names on instances of a type and its subclasses
+
+    The accessor is called with the object, the name, and the name as an integer if it is one
+    (otherwise None), and must return MISSING if the object doesn't have the name.
+    """
+    REGISTERED_ACCESSORS[obj_type] = accessor
+    ACCESSORS.clear()
+
+
+def get_unit(obj: Any, unit: str, index: Optional[int]) -> Any:
+    """Lookup key from obj, as get does, but return MISSING instead of raising MissingVariable
+
+    The strategy for each type is chosen once, so mappings, objects and sequences are handled
+    without trying other strategies or raising exceptions.
+    """
+    try:
+        accessor = ACCESSORS[type(obj)]
+    except KeyError:
+        accessor = find_accessor(type(obj))
+    return accessor(obj, unit, index)
+
+
+def find_in_context(contexts: List[Any], variable: str, path: Path) -> Any:
+    """Search list of context for a variable, already split into a path by split_name
+
+    Returns MISSING if the variable isn't found. The first unit of the path is searched for
+    from the innermost context outwards, stopping at the first context that has it.
+    """
+    if not path:
+        # Handle implicit interpolation
+        value = contexts[-1]
+        return MISSING if value is None else value
+
+    try:
+        first, index = path[0]
+        for context in reversed(contexts):
+            value = get_unit(context, first, index)
+            if value is not MISSING:
+                break
+        else:
+            return MISSING
+
+        for unit, index in path[1:]:
+            value = get_unit(value, unit, index)
+            if value is MISSING:
+                return MISSING
+    except RecursionError:
+        # Raised by the render nesting too deeply, rather than by the context
+        raise
+    except Exception as ex:
+        raise ContextAccessError(variable) from ex
+
+    return MISSING if value is None else value
+
+
+def get_from_context(contexts: List[Any], variable: str) -> Any:
+    """Search list of context for a variable"""
 
-    if value is None:
+    value = find_in_context(contexts, variable, split_name(variable))
+    if value is MISSING:
         raise MissingVariable(variable)
 
     return value
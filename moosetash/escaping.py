@@ -0,0 +1,87 @@
+"""Escape rendered values for HTML"""
+from typing import Any, Callable, Dict
+
+
+class SafeString(str):
+    """A string that is already safe to include in HTML, so is rendered without escaping"""
+
+    __slots__ = ()
+
+    def __html__(self) -> str:
+        return str(self)
+
+
+def escape_special(text: str) -> str:
+    """Replace the characters &, <, >, " and ' with HTML character references, as html.escape
+    does"""
+    return (
+        text.replace('&', '&amp;')
+        .replace('<', '&lt;')
+        .replace('>', '&gt;')
+        .replace('"', '&quot;')
+        .replace('\'', '&#x27;')
+    )
+
+
+class EscapeMemo:
+    """A bounded memo of escaped strings, for short values that are escaped again and again
+
+    Disabled while maxsize is 0. Once maxsize strings are memoized, the memo is cleared.
+    """
+
+    __slots__ = ('maxsize', 'max_length', 'escaped')
+
+    def __init__(self, maxsize: int = 0, max_length: int = 64):
+        self.maxsize = maxsize
+        self.max_length = max_length
+        self.escaped: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.escaped)
+
+    def escape(self, text: str) -> str:
+        """Escape text, reusing the escaped string if it has been escaped before"""
+        try:
+            return self.escaped[text]
+        except KeyError:
+            pass
+
+        escaped = escape_special(text)
+        if len(self.escaped) >= self.maxsize:
+            self.escaped.clear()
+        self.escaped[text] = escaped
+        return escaped
+
+    def resize(self, maxsize: int, max_length: int = 64) -> None:
+        """Change the limits of the memo, setting maxsize to 0 to disable it"""
+        self.maxsize = maxsize
+        self.max_length = max_length
+        self.escaped.clear()
+
+    def clear(self) -> None:
+        """Remove every memoized string"""
+        self.escaped.clear()
+
+
+# Escaped strings of up to max_length characters, reused across renders once enabled
+ESCAPE_MEMO = EscapeMemo()
+
+
+def escape(text: str) -> str:
+    """Escape text for HTML, returning it unchanged if it has no characters to escape"""
+    if '&' in text or '<' in text or '>' in text or '"' in text or '\'' in text:
+        if ESCAPE_MEMO.maxsize and len(text) <= ESCAPE_MEMO.max_length:
+            return ESCAPE_MEMO.escape(text)
+        return escape_special(text)
+    return text
+
+
+def escape_value(value: Any, serializer: Callable[[Any], str]) -> str:
+    """Serialize a value and escape it for HTML
+
+    Values with an __html__ method, such as SafeString or markupsafe's Markup, are already safe
+    to include in HTML, and are rendered as __html__ returns them, without the serializer.
+    """
+    if type(value) is not str and hasattr(value, '__html__'):
+        return value.__html__()
+    return escape(serializer(value))
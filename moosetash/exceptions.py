@@ -26,3 +26,23 @@ class MissingVariable(Exception):
 
 class MissingPartial(Exception):
     """Partial is missing from partials dictionary"""
+
+
+class InvalidCacheEntry(Exception):
+    """Serialized template is corrupt, or was written by another version of moosetash"""
+
+
+class RenderLimitExceeded(Exception):
+    """Render exceeded one of the resource limits passed to it"""
+
+
+class OutputLimitExceeded(RenderLimitExceeded):
+    """Render produced more output than max_output_chars"""
+
+
+class DepthLimitExceeded(RenderLimitExceeded):
+    """Partials, parents or lambda results were nested deeper than max_depth"""
+
+
+class DeadlineExceeded(RenderLimitExceeded):
+    """Render was still running at its deadline"""
@@ -1,4 +1,5 @@
-from typing import Any
+from abc import ABCMeta
+from typing import Any, Callable, Dict, Mapping, Optional
 from .exceptions import MissingPartial, MissingVariable
 
 
@@ -29,3 +30,74 @@ def missing_partial_keep(partial_name: str, partial_tag: str) -> str:
 def default_serializer(value: Any) -> str:
     """By default, serialize variables as by stringifying"""
     return str(value)
+
+
+Serializer = Callable[[Any], str]
+
+
+class SerializerRegistry:
+    """Serialize values with the function registered for their type
+
+    The function for a type is found by walking its MRO, then by checking registered abstract
+    base classes, falling back to the default serializer. It is resolved once per type and
+    cached, as functools.singledispatch does.
+    """
+
+    def __init__(
+        self,
+        serializers: Optional[Mapping[type, Serializer]] = None,
+        default: Serializer = default_serializer,
+    ):
+        self.default = default
+        self.serializers: Dict[type, Serializer] = dict(serializers or {})
+        self.cache: Dict[type, Serializer] = {}
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.serializers!r}, default={self.default!r})'
+
+    def register(self, cls: type, func: Optional[Serializer] = None) -> Any:
+        """Register a serializer for a type, either directly or as a decorator"""
+        if func is None:
+            return lambda func: self.register(cls, func)
+
+        self.serializers[cls] = func
+        self.cache.clear()
+        return func
+
+    def resolve(self, cls: type) -> Serializer:
+        """Find the serializer for a type"""
+        try:
+            return self.cache[cls]
+        except KeyError:
+            pass
+
+        for base in cls.__mro__:
+            if base in self.serializers:
+                func = self.serializers[base]
+                break
+        else:
+            for registered, registered_func in self.serializers.items():
+                if isinstance(registered, ABCMeta) and issubclass(cls, registered):
+                    func = registered_func
+                    break
+            else:
+                func = self.default
+
+        self.cache[cls] = func
+        return func
+
+    def __call__(self, value: Any) -> str:
+        try:
+            func = self.cache[type(value)]
+        except KeyError:
+            func = self.resolve(type(value))
+        return func(value)
+
+
+def passes_strings(serializer: Serializer) -> bool:
+    """Whether a serializer returns str values unchanged, so needn't be called for them"""
+    if serializer is default_serializer:
+        return True
+    if isinstance(serializer, SerializerRegistry):
+        return serializer.resolve(str) is default_serializer
+    return False
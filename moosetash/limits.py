@@ -0,0 +1,59 @@
+"""Limit the output, nesting depth and running time of renders"""
+import time
+from typing import Iterator, Optional
+
+from .exceptions import DeadlineExceeded, DepthLimitExceeded, OutputLimitExceeded
+
+# The number of section items and nested templates rendered between checks of a render's deadline
+DEADLINE_CHECK_INTERVAL = 64
+
+# The default limit on how deeply partials, parents and lambda results are nested
+MAX_DEPTH = 1000
+
+
+def check_depth(depth: int, max_depth: Optional[int]) -> None:
+    """Raise DepthLimitExceeded if a partial, parent or lambda result is nested too deeply"""
+    if max_depth is not None and depth > max_depth:
+        raise DepthLimitExceeded(
+            f'Partials, parents and lambda results are nested more than {max_depth} deep'
+        )
+
+
+def check_start(deadline: Optional[float]) -> None:
+    """Raise DeadlineExceeded if a render's deadline passed before the render started"""
+    if deadline is not None and time.monotonic() > deadline:
+        raise DeadlineExceeded('Render deadline passed before the render started')
+
+
+def check_deadline(deadline: float) -> None:
+    """Raise DeadlineExceeded if deadline, a time.monotonic() value, has passed"""
+    if time.monotonic() > deadline:
+        raise DeadlineExceeded('Render deadline passed')
+
+
+def count_down(countdown: int, deadline: float) -> int:
+    """Count down to the next check of a render's deadline, returning the new countdown
+
+    Renders count down once for every section item and nested template, so renders that loop
+    without producing output are stopped too, and checking the deadline costs little.
+    """
+    countdown -= 1
+    if countdown:
+        return countdown
+    check_deadline(deadline)
+    return DEADLINE_CHECK_INTERVAL
+
+
+def check_output(size: int, max_output_chars: int) -> None:
+    """Raise OutputLimitExceeded if a render has output more than max_output_chars characters"""
+    if size > max_output_chars:
+        raise OutputLimitExceeded(f'Render output is longer than {max_output_chars} characters')
+
+
+def limit_output(chunks: Iterator[str], max_output_chars: int) -> Iterator[str]:
+    """Yield chunks of output, raising once there are more than max_output_chars characters"""
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        check_output(size, max_output_chars)
+        yield chunk
@@ -0,0 +1,159 @@
+"""Load partials by name, from a mapping, the filesystem, or a chain of loaders"""
+import os
+from threading import Lock
+import time
+from typing import Any, Dict, Iterable, Mapping, NamedTuple, Optional, Protocol, Union
+
+PathType = Union[str, 'os.PathLike[str]']
+
+
+class Loader(Protocol):
+    """Anything that fetches the source of a partial by name, such as a dict"""
+
+    def get(self, name: str) -> Optional[str]:  # pragma: no cover
+        """Return the source of the named partial, or None if it doesn't exist"""
+        ...
+
+
+Partials = Union[Mapping[str, str], Loader]
+
+# The partials of renders not given any
+NO_PARTIALS: Mapping[str, str] = {}
+
+
+class DictLoader:
+    """Load partials from a mapping of partial names to sources"""
+
+    __slots__ = ('mapping',)
+
+    def __init__(self, mapping: Mapping[str, str]):
+        self.mapping = mapping
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.mapping!r})'
+
+    def get(self, name: str) -> Optional[str]:
+        """Return the source of the named partial, or None if it isn't in the mapping"""
+        return self.mapping.get(name)
+
+
+class ChoiceLoader:
+    """Load partials from the first of several loaders that has them"""
+
+    __slots__ = ('loaders',)
+
+    def __init__(self, loaders: Iterable[Partials]):
+        self.loaders = list(loaders)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.loaders!r})'
+
+    def get(self, name: str) -> Optional[str]:
+        """Return the source of the named partial from the first loader that has it"""
+        for loader in self.loaders:
+            source = loader.get(name)
+            if source is not None:
+                return source
+        return None
+
+
+class LoadedFile(NamedTuple):
+    """A partial read from disk, and the file state it was read at"""
+
+    path: Optional[str]
+    mtime: int
+    size: int
+    source: Optional[str]
+    checked: float
+
+
+class FileSystemLoader:
+    """Load partials lazily from files in one or more directories
+
+    The partial "users/row" is read from users/row.mustache in the first search path containing
+    it. Sources are cached, and the file is only checked for changes (by its modification time
+    and size) once every check_interval seconds. Set check_interval to 0 to check on every load,
+    or to None to never check again once a partial has been loaded.
+
+    While the file is unchanged, the same source string is returned, so the indented and compiled
+    partial held in template.PARTIAL_CACHE is reused without comparing sources.
+    """
+
+    # pylint:disable=too-many-arguments
+    def __init__(
+        self,
+        search_paths: Union[PathType, Iterable[PathType]],
+        extension: str = '.mustache',
+        check_interval: Optional[float] = 2.0,
+        encoding: str = 'utf-8',
+    ):
+        if isinstance(search_paths, (str, os.PathLike)):
+            search_paths = [search_paths]
+        self.search_paths = [os.path.abspath(os.fspath(path)) for path in search_paths]
+        self.extension = extension
+        self.check_interval = check_interval
+        self.encoding = encoding
+        self.files: Dict[str, LoadedFile] = {}
+        self.lock = Lock()
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.search_paths!r}, extension={self.extension!r})'
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Loaded files are not sent to other processes, and the lock can't be pickled
+        state = self.__dict__.copy()
+        del state['files'], state['lock']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.files = {}
+        self.lock = Lock()
+
+    def find(self, name: str) -> Optional[str]:
+        """Find the path of the file for a partial, which must be inside a search path"""
+        for search_path in self.search_paths:
+            path = os.path.normpath(os.path.join(search_path, name + self.extension))
+            if os.path.commonpath([search_path, path]) != search_path:
+                continue
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def load(self, name: str, now: float, previous: Optional[LoadedFile]) -> LoadedFile:
+        """Stat the file for a partial, reading it again only if it has changed"""
+        path = self.find(name)
+        if path is None:
+            return LoadedFile(None, 0, 0, None, now)
+
+        stat = os.stat(path)
+        if (
+            previous is not None
+            and previous.path == path
+            and previous.mtime == stat.st_mtime_ns
+            and previous.size == stat.st_size
+        ):
+            return previous._replace(checked=now)
+
+        with open(path, encoding=self.encoding) as partial_file:
+            source = partial_file.read()
+        return LoadedFile(path, stat.st_mtime_ns, stat.st_size, source, now)
+
+    def get(self, name: str) -> Optional[str]:
+        """Return the source of the named partial, or None if there is no file for it"""
+        loaded = self.files.get(name)
+        now = time.monotonic()
+        if loaded is not None and (
+            self.check_interval is None or now - loaded.checked < self.check_interval
+        ):
+            return loaded.source
+
+        with self.lock:
+            loaded = self.load(name, now, self.files.get(name))
+            self.files[name] = loaded
+        return loaded.source
+
+    def clear(self) -> None:
+        """Forget every loaded partial, so each is read again on its next load"""
+        with self.lock:
+            self.files.clear()
@@ -0,0 +1,263 @@
+"""Report render metrics, such as durations, cache statistics and missing variables, to a sink
+
+Metrics are off until configure is called with a sink:
+
+    from moosetash import metrics
+
+    metrics.configure(metrics.InMemorySink(), slow_render_threshold=0.25)
+
+While they are off, renders only check whether they are on, once per render. Renders on any
+thread report to the same sink, so sinks must be thread safe, as InMemorySink is.
+"""
+from collections import defaultdict
+import random
+from threading import Lock
+import time
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Protocol, Tuple
+
+from .cache import LRUCache
+from .handlers import missing_partial_default, missing_variable_default
+
+Tags = Optional[Mapping[str, str]]
+
+# The name reported for renders not given a name
+UNNAMED = '<template>'
+
+
+class MetricsSink(Protocol):
+    """Anything that receives metrics, such as an adapter for statsd or Prometheus"""
+
+    def increment(self, name: str, value: float = 1, tags: Tags = None) -> None:  # pragma: no cover
+        """Add to a counter"""
+        ...
+
+    def gauge(self, name: str, value: float, tags: Tags = None) -> None:  # pragma: no cover
+        """Set the current value of a gauge"""
+        ...
+
+    def timing(self, name: str, seconds: float, tags: Tags = None) -> None:  # pragma: no cover
+        """Record a duration"""
+        ...
+
+
+def tag_key(name: str, tags: Tags) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    """A hashable key for a metric and its tags"""
+    return name, tuple(sorted(tags.items())) if tags else ()
+
+
+class InMemorySink:
+    """A sink keeping counters, gauges and timings in memory, for tests and inspection
+
+    Metrics are keyed by name and their tags, as returned by tag_key.
+    """
+
+    def __init__(self) -> None:
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = defaultdict(float)
+        self.gauges: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self.timings: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[float]] = defaultdict(list)
+        self.lock = Lock()
+
+    def increment(self, name: str, value: float = 1, tags: Tags = None) -> None:
+        """Add to a counter"""
+        with self.lock:
+            self.counters[tag_key(name, tags)] += value
+
+    def gauge(self, name: str, value: float, tags: Tags = None) -> None:
+        """Set the current value of a gauge"""
+        with self.lock:
+            self.gauges[tag_key(name, tags)] = value
+
+    def timing(self, name: str, seconds: float, tags: Tags = None) -> None:
+        """Record a duration"""
+        with self.lock:
+            self.timings[tag_key(name, tags)].append(seconds)
+
+    def counter(self, name: str, **tags: str) -> float:
+        """The value of a counter"""
+        return self.counters.get(tag_key(name, tags), 0)
+
+
+class SlowRender(NamedTuple):
+    """A render that took longer than the slow render threshold"""
+
+    name: str
+    duration: float
+    # The sections, partials and lambdas with the most cumulative time, as ProfileStats, if the
+    # render was profiled
+    hottest_sections: List[Any]
+
+
+# Kinds of profiled tag reported as the hottest sections of a slow render
+HOT_KINDS = ('section', 'inverted', 'partial', 'parent', 'lambda')
+
+# Caches reported by collect, by the name they are reported under
+CACHES: Dict[str, LRUCache] = {}
+
+
+def register_cache(name: str, cache: LRUCache) -> None:
+    """Report a cache's statistics as gauges named cache.<name>.<statistic>"""
+    CACHES[name] = cache
+
+
+class Recorder:
+    """Records renders, missing variables and partials, and lambda calls to a sink"""
+
+    # pylint:disable=too-many-arguments
+    def __init__(
+        self,
+        sink: MetricsSink,
+        slow_render_threshold: Optional[float] = None,
+        on_slow_render: Optional[Callable[[SlowRender], None]] = None,
+        profile_rate: float = 0.0,
+        hottest_sections: int = 5,
+        collect_interval: Optional[float] = 10.0,
+        timer: Callable[[], float] = time.perf_counter,
+    ):
+        self.sink = sink
+        self.slow_render_threshold = slow_render_threshold
+        self.on_slow_render = on_slow_render
+        self.profile_rate = profile_rate
+        self.hottest_sections = hottest_sections
+        self.collect_interval = collect_interval
+        self.timer = timer
+        self.last_collected = time.monotonic()
+
+    def collect(self) -> None:
+        """Report the statistics of every registered cache as gauges"""
+        self.last_collected = time.monotonic()
+        for name, cache in CACHES.items():
+            info = cache.cache_info()
+            self.sink.gauge(f'cache.{name}.hits', info.hits)
+            self.sink.gauge(f'cache.{name}.misses', info.misses)
+            self.sink.gauge(f'cache.{name}.evictions', info.evictions)
+            self.sink.gauge(f'cache.{name}.size', info.currsize)
+            self.sink.gauge(f'cache.{name}.bytes', info.currbytes)
+
+    def count_lambda(self) -> None:
+        """Count a lambda call"""
+        self.sink.increment('lambda.calls')
+
+    def counting_handler(
+        self, metric: str, handler: Callable[[str, str], str]
+    ) -> Callable[[str, str], str]:
+        """Wrap a missing variable or partial handler, counting its calls"""
+
+        def counted(name: str, tag: str) -> str:
+            self.sink.increment(metric)
+            return handler(name, tag)
+
+        return counted
+
+    def count_handlers(
+        self,
+        missing_variable_handler: Optional[Callable[[str, str], str]],
+        missing_partial_handler: Optional[Callable[[str, str], str]],
+    ) -> Tuple[Callable[[str, str], str], Callable[[str, str], str]]:
+        """Wrap the missing variable and partial handlers of a render, or the defaults if they
+        aren't given, counting their calls"""
+        return (
+            self.counting_handler(
+                'missing_variable', missing_variable_handler or missing_variable_default
+            ),
+            self.counting_handler(
+                'missing_partial', missing_partial_handler or missing_partial_default
+            ),
+        )
+
+    def start(self, name: Optional[str], profiler: Any = None) -> 'RenderTiming':
+        """Start timing a render, profiling it if it is sampled and not already being profiled
+
+        Sampled renders are profiled by the renderer they would otherwise use, so sampling never
+        changes their output, errors or metrics.
+        """
+        if profiler is None and self.profile_rate and random.random() < self.profile_rate:
+            # Imported here, as the profiler depends on the modules that report metrics
+            from .profiler import Profiler  # pylint:disable=import-outside-toplevel
+
+            profiler = Profiler()
+        return RenderTiming(self, name or UNNAMED, profiler, self.timer())
+
+    def finish(self, timing: 'RenderTiming', output_size: int) -> None:
+        """Report a render's duration and output size, and call on_slow_render if it was slow"""
+        duration = self.timer() - timing.start
+        tags = {'template': timing.name}
+        self.sink.increment('render.count', tags=tags)
+        self.sink.timing('render.duration', duration, tags=tags)
+        self.sink.increment('render.output_chars', output_size, tags=tags)
+
+        if self.slow_render_threshold is not None and duration >= self.slow_render_threshold:
+            self.sink.increment('render.slow', tags=tags)
+            if self.on_slow_render is not None:
+                self.on_slow_render(
+                    SlowRender(timing.name, duration, self.hottest(timing.profiler))
+                )
+
+        if (
+            self.collect_interval is not None
+            and time.monotonic() - self.last_collected >= self.collect_interval
+        ):
+            self.collect()
+
+    def hottest(self, profiler: Any) -> List[Any]:
+        """The sections, partials, parents and lambdas with the most cumulative time"""
+        if profiler is None:
+            return []
+        return [stats for stats in profiler.sorted_stats('cumulative') if stats.kind in HOT_KINDS][
+            : self.hottest_sections
+        ]
+
+
+class RenderTiming(NamedTuple):
+    """A render being timed, and the profiler it is rendered with, if any"""
+
+    recorder: Recorder
+    name: str
+    profiler: Any
+    start: float
+
+    def finish(self, output_size: int) -> None:
+        """Finish timing the render, given the number of characters it output"""
+        self.recorder.finish(self, output_size)
+
+
+# The recorder renders report to, or None while metrics are off
+RECORDER: Optional[Recorder] = None
+
+
+# pylint:disable=too-many-arguments
+def configure(
+    sink: Optional[MetricsSink],
+    slow_render_threshold: Optional[float] = None,
+    on_slow_render: Optional[Callable[[SlowRender], None]] = None,
+    profile_rate: float = 0.0,
+    hottest_sections: int = 5,
+    collect_interval: Optional[float] = 10.0,
+) -> Optional[Recorder]:
+    """Report metrics to a sink, or stop reporting them if sink is None
+
+    Renders taking at least slow_render_threshold seconds are counted, and passed to
+    on_slow_render. A fraction profile_rate of renders is profiled, so slow renders among them
+    report their hottest_sections sections, partials and lambdas by cumulative time. Cache
+    statistics are reported every collect_interval seconds, as renders finish, or on calling
+    collect.
+    """
+    global RECORDER  # pylint:disable=global-statement
+    RECORDER = (
+        None
+        if sink is None
+        else Recorder(
+            sink,
+            slow_render_threshold=slow_render_threshold,
+            on_slow_render=on_slow_render,
+            profile_rate=profile_rate,
+            hottest_sections=hottest_sections,
+            collect_interval=collect_interval,
+        )
+    )
+    return RECORDER
+
+
+def collect() -> None:
+    """Report the statistics of every registered cache now, if metrics are on"""
+    if RECORDER is not None:
+        RECORDER.collect()
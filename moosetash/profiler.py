@@ -0,0 +1,284 @@
+"""Profile renders, recording the time spent in each variable, section, partial and lambda"""
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from .escaping import escape, escape_value
+from .template import Node, Output, RenderState, Template
+from .tokenizer import Token, TokenStream
+from .types import is_lambda, should_iterate
+
+KINDS = {
+    Token.VARIABLE: 'variable',
+    Token.NO_ESCAPE: 'variable',
+    Token.SECTION: 'section',
+    Token.INVERTED: 'inverted',
+    Token.PARTIAL: 'partial',
+    Token.PARENT: 'parent',
+}
+
+# The name recorded for the template passed to render
+ROOT_TEMPLATE = '<template>'
+
+
+class ProfileStats:
+    """Call count and times for one tag, in seconds
+
+    Cumulative time includes the time spent in the tags rendered inside it, such as the body of
+    a section. Own time excludes it.
+    """
+
+    __slots__ = ('kind', 'name', 'template', 'line', 'calls', 'own_time', 'cumulative_time')
+
+    # pylint:disable=too-many-arguments
+    def __init__(self, kind: str, name: str, template: str, line: int):
+        self.kind = kind
+        self.name = name
+        self.template = template
+        self.line = line
+        self.calls = 0
+        self.own_time = 0.0
+        self.cumulative_time = 0.0
+
+    def __repr__(self) -> str:
+        return (
+            f'{type(self).__name__}({self.kind!r}, {self.name!r}, {self.template!r}, {self.line}, '
+            f'calls={self.calls})'
+        )
+
+    @property
+    def location(self) -> str:
+        """Where the tag is, as template:line"""
+        return f'{self.template}:{self.line}'
+
+
+SORT_KEYS: Dict[str, Callable[[ProfileStats], Any]] = {
+    'calls': lambda stats: -stats.calls,
+    'ncalls': lambda stats: -stats.calls,
+    'tottime': lambda stats: -stats.own_time,
+    'time': lambda stats: -stats.own_time,
+    'cumtime': lambda stats: -stats.cumulative_time,
+    'cumulative': lambda stats: -stats.cumulative_time,
+    'name': lambda stats: stats.name,
+    'line': lambda stats: (stats.template, stats.line),
+}
+
+
+class Profiler:
+    """Record the calls and time of each tag in the renders it is passed to
+
+    Pass a profiler to render, or to a compiled template's render method. Profiled renders time
+    every variable (with its serialization recorded separately), section, partial, parent and
+    lambda, keyed by kind, name, template and line, in the same renderer as unprofiled ones.
+
+    A profiler records one render at a time, so threads rendering at once need one each.
+    """
+
+    def __init__(self, timer: Callable[[], float] = time.perf_counter):
+        self.timer = timer
+        self.stats: Dict[Tuple[str, str, str, int], ProfileStats] = {}
+        self.templates: List[str] = []
+        # Time spent in nested tags, for each tag being timed
+        self.child_times: List[float] = []
+        # The line each token starts on, for the token streams of the interpreted render being
+        # profiled, keyed by their id and holding the stream so that its id can't be reused
+        self.lines: Dict[int, Tuple[TokenStream, List[int]]] = {}
+
+    def clear(self) -> None:
+        """Forget every recorded call"""
+        self.stats.clear()
+
+    def enter(self) -> float:
+        """Start timing a tag, returning the start time to pass to leave"""
+        self.child_times.append(0.0)
+        return self.timer()
+
+    def leave(self, kind: str, name: str, line: int, start: float) -> None:
+        """Finish timing a tag"""
+        elapsed = self.timer() - start
+        child_time = self.child_times.pop()
+        if self.child_times:
+            self.child_times[-1] += elapsed
+
+        template = self.templates[-1] if self.templates else ROOT_TEMPLATE
+        key = (kind, name, template, line)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = ProfileStats(kind, name, template, line)
+        stats.calls += 1
+        stats.own_time += elapsed - child_time
+        stats.cumulative_time += elapsed
+
+    def token_line(self, template: str, tokens: TokenStream, index: int) -> int:
+        """The line the token at index starts on, as recorded for a compiled template's node"""
+        entry = self.lines.get(id(tokens))
+        if entry is None:
+            lines = []
+            line = 1
+            previous_pointer = 0
+            # Each token starts on the line where the token before it ends
+            for _, pointer in tokens:
+                lines.append(line)
+                line += template.count('\n', previous_pointer, pointer)
+                previous_pointer = pointer
+            entry = self.lines[id(tokens)] = (tokens, lines)
+        return entry[1][index]
+
+    def profile_chunks(self, chunks: Iterator[str]) -> Iterator[str]:
+        """Yield the chunks of an interpreted render, then forget its token lines, and any tags
+        it leaves unfinished by stopping early, so the profiler can record later renders"""
+        templates = len(self.templates)
+        timings = len(self.child_times)
+        try:
+            yield from chunks
+        finally:
+            del self.templates[templates:]
+            del self.child_times[timings:]
+            self.lines.clear()
+
+    def render(
+        self, template: Template, context_stack: List[Any], output: Output, state: RenderState
+    ) -> None:
+        """Render a compiled template with the options of a render state, recording calls
+
+        Any tags left unfinished by an error are forgotten, so the profiler can record later
+        renders.
+        """
+        templates = len(self.templates)
+        timings = len(self.child_times)
+        try:
+            ProfilingRenderState(self, state).render_template(
+                template, ROOT_TEMPLATE, context_stack, output
+            )
+        finally:
+            del self.templates[templates:]
+            del self.child_times[timings:]
+
+    def sorted_stats(self, sort: str = 'cumulative') -> List[ProfileStats]:
+        """Every recorded tag, sorted by calls, tottime, cumtime, name or line"""
+        try:
+            key = SORT_KEYS[sort]
+        except KeyError as ex:
+            raise ValueError(f'Unknown sort key "{sort}"') from ex
+        return sorted(self.stats.values(), key=key)
+
+    def report(self, sort: str = 'cumulative', limit: Optional[int] = None) -> str:
+        """A table of the recorded tags, in the style of pstats"""
+        rows = self.sorted_stats(sort)[:limit]
+        lines = [
+            f'{len(self.stats)} tags profiled, sorted by {sort}',
+            '',
+            '   ncalls   tottime   percall   cumtime   percall  kind      name (template:line)',
+        ]
+        for stats in rows:
+            lines.append(
+                f'{stats.calls:9d} {stats.own_time:9.6f} {stats.own_time / stats.calls:9.6f} '
+                f'{stats.cumulative_time:9.6f} {stats.cumulative_time / stats.calls:9.6f}  '
+                f'{stats.kind:<9} {stats.name} ({stats.location})'
+            )
+        return '\n'.join(lines) + '\n'
+
+    def print_stats(
+        self, sort: str = 'cumulative', limit: Optional[int] = None, stream: Optional[TextIO] = None
+    ) -> None:
+        """Write the report to a stream, by default standard output"""
+        (stream or sys.stdout).write(self.report(sort, limit))
+
+
+class ProfilingRenderState(RenderState):
+    """Render state that renders templates, including partials, parents and lambda results, with
+    profile_nodes"""
+
+    __slots__ = ('profiler',)
+
+    # pylint:disable=super-init-not-called
+    def __init__(self, profiler: Profiler, state: RenderState):
+        for name in RenderState.__slots__:
+            setattr(self, name, getattr(state, name))
+        self.profiler = profiler
+
+    def render_template(
+        self, template: Template, name: str, context_stack: List[Any], output: Output
+    ) -> None:
+        """Render a template's nodes, recording its tags as being in the named template"""
+        self.profiler.templates.append(name)
+        try:
+            profile_nodes(template.nodes, context_stack, output, self)
+        finally:
+            self.profiler.templates.pop()
+
+
+# pylint:disable=too-many-branches
+def profile_nodes(
+    nodes: Tuple[Node, ...], context_stack: List[Any], output: Output, state: ProfilingRenderState
+) -> None:
+    """Render a sequence of nodes as template.render_nodes does, timing every tag"""
+
+    profiler = state.profiler
+    for node in nodes:
+        token = node.token
+
+        if token is Token.LITERAL:
+            output.append(node.value)
+            continue
+
+        if token is Token.SUBSTITUTION:
+            profile_nodes(node.children, context_stack, output, state)
+            continue
+
+        start = profiler.enter()
+
+        if token is Token.VARIABLE or token is Token.NO_ESCAPE:
+            variable = state.lookup(context_stack, node.value, node.path, node.tag)
+            if is_lambda(variable):
+                lambda_start = profiler.enter()
+                variable = state.render_lambda(variable, node.value, context_stack)
+                profiler.leave('lambda', node.value, node.line, lambda_start)
+
+            serialize_start = profiler.enter()
+            if type(variable) is str and state.pass_strings:
+                if token is Token.VARIABLE and state.escape_html:
+                    output.append(escape(variable))
+                else:
+                    output.append(variable)
+            elif token is Token.VARIABLE and state.escape_html:
+                output.append(escape_value(variable, state.serializer))
+            else:
+                output.append(state.serializer(variable))
+            profiler.leave('serialize', node.value, node.line, serialize_start)
+
+        elif token is Token.SECTION:
+            variable = state.lookup(context_stack, node.value, node.path, node.tag)
+            if variable and is_lambda(variable):
+                lambda_start = profiler.enter()
+                state.render_lambda_section(
+                    variable,
+                    node.value,
+                    node.section_text,
+                    node.delimiters,
+                    context_stack,
+                    output,
+                )
+                profiler.leave('lambda', node.value, node.line, lambda_start)
+
+            elif variable:
+                items = variable if should_iterate(variable) else (variable,)
+                for item in items:
+                    if state.deadline is not None:
+                        state.check_deadline()
+                    context_stack.append(item)
+                    profile_nodes(node.children, context_stack, output, state)
+                    context_stack.pop()
+
+        elif token is Token.INVERTED:
+            variable = state.lookup(context_stack, node.value, node.path, node.tag)
+            if not variable and not is_lambda(variable):
+                profile_nodes(node.children, context_stack, output, state)
+
+        elif token is Token.PARTIAL:
+            state.render_partial(node.value, node.tag, node.indentation, context_stack, output)
+
+        elif token is Token.PARENT:
+            state.render_parent(node, context_stack, output)
+
+        profiler.leave(KINDS[token], node.value, node.line, start)
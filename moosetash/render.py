@@ -1,311 +1,802 @@
 """Render a Mustache template"""
-from html import escape
-from typing import Any, Dict, List, Optional
+import io
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, TextIO, Tuple
 from typing import Callable as CallableType
 
-from .context import MissingVariable, get_from_context
+from . import metrics
+from .context import MISSING, find_in_context, split_name
 from .exceptions import MustacheSyntaxError
+from .escaping import escape, escape_value
 from .handlers import (
     default_serializer,
     missing_partial_default,
     missing_variable_default,
+    passes_strings,
+)
+from .limits import (
+    DEADLINE_CHECK_INTERVAL,
+    MAX_DEPTH,
+    check_depth,
+    check_start,
+    count_down,
+    limit_output,
+)
+from .loaders import NO_PARTIALS, Partials
+from .profiler import KINDS, Profiler
+from .template import StreamWriter, cached_lambda, cached_partial, indent
+from .tokenizer import (
+    SECTION_START_TOKENS,
+    SectionEnds,
+    Token,
+    Tokenized,
+    TokenStream,
+    tokenize_cached,
+    tokenize_sections,
 )
-from .tokenizer import Token, tokenize
 from .types import invoke_lambda, is_lambda, should_iterate
 
 
-def find_closing_pointer_limits_cached(current_pointer: int, section_name: str, tokens):
-    count = 1
-    previous_position_pointer = tokens[current_pointer][1]
-    for idx, ((token, value, _), position_pointer) in enumerate(tokens[current_pointer:]):
-        if section_name == value:
-            if token in [Token.SECTION, Token.INVERTED]:
-                count += 1
+class Block(NamedTuple):
+    """The content of a block inside a parent tag, which overrides the block in the parent
+    template, with the overrides in scope where it was written"""
+
+    template: str
+    tokenized: Tokenized
+    start: int
+    end: int
+    left_delimiter: str
+    right_delimiter: str
+    # The blocks overriding those in scope, typed loosely as mypy can't check recursive NamedTuples
+    overrides: Dict[str, Any]
+
+
+# A tag being timed by a profiler, as the arguments to Profiler.leave
+Timing = Tuple[str, str, int, float]
+
+
+class Frame:
+    """A template being rendered, or a block of one, with the state needed to resume it once the
+    templates nested in it are done
+
+    Frames rendering a lambda variable's template capture their output, to output it as a single
+    value with capture_token's escaping.
+    """
+
+    __slots__ = (
+        'template',
+        'tokenized',
+        'pointer',
+        'end',
+        'left_delimiter',
+        'right_delimiter',
+        'overrides',
+        'depth',
+        'section_base',
+        'capture',
+        'capture_token',
+        'timings',
+        'capture_timing',
+    )
+
+    # pylint:disable=too-many-arguments
+    def __init__(
+        self,
+        template: str,
+        tokenized: Tokenized,
+        pointer: int,
+        end: int,
+        left_delimiter: str,
+        right_delimiter: str,
+        overrides: Dict[str, Block],
+        depth: int,
+        section_base: int,
+        capture: Optional[List[str]],
+        capture_token: Optional[Token] = None,
+        timings: Optional[Tuple[Timing, ...]] = None,
+        capture_timing: Optional[Timing] = None,
+    ):
+        self.template = template
+        self.tokenized = tokenized
+        self.pointer = pointer
+        self.end = end
+        self.left_delimiter = left_delimiter
+        self.right_delimiter = right_delimiter
+        self.overrides = overrides
+        self.depth = depth
+        # The number of sections open when the frame was entered
+        self.section_base = section_base
+        self.capture = capture
+        self.capture_token = capture_token
+        # In profiled renders, the tags to finish timing once the frame is done, for frames
+        # rendering a named partial, parent or lambda result, and the variable tag whose output a
+        # lambda frame captures
+        self.timings = timings
+        self.capture_timing = capture_timing
+
+
+def tokenize_partial(template: str) -> Tuple[str, Tokenized]:
+    """Tokenize an indented partial, keeping its source for error messages and lambdas"""
+    return template, tokenize_sections(template)
+
+
+def load_partial(
+    name: str, template: str, indentation: str, cache_tokens: bool
+) -> Tuple[str, Tokenized]:
+    """Indent and tokenize a partial or parent template, reusing its token stream from
+    template.PARTIAL_CACHE unless cache_tokens is False"""
+    if cache_tokens:
+        return cached_partial(tokenize_partial, name, template, indentation, tokenize_partial)
+    return tokenize_partial(indent(template, indentation))
 
-            if token is Token.END:
-                count -= 1
 
-            if count == 0:
-                return previous_position_pointer, current_pointer + idx + 1
-        previous_position_pointer = position_pointer
-    return None, None
+def load_lambda_result(
+    template: str, left_delimiter: str, right_delimiter: str, cache_tokens: bool
+) -> Tokenized:
+    """Tokenize a template returned by a lambda, reusing its token stream from
+    template.LAMBDA_CACHE unless cache_tokens is False"""
+    if cache_tokens:
+        return cached_lambda(
+            tokenize_sections, template, left_delimiter, right_delimiter, tokenize_sections
+        )
+    return tokenize_sections(template, left_delimiter, right_delimiter)
 
 
-def find_closing_pointer_limits(
-    current_pointer: int,
-    section_name: str,
-    iterator,
-):
-    count = 1
-    previous_pointer = current_pointer
-    for (token, value, _), pointer in iterator:
-        if section_name == value:
-            if token in [Token.SECTION, Token.INVERTED]:
-                count += 1
+def find_blocks(
+    tokens: TokenStream, section_ends: SectionEnds, start: int, end: int
+) -> Tuple[Tuple[str, int, int], ...]:
+    """Find the blocks directly inside a parent tag, as their name and the indices of their first
+    and end tokens
 
-            if token is Token.END:
-                count -= 1
+    Anything else inside a parent tag is ignored, including blocks inside sections.
+    """
+    blocks = []
+    index = start
+    while index < end:
+        (token, value, _), _ = tokens[index]
+        section_end = section_ends.get(index) if token in SECTION_START_TOKENS else None
+        if token is Token.SUBSTITUTION and section_end is not None:
+            blocks.append((value, index + 1, section_end - 1))
+        index = index + 1 if section_end is None else section_end
+    return tuple(blocks)
 
-            if count == 0:
-                return previous_pointer, pointer
-        previous_pointer = pointer
-    return None, None
 
+def tag_pointer(tokens: TokenStream, index: int) -> int:
+    """A position on the line the token at index starts on: where the token before it ends
 
-# pylint:disable=too-many-locals,too-many-branches,too-many-statements,too-many-arguments
-def render(
+    Each token's own position is where it ends, which for standalone tags is on the next line.
+    """
+    return tokens[index - 1][1] if index else 0
+
+
+def unclosed_section(name: str, template: str, position_pointer: int) -> MustacheSyntaxError:
+    """The error for a section without an end tag"""
+    return MustacheSyntaxError.from_template_pointer(
+        f'Unclosed section "{name}" beginning on line {{line_number}}', template, position_pointer
+    )
+
+
+# pylint:disable=too-many-arguments
+def render_iter(
     template: str,
     context: Dict,
     serializer: Optional[CallableType[[Any], str]] = None,
-    partials: Optional[Dict] = None,
+    partials: Optional[Partials] = None,
     missing_variable_handler: Optional[CallableType[[str, str], str]] = None,
     missing_partial_handler: Optional[CallableType[[str, str], str]] = None,
     left_delimiter: Optional[str] = None,
     right_delimiter: Optional[str] = None,
-    cache_tokens: bool = False,
+    cache_tokens: bool = True,
     escape_html: bool = True,
-) -> str:
-    """Render a mustache template"""
-
-    serializer = serializer or default_serializer
-    missing_variable_handler = missing_variable_handler or missing_variable_default
-    missing_partial_handler = missing_partial_handler or missing_partial_default
-
-    partials = partials or {}
-
-    output: str = ''
-    context_stack: List = [context]
-    env_stack: List = []
-    pointer: int = 0
+    max_output_chars: Optional[int] = None,
+    max_depth: Optional[int] = MAX_DEPTH,
+    deadline: Optional[float] = None,
+    profiler: Optional[Profiler] = None,
+) -> Iterator[str]:
+    """Render a mustache template, yielding chunks of output as they are produced
+
+    Unless cache_tokens is False, the template's token stream and section ends are stored in the
+    bounded tokenizer.TOKEN_CACHE, so rendering the same template again skips tokenization. If a
+    profiler is passed, the time spent in each tag is recorded.
+
+    The render is stopped with a RenderLimitExceeded error once it has output more than
+    max_output_chars characters, nests partials, parents and lambda results more than max_depth
+    (by default MAX_DEPTH, or None for no limit) deep, or runs past deadline, a time.monotonic()
+    value.
+    """
 
     left_delimiter = left_delimiter or '{{'
     right_delimiter = right_delimiter or '}}'
 
-    tokens = []
-
     if cache_tokens:
-        tokens = list(tokenize(template, 0, left_delimiter, right_delimiter))
+        tokenized = tokenize_cached(template, left_delimiter, right_delimiter)
+    else:
+        tokenized = tokenize_sections(template, left_delimiter, right_delimiter)
+
+    chunks = render_tokens(
+        template,
+        tokenized,
+        context,
+        serializer=serializer,
+        partials=partials,
+        missing_variable_handler=missing_variable_handler,
+        missing_partial_handler=missing_partial_handler,
+        left_delimiter=left_delimiter,
+        right_delimiter=right_delimiter,
+        escape_html=escape_html,
+        cache_tokens=cache_tokens,
+        max_depth=max_depth,
+        deadline=deadline,
+        profiler=profiler,
+    )
+    if max_output_chars is not None:
+        chunks = limit_output(chunks, max_output_chars)
+    if profiler is not None:
+        chunks = profiler.profile_chunks(chunks)
+    yield from chunks
 
-    while True:
-        if cache_tokens:
-            try:
-                (token, value, indentation), position_pointer = tokens[pointer]
-                pointer += 1
-            except IndexError:
-                break
-        else:
-            try:
-                (token, value, indentation), pointer = next(
-                    tokenize(template, pointer, left_delimiter, right_delimiter)
-                )
-                position_pointer = pointer
-            except StopIteration:
-                break
 
-        current_context = context_stack[-1]
+# pylint:disable=too-many-locals,too-many-branches,too-many-statements,too-many-arguments
+def render_tokens(
+    template: str,
+    tokenized: Tokenized,
+    context: Any,
+    serializer: Optional[CallableType[[Any], str]] = None,
+    partials: Optional[Partials] = None,
+    missing_variable_handler: Optional[CallableType[[str, str], str]] = None,
+    missing_partial_handler: Optional[CallableType[[str, str], str]] = None,
+    left_delimiter: Optional[str] = None,
+    right_delimiter: Optional[str] = None,
+    escape_html: bool = True,
+    cache_tokens: bool = True,
+    max_depth: Optional[int] = MAX_DEPTH,
+    deadline: Optional[float] = None,
+    profiler: Optional[Profiler] = None,
+) -> Iterator[str]:
+    """Render the token stream of a mustache template, yielding chunks of output
+
+    Partials, parents, blocks and lambda results are rendered by the same loop, in frames pushed
+    onto an explicit stack, so they share the context stack and the render's options, and
+    nesting them doesn't grow the Python stack. Skipped sections are jumped over using each token
+    stream's section ends, without scanning their tokens.
+
+    The deadline, a time.monotonic() value, is checked every DEADLINE_CHECK_INTERVAL section
+    items and nested templates. If a profiler is passed, every tag is timed as the compiled
+    profiler times a template's nodes.
+    """
+    check_start(deadline)
 
-        if token is Token.SET_DELIMITER:
-            new_delimiters = value.strip().split(' ')
-            left_delimiter = new_delimiters[0]
-            right_delimiter = new_delimiters[-1]
+    serializer = serializer or default_serializer
+    pass_strings = passes_strings(serializer)
+    missing_variable_handler = missing_variable_handler or missing_variable_default
+    missing_partial_handler = missing_partial_handler or missing_partial_default
+    loader: Partials = partials if partials is not None else NO_PARTIALS
+
+    context_stack: List[Any] = [context]
+    # Open sections, as [name, pointer after the start tag, iterator of the remaining items or
+    # None, whether an item was pushed onto the context stack, the section's timing if profiled]
+    section_stack: List[List[Any]] = []
+    frames: List[Frame] = []
+    frame = Frame(
+        template,
+        tokenized,
+        0,
+        len(tokenized.tokens),
+        left_delimiter or '{{',
+        right_delimiter or '}}',
+        {},
+        0,
+        0,
+        None,
+    )
+    # The line and start time of the tag being timed, and the start time of its serialization
+    line = 0
+    start = serialize_start = 0.0
+    timings: Optional[Tuple[Timing, ...]] = None
+    countdown = DEADLINE_CHECK_INTERVAL
 
-        if token is Token.END:
-            current_env = env_stack[-1]
-            context_stack.pop()
+    while True:
+        template = frame.template
+        tokenized = frame.tokenized
+        tokens, section_ends, sections = tokenized
+        pointer = frame.pointer
+        end = frame.end
+        left_delimiter = frame.left_delimiter
+        right_delimiter = frame.right_delimiter
+        # Output is yielded, unless the frame is collecting the output of a lambda variable
+        capture = frame.capture
+
+        while pointer < end:
+            (token, value, indentation), position_pointer = tokens[pointer]
+            pointer += 1
+
+            if token is Token.LITERAL:
+                if capture is None:
+                    yield value
+                else:
+                    capture.append(value)
+                continue
+
+            if profiler is not None and token in KINDS:
+                line = profiler.token_line(template, tokens, pointer - 1)
+                start = profiler.enter()
+
+            if token is Token.VARIABLE or token is Token.NO_ESCAPE:
+                variable = find_in_context(context_stack, value, split_name(value))
+                if variable is MISSING:
+                    variable = missing_variable_handler(
+                        value, f'{left_delimiter} {value} {right_delimiter}'
+                    )
 
-            env_name, env_pointer, [env_var, _] = current_env
+                if profiler is not None and not is_lambda(variable):
+                    serialize_start = profiler.enter()
 
-            if should_iterate(env_var):
-                current_env[2][1] += 1
-                try:
-                    next_item = env_var[current_env[2][1]]
-                    context_stack.append(next_item)
-                    pointer = env_pointer
-                    continue
-                except IndexError:
-                    pass
-
-            if env_name != value:
-                raise MustacheSyntaxError.from_template_pointer(
-                    f'Unexpected section end tag on line {{line_number}}. Expected "{env_name}" got "{value}"',
-                    template,
-                    position_pointer,
-                )
+                if type(variable) is str and pass_strings:
+                    chunk = (
+                        escape(variable) if token is Token.VARIABLE and escape_html else variable
+                    )
+                elif is_lambda(variable):
+                    check_depth(frame.depth + 1, max_depth)
+                    if deadline is not None:
+                        countdown = count_down(countdown, deadline)
+                    timings = None
+                    if profiler is not None:
+                        timings = (('lambda', value, line, profiler.enter()),)
+                        profiler.templates.append(f'{value} (lambda)')
+                    lambda_template = invoke_lambda(variable, name=value)
+                    lambda_tokenized = load_lambda_result(lambda_template, '{{', '}}', cache_tokens)
+                    frame.pointer = pointer
+                    frames.append(frame)
+                    frame = Frame(
+                        lambda_template,
+                        lambda_tokenized,
+                        0,
+                        len(lambda_tokenized.tokens),
+                        '{{',
+                        '}}',
+                        {},
+                        frame.depth + 1,
+                        len(section_stack),
+                        [],
+                        token,
+                        timings,
+                        None if profiler is None else ('variable', value, line, start),
+                    )
+                    break
+                elif token is Token.VARIABLE and escape_html:
+                    chunk = escape_value(variable, serializer)
+                else:
+                    chunk = serializer(variable)
 
-            env_stack.pop()
+                if capture is None:
+                    yield chunk
+                else:
+                    capture.append(chunk)
 
-        if not current_context and len(context_stack) != 1:
-            if token in [Token.SECTION, Token.INVERTED]:
-                context_stack.append(False)
-                env_stack.append([value, pointer, [False, 0]])
-            continue
+                if profiler is not None:
+                    profiler.leave('serialize', value, line, serialize_start)
+                    profiler.leave('variable', value, line, start)
 
-        if token in [Token.NO_ESCAPE, Token.VARIABLE, Token.SECTION, Token.INVERTED]:
-            try:
-                variable = get_from_context(context_stack, value)
-            except MissingVariable:
-                variable = missing_variable_handler(
-                    value, f'{left_delimiter} {value} {right_delimiter}'
-                )
-        else:
-            variable = None
-
-        if token is Token.LITERAL:
-            output += value
-
-        elif token is Token.NO_ESCAPE:
-            if is_lambda(variable):
-                variable = render(
-                    invoke_lambda(variable, name=value),
-                    current_context,
-                    serializer=serializer,
-                    partials=partials,
-                )
-            output += serializer(variable)
-
-        elif token is Token.VARIABLE:
-            if is_lambda(variable):
-                variable = render(
-                    invoke_lambda(variable, name=value),
-                    current_context,
-                    serializer=serializer,
-                    partials=partials,
-                )
+            elif token is Token.SECTION:
+                variable = find_in_context(context_stack, value, split_name(value))
+                if variable is MISSING:
+                    variable = missing_variable_handler(
+                        value, f'{left_delimiter} {value} {right_delimiter}'
+                    )
 
-            if escape_html:
-                output += escape(serializer(variable))
-            else:
-                output += serializer(variable)
+                if variable and is_lambda(variable):
+                    skip_pointer = section_ends.get(pointer - 1)
+                    if skip_pointer is None:
+                        raise unclosed_section(value, template, tag_pointer(tokens, pointer - 1))
+
+                    section_text = sections.get(pointer - 1)
+                    if section_text is None:
+                        # The section text ends where the token before the end tag does
+                        section_text = template[position_pointer : tokens[skip_pointer - 2][1]]
+                        sections[pointer - 1] = section_text
+
+                    check_depth(frame.depth + 1, max_depth)
+                    if deadline is not None:
+                        countdown = count_down(countdown, deadline)
+                    timings = None
+                    if profiler is not None:
+                        timings = (
+                            ('lambda', value, line, profiler.enter()),
+                            ('section', value, line, start),
+                        )
+                        profiler.templates.append(f'{value} (lambda)')
+                    lambda_template = invoke_lambda(variable, name=value, template=section_text)
+                    lambda_tokenized = load_lambda_result(
+                        lambda_template, left_delimiter, right_delimiter, cache_tokens
+                    )
+                    frame.pointer = skip_pointer
+                    frames.append(frame)
+                    frame = Frame(
+                        lambda_template,
+                        lambda_tokenized,
+                        0,
+                        len(lambda_tokenized.tokens),
+                        left_delimiter,
+                        right_delimiter,
+                        {},
+                        frame.depth + 1,
+                        len(section_stack),
+                        capture,
+                        timings=timings,
+                    )
+                    break
 
-        elif token in [Token.SECTION, Token.INVERTED]:
-            if token is Token.INVERTED:
-                if is_lambda(variable):
-                    variable = False
+                items = None
+                if variable and should_iterate(variable):
+                    items = iter(variable)
+                    variable = next(items, MISSING)
+                    empty = variable is MISSING
                 else:
-                    variable = not variable
+                    empty = not variable
 
-            if not variable:
-                if cache_tokens:
-                    _, skip_pointer = find_closing_pointer_limits_cached(pointer, value, tokens)
-                else:
-                    _, skip_pointer = find_closing_pointer_limits(
-                        position_pointer,
-                        value,
-                        tokenize(template, pointer, left_delimiter, right_delimiter),
-                    )
-                if skip_pointer is not None:
+                if empty:
+                    skip_pointer = section_ends.get(pointer - 1)
+                    if skip_pointer is None:
+                        raise unclosed_section(value, template, tag_pointer(tokens, pointer - 1))
                     pointer = skip_pointer
+                    if profiler is not None:
+                        profiler.leave('section', value, line, start)
                     continue
 
-                raise MustacheSyntaxError.from_template_pointer(
-                    f'Unclosed section "{value}" beginning on line {{line_number}}',
-                    template,
-                    position_pointer,
+                if deadline is not None:
+                    countdown = count_down(countdown, deadline)
+                context_stack.append(variable)
+                section_stack.append(
+                    [
+                        value,
+                        pointer,
+                        items,
+                        True,
+                        None if profiler is None else ('section', value, line, start),
+                    ]
                 )
 
-            if is_lambda(variable):
-                if cache_tokens:
-                    section_end_pointer, skip_pointer = find_closing_pointer_limits_cached(
-                        pointer, value, tokens
+            elif token is Token.INVERTED:
+                variable = find_in_context(context_stack, value, split_name(value))
+                if variable is MISSING:
+                    variable = missing_variable_handler(
+                        value, f'{left_delimiter} {value} {right_delimiter}'
                     )
+
+                if variable or is_lambda(variable):
+                    skip_pointer = section_ends.get(pointer - 1)
+                    if skip_pointer is None:
+                        raise unclosed_section(value, template, tag_pointer(tokens, pointer - 1))
+                    pointer = skip_pointer
+                    if profiler is not None:
+                        profiler.leave('inverted', value, line, start)
                 else:
-                    section_end_pointer, skip_pointer = find_closing_pointer_limits(
-                        position_pointer,
-                        value,
-                        tokenize(template, pointer, left_delimiter, right_delimiter),
+                    section_stack.append(
+                        [
+                            value,
+                            pointer,
+                            None,
+                            False,
+                            None if profiler is None else ('inverted', value, line, start),
+                        ]
                     )
 
-                if skip_pointer is not None:
-                    lambda_output = render(
-                        invoke_lambda(
-                            variable,
-                            name=value,
-                            template=template[position_pointer:section_end_pointer],
-                        ),
-                        current_context,
-                        serializer=serializer,
-                        partials=partials,
-                        left_delimiter=left_delimiter,
-                        right_delimiter=right_delimiter,
+            elif token is Token.END:
+                if len(section_stack) == frame.section_base:
+                    raise MustacheSyntaxError.from_template_pointer(
+                        f'Unexpected section end tag on line {{line_number}}. Got "{value}"',
+                        template,
+                        tag_pointer(tokens, pointer - 1),
                     )
-                    output += lambda_output
-                    pointer = skip_pointer
-                    continue
 
-            if should_iterate(variable):
-                try:
-                    context_item = variable[0]
-                    context_stack.append(context_item)
-                except IndexError:
-                    context_stack.append(False)
-            else:
-                context_stack.append(variable)
-            env_stack.append([value, pointer, [variable, 0]])
+                section = section_stack[-1]
+                if section[0] != value:
+                    raise MustacheSyntaxError.from_template_pointer(
+                        f'Unexpected section end tag on line {{line_number}}. Expected "{section[0]}" got "{value}"',
+                        template,
+                        tag_pointer(tokens, pointer - 1),
+                    )
 
-        elif token is Token.PARTIAL:
-            partial_template = partials.get(value)  # potentially raise error here
-            if partial_template is None:
-                partial_template = missing_partial_handler(
-                    value, f'{left_delimiter} {value} {right_delimiter}'
-                )
+                items = section[2]
+                if items is not None:
+                    variable = next(items, MISSING)
+                    if variable is not MISSING:
+                        if deadline is not None:
+                            countdown = count_down(countdown, deadline)
+                        context_stack[-1] = variable
+                        pointer = section[1]
+                        continue
+
+                section_stack.pop()
+                if section[3]:
+                    context_stack.pop()
+                if profiler is not None and section[4] is not None:
+                    profiler.leave(*section[4])
+
+            elif token is Token.PARTIAL:
+                partial_template = loader.get(value)
+                if partial_template is None:
+                    partial_template = missing_partial_handler(
+                        value, f'{left_delimiter} {value} {right_delimiter}'
+                    )
 
-            if partial_template != '':
-                remove_trailing_indentation = False
+                if partial_template != '':
+                    check_depth(frame.depth + 1, max_depth)
+                    if deadline is not None:
+                        countdown = count_down(countdown, deadline)
+                    partial_source, partial_tokenized = load_partial(
+                        value, partial_template, indentation, cache_tokens
+                    )
+                    timings = None
+                    if profiler is not None:
+                        timings = (('partial', value, line, start),)
+                        profiler.templates.append(value)
+                    frame.pointer = pointer
+                    frames.append(frame)
+                    frame = Frame(
+                        partial_source,
+                        partial_tokenized,
+                        0,
+                        len(partial_tokenized.tokens),
+                        '{{',
+                        '}}',
+                        {},
+                        frame.depth + 1,
+                        len(section_stack),
+                        capture,
+                        timings=timings,
+                    )
+                    break
 
-                if partial_template.endswith('\n'):
-                    remove_trailing_indentation = True
+                if profiler is not None:
+                    profiler.leave('partial', value, line, start)
 
-                partial_template = indentation + f'\n{indentation}'.join(
-                    partial_template.split('\n')
-                )
+            elif token is Token.PARENT:
+                skip_pointer = section_ends.get(pointer - 1)
+                if skip_pointer is None:
+                    raise unclosed_section(value, template, tag_pointer(tokens, pointer - 1))
 
-                if remove_trailing_indentation:
-                    partial_template = partial_template[: -len(indentation)]
+                blocks = sections.get(pointer - 1)
+                if blocks is None:
+                    blocks = find_blocks(tokens, section_ends, pointer, skip_pointer - 1)
+                    sections[pointer - 1] = blocks
 
-                partial_output = render(
-                    partial_template, current_context, serializer=serializer, partials=partials
-                )
-                output += partial_output
+                parent_template = loader.get(value)
+                if parent_template is None:
+                    parent_template = missing_partial_handler(
+                        value, f'{left_delimiter} {value} {right_delimiter}'
+                    )
 
-        elif token is Token.PARENT:
-            partial_template = partials.get(value)  # potentially raise error here
-            if partial_template is None:
-                partial_template = missing_partial_handler(
-                    value, f'{left_delimiter} {value} {right_delimiter}'
+                if parent_template == '':
+                    pointer = skip_pointer
+                    if profiler is not None:
+                        profiler.leave('parent', value, line, start)
+                    continue
+
+                # Overrides from enclosing templates take precedence, so the outermost wins
+                overrides = frame.overrides
+                parent_overrides = dict(overrides)
+                for name, block_start, block_end in blocks:
+                    if name not in overrides:
+                        parent_overrides[name] = Block(
+                            template,
+                            tokenized,
+                            block_start,
+                            block_end,
+                            left_delimiter,
+                            right_delimiter,
+                            overrides,
+                        )
+
+                check_depth(frame.depth + 1, max_depth)
+                if deadline is not None:
+                    countdown = count_down(countdown, deadline)
+                parent_source, parent_tokenized = load_partial(
+                    value, parent_template, indentation, cache_tokens
+                )
+                timings = None
+                if profiler is not None:
+                    timings = (('parent', value, line, start),)
+                    profiler.templates.append(value)
+                frame.pointer = skip_pointer
+                frames.append(frame)
+                frame = Frame(
+                    parent_source,
+                    parent_tokenized,
+                    0,
+                    len(parent_tokenized.tokens),
+                    '{{',
+                    '}}',
+                    parent_overrides,
+                    frame.depth + 1,
+                    len(section_stack),
+                    capture,
+                    timings=timings,
                 )
-            if partial_template != '':
-                remove_trailing_indentation = False
+                break
 
-                if partial_template.endswith('\n'):
-                    remove_trailing_indentation = True
+            elif token is Token.SUBSTITUTION:
+                block = frame.overrides.get(value)
+                if block is None:
+                    # Render the block's default content
+                    section_stack.append([value, pointer, None, False, None])
+                    continue
 
-                partial_template = indentation + f'\n{indentation}'.join(
-                    partial_template.split('\n')
+                skip_pointer = section_ends.get(pointer - 1)
+                if skip_pointer is None:
+                    raise unclosed_section(value, template, tag_pointer(tokens, pointer - 1))
+
+                frame.pointer = skip_pointer
+                frames.append(frame)
+                frame = Frame(
+                    block.template,
+                    block.tokenized,
+                    block.start,
+                    block.end,
+                    block.left_delimiter,
+                    block.right_delimiter,
+                    block.overrides,
+                    frame.depth,
+                    len(section_stack),
+                    capture,
                 )
+                break
 
-                if remove_trailing_indentation:
-                    partial_template = partial_template[: -len(indentation)]
+            elif token is Token.SET_DELIMITER:
+                new_delimiters = value.strip().split(' ')
+                left_delimiter = frame.left_delimiter = new_delimiters[0]
+                right_delimiter = frame.right_delimiter = new_delimiters[-1]
 
-                partial_output = render(
-                    partial_template, current_context, serializer=serializer, partials=partials
-                )
-                output += partial_output
+        else:
+            if len(section_stack) > frame.section_base:
+                name, start_pointer, _, _, _ = section_stack[-1]
+                raise unclosed_section(name, template, tag_pointer(tokens, start_pointer - 1))
+
+            if not frames:
+                return
+
+            finished = frame
+            frame = frames.pop()
+            if profiler is not None and finished.timings is not None:
+                # The tags including the frame are recorded in the template that includes it
+                profiler.templates.pop()
+                for timing in finished.timings:
+                    profiler.leave(*timing)
+
+            if finished.capture_token is not None:
+                if profiler is not None:
+                    serialize_start = profiler.enter()
+
+                rendered = ''.join(finished.capture or ())
+                if pass_strings:
+                    if finished.capture_token is Token.VARIABLE and escape_html:
+                        rendered = escape(rendered)
+                elif finished.capture_token is Token.VARIABLE and escape_html:
+                    rendered = escape_value(rendered, serializer)
+                else:
+                    rendered = serializer(rendered)
 
-            if cache_tokens:
-                section_end_pointer, skip_pointer = find_closing_pointer_limits_cached(
-                    pointer, value, tokens
-                )
-            else:
-                section_end_pointer, skip_pointer = find_closing_pointer_limits(
-                    position_pointer,
-                    value,
-                    tokenize(template, pointer, left_delimiter, right_delimiter),
-                )
+                if frame.capture is None:
+                    yield rendered
+                else:
+                    frame.capture.append(rendered)
 
-            pointer = skip_pointer
+                if profiler is not None and finished.capture_timing is not None:
+                    _, value, line, start = finished.capture_timing
+                    profiler.leave('serialize', value, line, serialize_start)
+                    profiler.leave(*finished.capture_timing)
 
-        elif token is Token.SUBSTITUTION:
-            context_stack.append(True)
-            env_stack.append([value, pointer, [None, 0]])
 
+# pylint:disable=too-many-arguments
+def render(
+    template: str,
+    context: Dict,
+    serializer: Optional[CallableType[[Any], str]] = None,
+    partials: Optional[Partials] = None,
+    missing_variable_handler: Optional[CallableType[[str, str], str]] = None,
+    missing_partial_handler: Optional[CallableType[[str, str], str]] = None,
+    left_delimiter: Optional[str] = None,
+    right_delimiter: Optional[str] = None,
+    cache_tokens: bool = True,
+    escape_html: bool = True,
+    profiler: Optional[Profiler] = None,
+    name: Optional[str] = None,
+    max_output_chars: Optional[int] = None,
+    max_depth: Optional[int] = MAX_DEPTH,
+    deadline: Optional[float] = None,
+) -> str:
+    """Render a mustache template
+
+    If a profiler is passed, the time spent in each tag is recorded. If metrics are configured,
+    the render is reported under name.
+
+    The render is stopped with a RenderLimitExceeded error once it has output more than
+    max_output_chars characters, nests partials, parents and lambda results more than max_depth
+    (by default MAX_DEPTH, or None for no limit) deep, or runs past deadline, a time.monotonic()
+    value. Profiled renders are limited in the same way.
+    """
+    recorder = metrics.RECORDER
+    if recorder is not None:
+        missing_variable_handler, missing_partial_handler = recorder.count_handlers(
+            missing_variable_handler, missing_partial_handler
+        )
+        timing = recorder.start(name, profiler)
+        profiler = timing.profiler
+
+    output = ''.join(
+        render_iter(
+            template,
+            context,
+            serializer=serializer,
+            partials=partials,
+            missing_variable_handler=missing_variable_handler,
+            missing_partial_handler=missing_partial_handler,
+            left_delimiter=left_delimiter,
+            right_delimiter=right_delimiter,
+            cache_tokens=cache_tokens,
+            escape_html=escape_html,
+            max_output_chars=max_output_chars,
+            max_depth=max_depth,
+            deadline=deadline,
+            profiler=profiler,
+        )
+    )
+
+    if recorder is not None:
+        timing.finish(len(output))
     return output
+
+
+# pylint:disable=too-many-arguments
+def render_to(
+    stream: TextIO,
+    template: str,
+    context: Dict,
+    serializer: Optional[CallableType[[Any], str]] = None,
+    partials: Optional[Partials] = None,
+    missing_variable_handler: Optional[CallableType[[str, str], str]] = None,
+    missing_partial_handler: Optional[CallableType[[str, str], str]] = None,
+    left_delimiter: Optional[str] = None,
+    right_delimiter: Optional[str] = None,
+    cache_tokens: bool = True,
+    escape_html: bool = True,
+    buffer_size: int = io.DEFAULT_BUFFER_SIZE,
+    name: Optional[str] = None,
+    max_output_chars: Optional[int] = None,
+    max_depth: Optional[int] = MAX_DEPTH,
+    deadline: Optional[float] = None,
+) -> None:
+    """Render a mustache template into a text stream, writing whenever buffer_size characters
+    of output have been buffered
+
+    If metrics are configured, the render is reported under name. Renders are limited as by
+    render_iter; output written before a limit is exceeded is left in the stream.
+    """
+    recorder = metrics.RECORDER
+    if recorder is not None:
+        missing_variable_handler, missing_partial_handler = recorder.count_handlers(
+            missing_variable_handler, missing_partial_handler
+        )
+        timing = recorder.start(name)
+
+    writer = StreamWriter(stream, buffer_size)
+    for chunk in render_iter(
+        template,
+        context,
+        serializer=serializer,
+        partials=partials,
+        missing_variable_handler=missing_variable_handler,
+        missing_partial_handler=missing_partial_handler,
+        left_delimiter=left_delimiter,
+        right_delimiter=right_delimiter,
+        cache_tokens=cache_tokens,
+        escape_html=escape_html,
+        max_output_chars=max_output_chars,
+        max_depth=max_depth,
+        deadline=deadline,
+        profiler=None if recorder is None else timing.profiler,
+    ):
+        writer.append(chunk)
+    writer.flush()
+
+    if recorder is not None:
+        timing.finish(writer.written)
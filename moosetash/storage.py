@@ -0,0 +1,296 @@
+"""Serialize compiled templates and token streams, and cache them in a directory on disk"""
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+from typing import Any, Dict, Optional, Tuple, Type, Union
+
+from .codegen import PythonTemplate
+from .exceptions import InvalidCacheEntry
+from .template import Node, Template
+from .tokenizer import (
+    TOKEN_CACHE,
+    Token,
+    Tokenized,
+    TokenStream,
+    token_stream_size,
+    tokenize_sections,
+)
+from .version import __version__
+
+PathType = Union[str, 'os.PathLike[str]']
+
+# Identifies serialized templates, and the layout of the data that follows, including the code
+# generated for Python templates
+MAGIC = 'moosetash'
+FORMAT_VERSION = 3
+
+TOKENS = {int(token): token for token in Token}
+
+TEMPLATE_CLASSES: Dict[str, Type[Template]] = {
+    'Template': Template,
+    'PythonTemplate': PythonTemplate,
+}
+
+
+def source_hash(source: str) -> str:
+    """Hash a template source, to check that a serialized template was built from it"""
+    return hashlib.sha256(source.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def dump_nodes(nodes: Tuple[Node, ...]) -> Tuple[Any, ...]:
+    """Convert a node tree to nested tuples of built in types, which marshal can serialize"""
+    return tuple(
+        (
+            int(node.token),
+            node.value,
+            node.tag,
+            dump_nodes(node.children),
+            node.section_text,
+            node.indentation,
+            node.delimiters,
+            node.path,
+            node.line,
+        )
+        for node in nodes
+    )
+
+
+def load_nodes(data: Tuple[Any, ...]) -> Tuple[Node, ...]:
+    """Rebuild a node tree converted by dump_nodes"""
+    return tuple(
+        Node(
+            TOKENS[token],
+            value,
+            tag,
+            load_nodes(children),
+            section_text,
+            indentation,
+            delimiters,
+            path,
+            line,
+        )
+        for (
+            token,
+            value,
+            tag,
+            children,
+            section_text,
+            indentation,
+            delimiters,
+            path,
+            line,
+        ) in data
+    )
+
+
+def dump_tokens(tokens: TokenStream) -> Tuple[Any, ...]:
+    """Convert a token stream to nested tuples of built in types"""
+    return tuple(
+        ((int(token), value, indentation), pointer)
+        for (token, value, indentation), pointer in tokens
+    )
+
+
+def load_tokens(data: Tuple[Any, ...]) -> TokenStream:
+    """Rebuild a token stream converted by dump_tokens"""
+    return tuple(
+        ((TOKENS[token], value, indentation), pointer)
+        for (token, value, indentation), pointer in data
+    )
+
+
+def pack(kind: str, source: str, payload: Any) -> bytes:
+    """Serialize a payload with a header identifying its kind, its source, and the versions of
+    moosetash and Python that wrote it"""
+    return marshal.dumps(
+        (
+            MAGIC,
+            FORMAT_VERSION,
+            __version__,
+            sys.implementation.cache_tag,
+            kind,
+            source_hash(source),
+            payload,
+        )
+    )
+
+
+def unpack(data: bytes, source: Optional[str] = None) -> Tuple[str, Any]:
+    """Deserialize data written by pack, returning its kind and payload
+
+    Raises InvalidCacheEntry if the data is corrupt, was written by a different version of
+    moosetash or Python, or, if source is given, was built from a different source.
+    """
+    try:
+        magic, format_version, version, cache_tag, kind, built_hash, payload = marshal.loads(data)
+    except (EOFError, ValueError, TypeError) as ex:
+        raise InvalidCacheEntry('Serialized template is corrupt') from ex
+
+    if magic != MAGIC or format_version != FORMAT_VERSION or version != __version__:
+        raise InvalidCacheEntry(f'Serialized template was written by moosetash {version}')
+
+    if cache_tag != sys.implementation.cache_tag:
+        # Generated code is stored as a code object, which only loads in the same Python version
+        raise InvalidCacheEntry(f'Serialized template was written by {cache_tag}')
+
+    if source is not None and built_hash != source_hash(source):
+        raise InvalidCacheEntry('Serialized template was built from a different source')
+
+    return kind, payload
+
+
+def dumps(template: Template) -> bytes:
+    """Serialize a compiled template, keeping the generated code of a PythonTemplate"""
+    kind = type(template).__name__
+    if TEMPLATE_CLASSES.get(kind) is not type(template):
+        raise TypeError(f'Templates of type {kind} can\'t be serialized')
+
+    payload: Tuple[Any, ...] = (template.source, dump_nodes(template.nodes))
+    if isinstance(template, PythonTemplate):
+        payload += (template.python_source, template.code)
+    return pack(kind, template.source, payload)
+
+
+def loads(data: bytes, source: Optional[str] = None) -> Template:
+    """Load a template serialized by dumps, raising InvalidCacheEntry if it can't be used
+
+    Loading a PythonTemplate executes its generated source, so only load data you trust.
+    """
+    kind, payload = unpack(data, source)
+    if kind not in TEMPLATE_CLASSES:
+        raise InvalidCacheEntry(f'Serialized data is not a template. Got "{kind}"')
+
+    try:
+        template_source, nodes, *generated = payload
+        nodes = load_nodes(nodes)
+    except (KeyError, TypeError, ValueError) as ex:
+        raise InvalidCacheEntry('Serialized template is corrupt') from ex
+    return TEMPLATE_CLASSES[kind](template_source, nodes, *generated)
+
+
+def dumps_tokens(
+    source: str, tokenized: Tokenized, left_delimiter: str = '{{', right_delimiter: str = '}}'
+) -> bytes:
+    """Serialize the token stream of a template, tokenized with the given delimiters"""
+    return pack(
+        'tokens',
+        source,
+        (left_delimiter, right_delimiter, dump_tokens(tokenized.tokens), tokenized.section_ends),
+    )
+
+
+def loads_tokens(
+    data: bytes, source: str, left_delimiter: str = '{{', right_delimiter: str = '}}'
+) -> Tokenized:
+    """Load a token stream serialized by dumps_tokens, raising InvalidCacheEntry if it can't be
+    used for this source and these delimiters"""
+    kind, payload = unpack(data, source)
+    if kind != 'tokens':
+        raise InvalidCacheEntry(f'Serialized data is not a token stream. Got "{kind}"')
+
+    try:
+        built_left_delimiter, built_right_delimiter, tokens, section_ends = payload
+        tokens = load_tokens(tokens)
+    except (KeyError, TypeError, ValueError) as ex:
+        raise InvalidCacheEntry('Serialized token stream is corrupt') from ex
+
+    if (built_left_delimiter, built_right_delimiter) != (left_delimiter, right_delimiter):
+        raise InvalidCacheEntry('Serialized token stream was built with different delimiters')
+    return Tokenized(tokens, section_ends, {})
+
+
+class TemplateCache:
+    """Compiled templates and token streams, stored in a directory so they outlive the process
+
+    Entries are stored by template name, and loaded back only if they were written by this
+    version of moosetash from the same source. Missing or stale entries are compiled and written
+    again. Files are replaced atomically, so processes can share a directory.
+
+    Loading a PythonTemplate executes its generated source, so the directory must be trusted.
+    """
+
+    def __init__(self, directory: PathType, template_class: Type[Template] = Template):
+        if TEMPLATE_CLASSES.get(template_class.__name__) is not template_class:
+            raise TypeError(f'Templates of type {template_class.__name__} can\'t be serialized')
+        self.directory = os.fspath(directory)
+        self.template_class = template_class
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.directory!r}, {self.template_class.__name__})'
+
+    def path(self, name: str, kind: str) -> str:
+        """The path of the file holding an entry, named by a hash so any name is a safe path"""
+        digest = hashlib.sha256(name.encode('utf-8', 'surrogatepass')).hexdigest()[:32]
+        return os.path.join(self.directory, f'{digest}.{kind}.cache')
+
+    def read(self, path: str) -> Optional[bytes]:
+        """Read a cache file, returning None if it doesn't exist"""
+        try:
+            with open(path, 'rb') as cache_file:
+                return cache_file.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, path: str, data: bytes) -> None:
+        """Write a cache file atomically, so readers never see a partly written file"""
+        os.makedirs(self.directory, exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as cache_file:
+                cache_file.write(data)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    def load(self, name: str, source: str) -> Optional[Template]:
+        """Load a compiled template, or return None if it is missing or stale"""
+        data = self.read(self.path(name, self.template_class.__name__))
+        if data is None:
+            return None
+        try:
+            return loads(data, source)
+        except InvalidCacheEntry:
+            return None
+
+    def store(self, name: str, template: Template) -> None:
+        """Write a compiled template to the cache"""
+        self.write(self.path(name, type(template).__name__), dumps(template))
+
+    def get(self, name: str, source: str) -> Template:
+        """Load a compiled template, compiling and storing it if it is missing or stale"""
+        template = self.load(name, source)
+        if template is None:
+            template = self.template_class.compile(source)
+            self.store(name, template)
+        return template
+
+    def get_tokens(
+        self, name: str, source: str, left_delimiter: str = '{{', right_delimiter: str = '}}'
+    ) -> Tokenized:
+        """Load the token stream of a template, tokenizing and storing it if missing or stale
+
+        The token stream is also added to tokenizer.TOKEN_CACHE, so render skips tokenizing the
+        template.
+        """
+        path = self.path(name, 'tokens')
+        data = self.read(path)
+        tokenized = None
+        if data is not None:
+            try:
+                tokenized = loads_tokens(data, source, left_delimiter, right_delimiter)
+            except InvalidCacheEntry:
+                pass
+
+        if tokenized is None:
+            tokenized = tokenize_sections(source, left_delimiter, right_delimiter)
+            self.write(path, dumps_tokens(source, tokenized, left_delimiter, right_delimiter))
+
+        TOKEN_CACHE.set(
+            (source, left_delimiter, right_delimiter),
+            tokenized,
+            token_stream_size(source, tokenized.tokens, tokenized.section_ends),
+        )
+        return tokenized
@@ -0,0 +1,780 @@
+"""Compile a Mustache template into a reusable node tree"""
+import io
+import sys
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, TextIO, Tuple, TypeVar
+from typing import Callable as CallableType
+from typing import TYPE_CHECKING, Protocol
+
+from . import metrics
+from .cache import LRUCache
+from .context import MISSING, Path, find_in_context, split_name
+from .exceptions import DepthLimitExceeded, MustacheSyntaxError
+from .escaping import escape, escape_value
+from .handlers import (
+    default_serializer,
+    missing_partial_default,
+    missing_variable_default,
+    passes_strings,
+)
+from .limits import (
+    DEADLINE_CHECK_INTERVAL,
+    MAX_DEPTH,
+    check_depth,
+    check_output,
+    check_start,
+    count_down,
+)
+from .loaders import NO_PARTIALS, Partials
+from .tokenizer import Token, tokenize
+from .types import invoke_lambda, is_lambda, should_iterate
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .profiler import Profiler
+
+SECTION_TOKENS = (Token.SECTION, Token.INVERTED, Token.PARENT, Token.SUBSTITUTION)
+LOOKUP_SECTION_TOKENS = (Token.SECTION, Token.INVERTED)
+
+# Indented, tokenized or compiled partials, keyed by (kind, partial name, indentation). Parent
+# templates are keyed by a kind including the block overrides they are compiled with
+PARTIAL_CACHE = LRUCache(maxsize=1024, max_bytes=64 * 1024 * 1024)
+metrics.register_cache('partials', PARTIAL_CACHE)
+
+# Tokenized or compiled templates returned by lambdas, keyed by (kind, template, left delimiter,
+# right delimiter)
+LAMBDA_CACHE = LRUCache(maxsize=1024, max_bytes=16 * 1024 * 1024)
+metrics.register_cache('lambdas', LAMBDA_CACHE)
+
+Built = TypeVar('Built')
+
+# The nodes replacing each block in a parent template, keyed by block name
+Overrides = Dict[str, Tuple['Node', ...]]
+
+
+class Output(Protocol):
+    """Anything rendered chunks of output can be appended to, such as a list"""
+
+    def append(self, chunk: str) -> None:  # pragma: no cover
+        ...
+
+
+class StreamWriter:
+    """Buffer chunks of output, writing them to a text stream once the buffer passes a threshold"""
+
+    __slots__ = ('stream', 'buffer_size', 'chunks', 'buffered', 'written')
+
+    def __init__(self, stream: TextIO, buffer_size: int = io.DEFAULT_BUFFER_SIZE):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.chunks: List[str] = []
+        self.buffered = 0
+        # Characters written to the stream so far
+        self.written = 0
+
+    def append(self, chunk: str) -> None:
+        """Add a chunk to the buffer, writing the buffer out if it is full"""
+        self.chunks.append(chunk)
+        self.buffered += len(chunk)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write any buffered chunks to the stream"""
+        if self.chunks:
+            self.stream.write(''.join(self.chunks))
+            self.written += self.buffered
+            self.chunks.clear()
+            self.buffered = 0
+
+
+class LimitedOutput:
+    """Append chunks of output to another output, raising OutputLimitExceeded once there are more
+    than max_output_chars characters"""
+
+    __slots__ = ('output', 'max_output_chars', 'size')
+
+    def __init__(self, output: Output, max_output_chars: int):
+        self.output = output
+        self.max_output_chars = max_output_chars
+        self.size = 0
+
+    def append(self, chunk: str) -> None:
+        """Count a chunk, then append it to the output"""
+        self.size += len(chunk)
+        check_output(self.size, self.max_output_chars)
+        self.output.append(chunk)
+
+
+def limit(output: Output, max_output_chars: Optional[int]) -> Output:
+    """Limit an output to max_output_chars characters, if given"""
+    if max_output_chars is None:
+        return output
+    return LimitedOutput(output, max_output_chars)
+
+
+class Node(NamedTuple):
+    """A node in a compiled template tree"""
+
+    token: Token
+    value: str
+    tag: str = ''
+    # The nodes inside a section, typed loosely as mypy can't check recursive NamedTuples
+    children: Tuple[Any, ...] = ()
+    section_text: str = ''
+    indentation: str = ''
+    delimiters: Tuple[str, str] = ('{{', '}}')
+    path: Path = ()
+    # The line of the template the node starts on
+    line: int = 1
+
+
+def indent(template: str, indentation: str) -> str:
+    """Indent every line of a standalone partial"""
+    if indentation == '':
+        return template
+
+    indented = indentation + f'\n{indentation}'.join(template.split('\n'))
+    if template.endswith('\n'):
+        indented = indented[: -len(indentation)]
+    return indented
+
+
+def cached_partial(
+    kind: Any, name: str, source: str, indentation: str, build: CallableType[[str], Built]
+) -> Built:
+    """Indent a partial and build it, reusing the result from PARTIAL_CACHE if available
+
+    Each entry holds the partial source it was built from, and is rebuilt if the source now
+    found in the partials mapping differs, so changing the mapping never renders stale partials.
+    """
+    key = (kind, name, indentation)
+    entry = PARTIAL_CACHE.get(key)
+    if entry is not None and (entry[0] is source or entry[0] == source):
+        return entry[1]
+
+    indented = indent(source, indentation)
+    built = build(indented)
+    # A rough estimate: the source, its indented copy, and the tokens or nodes built from it
+    PARTIAL_CACHE.set(key, (source, built), sys.getsizeof(source) + 3 * sys.getsizeof(indented))
+    return built
+
+
+def cached_lambda(
+    kind: Any,
+    template: str,
+    left_delimiter: str,
+    right_delimiter: str,
+    build: CallableType[[str, str, str], Built],
+) -> Built:
+    """Build a template returned by a lambda, reusing the result from LAMBDA_CACHE if available"""
+    key = (kind, template, left_delimiter, right_delimiter)
+    built = LAMBDA_CACHE.get(key)
+    if built is None:
+        built = build(template, left_delimiter, right_delimiter)
+        # A rough estimate: the template, and the tokens or nodes built from it
+        LAMBDA_CACHE.set(key, built, 4 * sys.getsizeof(template))
+    return built
+
+
+def parse(
+    template: str, left_delimiter: str = '{{', right_delimiter: str = '}}'
+) -> Tuple[Node, ...]:
+    """Parse a template into a tree of nodes, resolving section nesting"""
+    return parse_tokens(
+        template,
+        tokenize(template, 0, left_delimiter, right_delimiter),
+        left_delimiter,
+        right_delimiter,
+    )
+
+
+# pylint:disable=too-many-locals
+def parse_tokens(
+    template: str,
+    tokens: Iterable[Tuple[Tuple[Token, str, str], int]],
+    left_delimiter: str = '{{',
+    right_delimiter: str = '}}',
+) -> Tuple[Node, ...]:
+    """Parse a stream of tokens from a template into a tree of nodes"""
+
+    nodes: List[Node] = []
+    open_sections: List[Tuple[Token, str, str, int, int, str, Tuple[str, str], List[Node]]] = []
+    # Where the previous token ends, which is on the line the next tag starts on
+    previous_pointer = 0
+    line = 1
+
+    for (token, value, indentation), pointer in tokens:
+        tag = f'{left_delimiter} {value} {right_delimiter}'
+
+        if token is Token.LITERAL:
+            nodes.append(Node(token, value, line=line))
+
+        elif token in (Token.VARIABLE, Token.NO_ESCAPE):
+            nodes.append(Node(token, value, tag, path=split_name(value), line=line))
+
+        elif token is Token.PARTIAL:
+            nodes.append(Node(token, value, tag, indentation=indentation, line=line))
+
+        elif token is Token.SET_DELIMITER:
+            new_delimiters = value.strip().split(' ')
+            left_delimiter = new_delimiters[0]
+            right_delimiter = new_delimiters[-1]
+
+        elif token in SECTION_TOKENS:
+            open_sections.append(
+                (
+                    token,
+                    value,
+                    tag,
+                    pointer,
+                    line,
+                    indentation,
+                    (left_delimiter, right_delimiter),
+                    nodes,
+                )
+            )
+            nodes = []
+
+        elif token is Token.END:
+            if not open_sections:
+                raise MustacheSyntaxError.from_template_pointer(
+                    f'Unexpected section end tag on line {{line_number}}. Got "{value}"',
+                    template,
+                    previous_pointer,
+                )
+
+            (
+                section_token,
+                name,
+                section_tag,
+                start_pointer,
+                start_line,
+                section_indentation,
+                delimiters,
+                parent_nodes,
+            ) = open_sections.pop()
+            if name != value:
+                raise MustacheSyntaxError.from_template_pointer(
+                    f'Unexpected section end tag on line {{line_number}}. Expected "{name}" got "{value}"',
+                    template,
+                    previous_pointer,
+                )
+
+            parent_nodes.append(
+                Node(
+                    section_token,
+                    name,
+                    section_tag,
+                    tuple(nodes),
+                    section_text=template[start_pointer:previous_pointer],
+                    indentation=section_indentation,
+                    delimiters=delimiters,
+                    path=split_name(name) if section_token in LOOKUP_SECTION_TOKENS else (),
+                    line=start_line,
+                )
+            )
+            nodes = parent_nodes
+
+        line += template.count('\n', previous_pointer, pointer)
+        previous_pointer = pointer
+
+    if open_sections:
+        _, name, _, _, start_line, _, _, _ = open_sections[-1]
+        raise MustacheSyntaxError(f'Unclosed section "{name}" beginning on line {start_line}')
+
+    return tuple(nodes)
+
+
+def resolve_blocks(
+    nodes: Tuple[Node, ...], overrides: Optional[Overrides] = None
+) -> Tuple[Node, ...]:
+    """Resolve template inheritance, replacing each block with its override or default content
+
+    The blocks inside each parent tag are resolved into overrides for the parent template, so a
+    parent tag's children become a block node per override in scope. Overrides from enclosing
+    templates take precedence, so the outermost template's blocks win. Parent templates are
+    loaded and resolved with these overrides when they are first rendered.
+    """
+    if overrides is None:
+        overrides = {}
+
+    resolved: List[Node] = []
+    for node in nodes:
+        token = node.token
+
+        if token is Token.SUBSTITUTION:
+            if node.value in overrides:
+                resolved.extend(overrides[node.value])
+            else:
+                resolved.extend(resolve_blocks(node.children, overrides))
+
+        elif token is Token.PARENT:
+            parent_overrides = dict(overrides)
+            for child in node.children:
+                # Anything other than blocks inside a parent tag is ignored
+                if child.token is Token.SUBSTITUTION and child.value not in overrides:
+                    parent_overrides[child.value] = resolve_blocks(child.children, overrides)
+            resolved.append(
+                node._replace(
+                    children=tuple(
+                        Node(Token.SUBSTITUTION, name, children=children)
+                        for name, children in parent_overrides.items()
+                    )
+                )
+            )
+
+        elif token is Token.SECTION or token is Token.INVERTED:
+            resolved.append(node._replace(children=resolve_blocks(node.children, overrides)))
+
+        else:
+            resolved.append(node)
+
+    return tuple(resolved)
+
+
+def find_parents(nodes: Tuple[Node, ...]) -> Tuple[Node, ...]:
+    """Find every parent tag in a resolved node tree, in the order they appear"""
+    parents: List[Node] = []
+    for node in nodes:
+        if node.token is Token.PARENT:
+            parents.append(node)
+        elif node.token is not Token.PARTIAL:
+            parents.extend(find_parents(node.children))
+    return tuple(parents)
+
+
+class RenderState:
+    """Options and per-render caches shared by every node rendered in a single render call"""
+
+    __slots__ = (
+        'serializer',
+        'pass_strings',
+        'partials',
+        'missing_variable_handler',
+        'missing_partial_handler',
+        'escape_html',
+        'compile',
+        'partial_templates',
+        'max_depth',
+        'deadline',
+        'depth',
+        'countdown',
+    )
+
+    # pylint:disable=too-many-arguments
+    def __init__(
+        self,
+        serializer: Optional[CallableType[[Any], str]] = None,
+        partials: Optional[Partials] = None,
+        missing_variable_handler: Optional[CallableType[[str, str], str]] = None,
+        missing_partial_handler: Optional[CallableType[[str, str], str]] = None,
+        escape_html: bool = True,
+        compile: Optional[CallableType[..., 'Template']] = None,  # pylint:disable=redefined-builtin
+        max_depth: Optional[int] = MAX_DEPTH,
+        deadline: Optional[float] = None,
+    ):
+        self.serializer = serializer or default_serializer
+        self.pass_strings = passes_strings(self.serializer)
+        self.partials: Partials = partials if partials is not None else NO_PARTIALS
+        self.missing_variable_handler = missing_variable_handler or missing_variable_default
+        self.missing_partial_handler = missing_partial_handler or missing_partial_default
+        self.escape_html = escape_html
+        self.compile = compile or Template.compile
+        self.partial_templates: Dict[Tuple[Any, ...], Optional['Template']] = {}
+        self.max_depth = max_depth
+        self.deadline = deadline
+        # How deeply partials, parents and lambda results are nested at the node being rendered
+        self.depth = 0
+        self.countdown = DEADLINE_CHECK_INTERVAL
+
+    def check_deadline(self) -> None:
+        """Count down to the next check of the render's deadline, if it has one
+
+        Renders count down on every section item and nested template, as the interpreter does.
+        """
+        if self.deadline is not None:
+            self.countdown = count_down(self.countdown, self.deadline)
+
+    def nest(self) -> None:
+        """Enter a partial, parent or lambda result, checking the render's depth and deadline
+
+        The caller leaves it again by decrementing depth.
+        """
+        self.depth += 1
+        check_depth(self.depth, self.max_depth)
+        if self.deadline is not None:
+            self.check_deadline()
+
+    def too_deep(self) -> DepthLimitExceeded:
+        """The error raised when nested templates use up the Python stack before max_depth"""
+        return DepthLimitExceeded(
+            f'Partials, parents and lambda results are nested too deeply for the Python stack, '
+            f'at {self.depth} deep'
+        )
+
+    def render_template(
+        self, template: 'Template', name: str, context_stack: List[Any], output: 'Output'
+    ) -> None:
+        """Render a template, which is the named partial, parent or lambda result if nested"""
+        template.render_into(context_stack, output, self)
+
+    def render_nested(
+        self, template: 'Template', name: str, context_stack: List[Any], output: 'Output'
+    ) -> None:
+        """Render the named partial, parent or lambda result into output"""
+        try:
+            self.nest()
+            self.render_template(template, name, context_stack, output)
+        except RecursionError as ex:
+            raise self.too_deep() from ex
+        finally:
+            self.depth -= 1
+
+    def lookup(self, context_stack: List[Any], name: str, path: Path, tag: str) -> Any:
+        """Fetch a variable from the context, falling back to the missing variable handler"""
+        value = find_in_context(context_stack, name, path)
+        if value is MISSING:
+            return self.missing_variable_handler(name, tag)
+        return value
+
+    def get_partial(self, name: str, tag: str, indentation: str) -> Optional['Template']:
+        """Fetch the compiled, indented partial for a partial tag"""
+        key = (name, indentation)
+        try:
+            return self.partial_templates[key]
+        except KeyError:
+            pass
+
+        partial_template = self.partials.get(name)
+        if partial_template is None:
+            partial_template = self.missing_partial_handler(name, tag)
+
+        partial = None
+        if partial_template != '':
+            partial = cached_partial(
+                self.compile, name, partial_template, indentation, self.compile
+            )
+
+        self.partial_templates[key] = partial
+        return partial
+
+    def render_partial(
+        self, name: str, tag: str, indentation: str, context_stack: List[Any], output: 'Output'
+    ) -> None:
+        """Render a partial tag into output"""
+        partial = self.get_partial(name, tag, indentation)
+        if partial is not None:
+            self.render_nested(partial, name, context_stack, output)
+
+    def get_parent(self, node: Node) -> Optional['Template']:
+        """Fetch the parent template for a resolved parent tag, compiled with its overrides
+
+        Each parent template is compiled once per combination of overrides, and cached in
+        PARTIAL_CACHE by the identity of the parent tag's overrides, which are kept alive by
+        the cache entry.
+        """
+        overrides = node.children
+        key = (node.value, node.indentation, id(overrides))
+        try:
+            return self.partial_templates[key]
+        except KeyError:
+            pass
+
+        parent_template = self.partials.get(node.value)
+        if parent_template is None:
+            parent_template = self.missing_partial_handler(node.value, node.tag)
+
+        def build(source: str) -> Tuple[Tuple[Node, ...], 'Template']:
+            return overrides, self.compile(
+                source, overrides={block.value: block.children for block in overrides}
+            )
+
+        parent = None
+        if parent_template != '':
+            _, parent = cached_partial(
+                (self.compile, id(overrides)),
+                node.value,
+                parent_template,
+                node.indentation,
+                build,
+            )
+
+        self.partial_templates[key] = parent
+        return parent
+
+    def render_parent(self, node: Node, context_stack: List[Any], output: 'Output') -> None:
+        """Render a resolved parent tag into output"""
+        parent = self.get_parent(node)
+        if parent is not None:
+            self.render_nested(parent, node.value, context_stack, output)
+
+    def compile_lambda_result(
+        self, template: str, delimiters: Tuple[str, str] = ('{{', '}}')
+    ) -> 'Template':
+        """Compile a template returned by a lambda, reusing it from LAMBDA_CACHE if available"""
+        return cached_lambda(self.compile, template, *delimiters, self.compile)
+
+    def render_lambda(self, func: Any, name: str, context_stack: List[Any]) -> str:
+        """Invoke an interpolation lambda, and render the template it returns"""
+        lambda_output: List[str] = []
+        self.render_nested(
+            self.compile_lambda_result(invoke_lambda(func, name=name)),
+            f'{name} (lambda)',
+            context_stack,
+            lambda_output,
+        )
+        return ''.join(lambda_output)
+
+    # pylint:disable=too-many-arguments
+    def render_lambda_section(
+        self,
+        func: Any,
+        name: str,
+        section_text: str,
+        delimiters: Tuple[str, str],
+        context_stack: List[Any],
+        output: 'Output',
+    ) -> None:
+        """Invoke a section lambda with the raw section text, and render the template it returns"""
+        self.render_nested(
+            self.compile_lambda_result(
+                invoke_lambda(func, name=name, template=section_text), delimiters
+            ),
+            f'{name} (lambda)',
+            context_stack,
+            output,
+        )
+
+
+def render_nodes(
+    nodes: Tuple[Node, ...], context_stack: List[Any], output: 'Output', state: RenderState
+) -> None:
+    """Render a sequence of nodes, appending the output strings to output"""
+
+    for node in nodes:
+        token = node.token
+
+        if token is Token.LITERAL:
+            output.append(node.value)
+
+        elif token is Token.VARIABLE or token is Token.NO_ESCAPE:
+            variable = state.lookup(context_stack, node.value, node.path, node.tag)
+            if type(variable) is str and state.pass_strings:
+                if token is Token.VARIABLE and state.escape_html:
+                    output.append(escape(variable))
+                else:
+                    output.append(variable)
+                continue
+
+            if is_lambda(variable):
+                variable = state.render_lambda(variable, node.value, context_stack)
+
+            if token is Token.VARIABLE and state.escape_html:
+                output.append(escape_value(variable, state.serializer))
+            else:
+                output.append(state.serializer(variable))
+
+        elif token is Token.SECTION:
+            variable = state.lookup(context_stack, node.value, node.path, node.tag)
+            if not variable:
+                continue
+
+            if is_lambda(variable):
+                state.render_lambda_section(
+                    variable,
+                    node.value,
+                    node.section_text,
+                    node.delimiters,
+                    context_stack,
+                    output,
+                )
+                continue
+
+            items = variable if should_iterate(variable) else (variable,)
+            for item in items:
+                if state.deadline is not None:
+                    state.check_deadline()
+                context_stack.append(item)
+                render_nodes(node.children, context_stack, output, state)
+                context_stack.pop()
+
+        elif token is Token.INVERTED:
+            variable = state.lookup(context_stack, node.value, node.path, node.tag)
+            if not variable and not is_lambda(variable):
+                render_nodes(node.children, context_stack, output, state)
+
+        elif token is Token.PARTIAL:
+            state.render_partial(node.value, node.tag, node.indentation, context_stack, output)
+
+        elif token is Token.PARENT:
+            state.render_parent(node, context_stack, output)
+
+        elif token is Token.SUBSTITUTION:
+            render_nodes(node.children, context_stack, output, state)
+
+
+class Template:
+    """A compiled Mustache template, which can be rendered many times"""
+
+    __slots__ = ('source', 'nodes')
+
+    def __init__(self, source: str, nodes: Tuple[Node, ...]):
+        self.source = source
+        self.nodes = nodes
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.source!r})'
+
+    def render_into(self, context_stack: List[Any], output: 'Output', state: RenderState) -> None:
+        """Render the template against a context stack, appending to output"""
+        render_nodes(self.nodes, context_stack, output, state)
+
+    # pylint:disable=too-many-arguments
+    def render(
+        self,
+        context: Any,
+        serializer: Optional[CallableType[[Any], str]] = None,
+        partials: Optional[Partials] = None,
+        missing_variable_handler: Optional[CallableType[[str, str], str]] = None,
+        missing_partial_handler: Optional[CallableType[[str, str], str]] = None,
+        escape_html: bool = True,
+        profiler: Optional['Profiler'] = None,
+        name: Optional[str] = None,
+        max_output_chars: Optional[int] = None,
+        max_depth: Optional[int] = MAX_DEPTH,
+        deadline: Optional[float] = None,
+    ) -> str:
+        """Render the compiled template, recording the time spent in each tag if a profiler is
+        passed
+
+        If metrics are configured, the render is reported under name. Renders are limited as by
+        the render function, and raise DepthLimitExceeded if partials, parents and lambda
+        results are nested too deeply for the Python stack, even within max_depth.
+        """
+        check_start(deadline)
+
+        recorder = metrics.RECORDER
+        if recorder is not None:
+            missing_variable_handler, missing_partial_handler = recorder.count_handlers(
+                missing_variable_handler, missing_partial_handler
+            )
+
+        state = self.render_state(
+            serializer=serializer,
+            partials=partials,
+            missing_variable_handler=missing_variable_handler,
+            missing_partial_handler=missing_partial_handler,
+            escape_html=escape_html,
+            max_depth=max_depth,
+            deadline=deadline,
+        )
+        if recorder is None:
+            return self.render_string(context, state, profiler, max_output_chars)
+
+        timing = recorder.start(name, profiler)
+        output = self.render_string(context, state, timing.profiler, max_output_chars)
+        timing.finish(len(output))
+        return output
+
+    def render_string(
+        self,
+        context: Any,
+        state: RenderState,
+        profiler: Optional['Profiler'] = None,
+        max_output_chars: Optional[int] = None,
+    ) -> str:
+        """Render the template with a render state, returning its output"""
+        output: List[str] = []
+        self.render_root(context, limit(output, max_output_chars), state, profiler)
+        return ''.join(output)
+
+    def render_root(
+        self, context: Any, output: Output, state: RenderState, profiler: Optional['Profiler']
+    ) -> None:
+        """Render the template with a render state as the root of a render"""
+        try:
+            if profiler is None:
+                self.render_into([context], output, state)
+            else:
+                profiler.render(self, [context], output, state)
+        except RecursionError as ex:
+            raise state.too_deep() from ex
+
+    # pylint:disable=too-many-arguments
+    def render_to(
+        self,
+        stream: TextIO,
+        context: Any,
+        serializer: Optional[CallableType[[Any], str]] = None,
+        partials: Optional[Partials] = None,
+        missing_variable_handler: Optional[CallableType[[str, str], str]] = None,
+        missing_partial_handler: Optional[CallableType[[str, str], str]] = None,
+        escape_html: bool = True,
+        buffer_size: int = io.DEFAULT_BUFFER_SIZE,
+        profiler: Optional['Profiler'] = None,
+        name: Optional[str] = None,
+        max_output_chars: Optional[int] = None,
+        max_depth: Optional[int] = MAX_DEPTH,
+        deadline: Optional[float] = None,
+    ) -> None:
+        """Render the compiled template into a text stream, writing whenever buffer_size
+        characters of output have been buffered
+
+        Renders are limited as by the render method; output written before a limit is exceeded
+        is left in the stream.
+        """
+        check_start(deadline)
+
+        recorder = metrics.RECORDER
+        if recorder is not None:
+            missing_variable_handler, missing_partial_handler = recorder.count_handlers(
+                missing_variable_handler, missing_partial_handler
+            )
+
+        writer = StreamWriter(stream, buffer_size)
+        state = self.render_state(
+            serializer=serializer,
+            partials=partials,
+            missing_variable_handler=missing_variable_handler,
+            missing_partial_handler=missing_partial_handler,
+            escape_html=escape_html,
+            max_depth=max_depth,
+            deadline=deadline,
+        )
+        timing = None if recorder is None else recorder.start(name, profiler)
+        if timing is not None:
+            profiler = timing.profiler
+
+        self.render_root(context, limit(writer, max_output_chars), state, profiler)
+        writer.flush()
+
+        if timing is not None:
+            timing.finish(writer.written)
+
+    def render_state(self, **options: Any) -> RenderState:
+        """Create the state for rendering this template, compiling partials in the same way"""
+        return RenderState(compile=type(self).compile, **options)
+
+    @classmethod
+    def compile(
+        cls,
+        template: str,
+        left_delimiter: Optional[str] = None,
+        right_delimiter: Optional[str] = None,
+        overrides: Optional[Overrides] = None,
+    ) -> 'Template':
+        """Compile a mustache template, raising MustacheSyntaxError for an invalid template
+
+        Blocks are replaced by their content from overrides if given, or their default content.
+        """
+        nodes = parse(template, left_delimiter or '{{', right_delimiter or '}}')
+        return cls(template, resolve_blocks(nodes, overrides))
+
+
+# pylint:disable=redefined-builtin
+def compile(
+    template: str,
+    left_delimiter: Optional[str] = None,
+    right_delimiter: Optional[str] = None,
+) -> Template:
+    """Compile a mustache template, raising MustacheSyntaxError for an invalid template"""
+    return Template.compile(template, left_delimiter, right_delimiter)
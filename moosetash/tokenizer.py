@@ -1,8 +1,10 @@
 """Generate tokens from a mustache template"""
-from typing import Iterator, Tuple
+from typing import Any, Dict, Iterator, List, NamedTuple, Tuple
 from enum import IntEnum
-import functools
+import sys
+from .cache import LRUCache
 from .exceptions import MustacheSyntaxError
+from .metrics import register_cache
 
 
 class Token(IntEnum):
@@ -36,7 +38,6 @@ TOKENS = {
 }
 
 
-@functools.lru_cache
 def find_next_tag(template: str, pointer: int, left_delimiter: str) -> Tuple[str, int]:
     """Find the next tag, and the literal between current pointer and that tag"""
 
@@ -48,7 +49,6 @@ def find_next_tag(template: str, pointer: int, left_delimiter: str) -> Tuple[str
     return (template[pointer:split_index], split_index)
 
 
-@functools.lru_cache
 def parse_tag(
     template: str, pointer: int, left_delimiter: str, right_delimiter: str
 ) -> Tuple[Tuple[Token, str], int]:
@@ -79,13 +79,14 @@ def parse_tag(
     return ((token, tag.strip()), tag_end_pointer + len(right_delimiter))
 
 
-@functools.lru_cache
 def find_next_pointer(
     template: str, tag_start_pointer: int, tag_end_pointer: int
 ) -> Tuple[bool, int, int]:
     """Find the next parsing pointer, based on the current tag and whether it is a standalone"""
     pre_tag_line = template.rfind('\n', 0, tag_start_pointer)
     post_tag_line = template.find('\n', tag_end_pointer)
+    if post_tag_line == -1:
+        post_tag_line = len(template)
 
     indentation_pointer = pre_tag_line
     if pre_tag_line == -1:
@@ -100,9 +101,7 @@ def find_next_pointer(
         after_tag.isspace() or after_tag == ''
     )
 
-    if post_tag_line == -1:
-        post_tag_line = len(template)
-    else:
+    if post_tag_line < len(template):
         # Skip the newline character
         post_tag_line += 1
     return (
@@ -144,7 +143,7 @@ def tokenize(
                 if tag_start_pointer - indentation_pointer > 0:
                     literal = literal[0 : -(tag_start_pointer - indentation_pointer)]
 
-                if token is Token.PARTIAL:
+                if token is Token.PARTIAL or token is Token.PARENT:
                     indentation = template[indentation_pointer:tag_start_pointer]
 
         else:
@@ -157,3 +156,89 @@ def tokenize(
         # Comments and set delimiters do not appear in output
         if token not in [Token.COMMENT]:
             yield (token, token_value, indentation), pointer
+
+
+TokenStream = Tuple[Tuple[Tuple[Token, str, str], int], ...]
+
+# For each section, inverted section and parent tag, the index of the token after its end tag
+SectionEnds = Dict[int, int]
+
+SECTION_START_TOKENS = (Token.SECTION, Token.INVERTED, Token.PARENT, Token.SUBSTITUTION)
+
+
+class Tokenized(NamedTuple):
+    """The token stream of a whole template, with the positions of its section ends"""
+
+    tokens: TokenStream
+    section_ends: SectionEnds
+    # Values derived from sections as they are first rendered, keyed by the index of their start
+    # token: the raw text of lambda sections, and the resolved nodes of parent tags. Renders on
+    # different threads may both derive a value, storing equal values
+    sections: Dict[int, Any]
+
+
+# Tokenized whole templates, keyed by (template, left delimiter, right delimiter)
+TOKEN_CACHE = LRUCache(maxsize=1024, max_bytes=64 * 1024 * 1024)
+register_cache('tokens', TOKEN_CACHE)
+
+
+def find_section_ends(tokens: TokenStream) -> SectionEnds:
+    """Match every section start tag to its end tag, in a single pass over a token stream
+
+    An end tag closes the innermost open section with the same name. Sections without an end
+    tag are left out.
+    """
+    section_ends: SectionEnds = {}
+    open_sections: List[Tuple[str, int]] = []
+
+    for index, ((token, value, _), _) in enumerate(tokens):
+        if token in SECTION_START_TOKENS:
+            open_sections.append((value, index))
+
+        elif token is Token.END:
+            for depth in range(len(open_sections) - 1, -1, -1):
+                if open_sections[depth][0] == value:
+                    section_ends[open_sections[depth][1]] = index + 1
+                    del open_sections[depth:]
+                    break
+
+    return section_ends
+
+
+def token_stream_size(template: str, tokens: TokenStream, section_ends: SectionEnds) -> int:
+    """Estimate the memory, in bytes, retained by a cached token stream"""
+    token_size = sys.getsizeof(((Token.LITERAL, '', ''), 0)) + sys.getsizeof(
+        (Token.LITERAL, '', '')
+    )
+    return (
+        sys.getsizeof(template)
+        + sys.getsizeof(tokens)
+        + len(tokens) * token_size
+        + sum(sys.getsizeof(value) for (_, value, _), _ in tokens)
+        + sys.getsizeof(section_ends)
+    )
+
+
+def tokenize_sections(
+    template: str, left_delimiter: str = '{{', right_delimiter: str = '}}'
+) -> Tokenized:
+    """Tokenize a whole template and find its section ends"""
+    tokens = tuple(tokenize(template, 0, left_delimiter, right_delimiter))
+    return Tokenized(tokens, find_section_ends(tokens), {})
+
+
+def tokenize_cached(
+    template: str, left_delimiter: str = '{{', right_delimiter: str = '}}'
+) -> Tokenized:
+    """Tokenize a whole template and find its section ends, reusing them from TOKEN_CACHE if
+    available"""
+    key = (template, left_delimiter, right_delimiter)
+    tokenized = TOKEN_CACHE.get(key)
+    if tokenized is None:
+        tokenized = tokenize_sections(template, left_delimiter, right_delimiter)
+        TOKEN_CACHE.set(
+            key,
+            tokenized,
+            token_stream_size(template, tokenized.tokens, tokenized.section_ends),
+        )
+    return tokenized
@@ -1,4 +1,6 @@
-from typing import Any, Callable
+from typing import Any, Callable, Optional
+import inspect
+from . import metrics
 from .exceptions import LambdaException
 
 
@@ -7,19 +9,45 @@ def is_lambda(context: Any) -> bool:
     return callable(context)
 
 
+def lambda_result(invoked: Any, name: str) -> str:
+    """Check and stringify the value returned by a lambda"""
+    if not isinstance(invoked, (str, int, float)):
+        raise LambdaException(f'Unexpected return type from lambda "{name}"')
+
+    return str(invoked)
+
+
 def invoke_lambda(
     func: Callable,
     *,
     name: str,
-    template: str = None,
+    template: Optional[str] = None,
 ) -> str:
+    recorder = metrics.RECORDER
+    if recorder is not None:
+        recorder.count_lambda()
     try:
         invoked = func() if template is None else func(template)
+        return lambda_result(invoked, name)
+    except Exception as ex:
+        raise LambdaException(str(ex)) from ex
 
-        if not isinstance(invoked, (str, int, float)):
-            raise LambdaException(f'Unexpected return type from lambda "{name}"')
 
-        return str(invoked)
+async def invoke_lambda_async(
+    func: Callable,
+    *,
+    name: str,
+    template: Optional[str] = None,
+) -> str:
+    """Invoke a lambda, which may be a coroutine function or return an awaitable"""
+    recorder = metrics.RECORDER
+    if recorder is not None:
+        recorder.count_lambda()
+    try:
+        invoked = func() if template is None else func(template)
+        if inspect.isawaitable(invoked):
+            invoked = await invoked
+        return lambda_result(invoked, name)
     except Exception as ex:
         raise LambdaException(str(ex)) from ex
 
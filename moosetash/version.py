@@ -0,0 +1,8 @@
+"""The installed version of moosetash"""
+from importlib.metadata import PackageNotFoundError, version
+
+try:
+    __version__ = version('moosetash')
+except PackageNotFoundError:
+    # Running from a source tree that isn't installed, so this must match pyproject.toml
+    __version__ = '1.0.1'
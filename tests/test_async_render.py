@@ -0,0 +1,129 @@
+from typing import Any, List, Tuple
+import asyncio
+import pytest
+from moosetash import LambdaException, compile, render, render_async
+
+
+def render_to_string(*args, **kwargs) -> str:
+    async def collect():
+        return ''.join([chunk async for chunk in render_async(*args, **kwargs)])
+
+    return asyncio.run(collect())
+
+
+async def value(result, delay=0):
+    await asyncio.sleep(delay)
+    return result
+
+
+MATCHES_RENDER_CASES: List[Tuple[str, Any, Any]] = [
+    ('Hello {{ variable }}!', {'variable': '<world>'}, None),
+    ('{{#list}}({{.}}){{/list}}{{^empty}}none{{/empty}}', {'list': [1, 2], 'empty': []}, None),
+    ('{{a.b.c}}|{{a.x}}|{{#a}}{{b.c}}{{/a}}', {'a': {'b': {'c': 'deep'}}}, None),
+    ('{{#lambda}}{{value}}{{/lambda}}', {'lambda': lambda text: f'[{text}]', 'value': 1}, None),
+    ('  {{>partial}}\n', {'value': 1}, {'partial': 'a\n{{value}}\n'}),
+]
+
+
+@pytest.mark.parametrize('template,context,partials', MATCHES_RENDER_CASES)
+def test_matches_render(template, context, partials):
+    assert render_to_string(template, context, partials=partials) == render(
+        template, context, partials=partials
+    )
+
+
+def test_awaitable_values():
+    context = {
+        'name': value('<moose>'),
+        'items': value([value(1), value(2)]),
+        'user': value({'profile': value({'city': 'Oslo'})}),
+    }
+    template = '{{name}} {{{name}}} {{#items}}{{.}}{{/items}} {{user.profile.city}}'
+    assert render_to_string(template, context) == '&lt;moose&gt; <moose> 12 Oslo'
+
+
+def test_awaited_none_is_missing():
+    context = {'a': value(None), 'b': value({'c': None})}
+    assert render_to_string('[{{a}}][{{b.c}}]', context) == render(
+        '[{{a}}][{{b.c}}]', {'a': None, 'b': {'c': None}}
+    )
+    assert (
+        render_to_string('[{{a}}]', {'a': value(None)}, missing_variable_handler=lambda _, tag: tag)
+        == '[{{ a }}]'
+    )
+
+
+def test_async_lambdas():
+    async def section(text):
+        await asyncio.sleep(0)
+        return f'<{text}>'
+
+    async def variable():
+        return '{{name}}'
+
+    context = {'section': section, 'variable': variable, 'name': 'moose'}
+    assert (
+        render_to_string('{{#section}}{{name}}{{/section}}{{variable}}', context) == '<moose>moose'
+    )
+
+
+def test_async_lambda_error():
+    async def bad():
+        return {}
+
+    with pytest.raises(LambdaException, match='Unexpected return type from lambda "bad"'):
+        render_to_string('{{bad}}', {'bad': bad})
+
+
+def test_skipped_sections_are_not_awaited():
+    awaited = []
+
+    async def tracked():
+        awaited.append(True)
+        return 'value'
+
+    coroutine = tracked()
+    template = '{{#hidden}}{{value}}{{/hidden}}'
+    assert render_to_string(template, {'hidden': value(False), 'value': coroutine}) == ''
+    assert not awaited
+    coroutine.close()
+
+
+def test_sibling_lookups_are_concurrent():
+    running = []
+    peak = []
+
+    async def slow(result):
+        running.append(result)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(result)
+        return result
+
+    context = {'a': slow('a'), 'b': slow('b'), 'c': slow('c')}
+    assert render_to_string('{{a}}{{b}}{{c}}', context) == 'abc'
+    assert max(peak) == 3
+
+
+def test_repeated_awaitable_is_awaited_once():
+    assert render_to_string('{{a}}{{a}}{{#s}}{{a}}{{/s}}', {'a': value('x'), 's': True}) == 'xxx'
+
+
+def test_async_iterable_section():
+    async def rows():
+        for index in range(3):
+            yield {'index': index}
+
+    assert render_to_string('{{#rows}}{{index}},{{/rows}}', {'rows': rows()}) == '0,1,2,'
+
+
+def test_compiled_template():
+    template = compile('{{variable}}')
+    assert render_to_string(template, {'variable': value(1)}) == '1'
+
+
+def test_yields_chunks():
+    async def collect():
+        return [chunk async for chunk in render_async('a{{b}}c', {'b': value('b')})]
+
+    assert asyncio.run(collect()) == ['a', 'b', 'c']
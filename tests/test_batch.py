@@ -0,0 +1,50 @@
+import pickle
+import pytest
+from moosetash import compile, compile_python, render, render_many, render_many_iter
+from moosetash.batch import chunked
+
+TEMPLATE = '{{#user}}{{name}} <{{email}}>{{/user}}{{^user}}nobody{{/user}}'
+CONTEXTS = [
+    {'user': {'name': f'user {index}', 'email': f'{index}@example.com'}} for index in range(50)
+]
+CONTEXTS.append({})
+
+
+def test_render_many_serial():
+    assert render_many(TEMPLATE, CONTEXTS) == [render(TEMPLATE, context) for context in CONTEXTS]
+
+
+@pytest.mark.parametrize('compiler', [compile, compile_python])
+def test_render_many_processes(compiler):
+    outputs = render_many(compiler(TEMPLATE), CONTEXTS, workers=2, chunksize=8, serial_threshold=0)
+    assert outputs == [render(TEMPLATE, context) for context in CONTEXTS]
+
+
+def test_render_many_options():
+    outputs = render_many(
+        '{{value}}{{>partial}}',
+        [{'value': '&'}, {'value': '<'}],
+        workers=2,
+        serial_threshold=0,
+        escape_html=False,
+        partials={'partial': '!'},
+    )
+    assert outputs == ['&!', '<!']
+
+
+def test_render_many_iter():
+    outputs = render_many_iter(TEMPLATE, iter(CONTEXTS), workers=1)
+    assert next(outputs) == 'user 0 <0@example.com>'
+    assert len(list(outputs)) == len(CONTEXTS) - 1
+
+
+def test_chunked():
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(chunked([], 2)) == []
+
+
+@pytest.mark.parametrize('compiler', [compile, compile_python])
+def test_pickle_template(compiler):
+    template = pickle.loads(pickle.dumps(compiler(TEMPLATE)))
+    assert type(template) is type(compiler(TEMPLATE))
+    assert template.render(CONTEXTS[0]) == render(TEMPLATE, CONTEXTS[0])
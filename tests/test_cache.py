@@ -0,0 +1,60 @@
+from moosetash.cache import CacheInfo, LRUCache
+
+
+def test_get_and_set():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('b', 'default') == 'default'
+    assert cache.cache_info() == CacheInfo(1, 2, 0, 2, 1, None, 0)
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert 'c' in cache
+    assert cache.cache_info().evictions == 1
+
+
+def test_evicts_to_byte_budget():
+    cache = LRUCache(maxsize=None, max_bytes=10)
+    cache.set('a', 1, size=4)
+    cache.set('b', 2, size=4)
+    cache.set('a', 1, size=2)
+    assert cache.cache_info().currbytes == 6
+    cache.set('c', 3, size=5)
+    assert 'b' not in cache
+    assert len(cache) == 2
+    assert cache.cache_info().currbytes == 7
+
+
+def test_get_or_set():
+    cache = LRUCache()
+    assert cache.get_or_set('a', lambda: 'value', len) == 'value'
+    assert cache.get_or_set('a', lambda: 'other', len) == 'value'
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.currbytes) == (1, 1, 5)
+
+
+def test_resize():
+    cache = LRUCache(maxsize=3)
+    for key in 'abc':
+        cache.set(key, key)
+    cache.resize(maxsize=1)
+    assert len(cache) == 1
+    assert 'c' in cache
+
+
+def test_clear():
+    cache = LRUCache()
+    cache.set('a', 1, size=1)
+    cache.get('a')
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.cache_info() == CacheInfo(0, 0, 0, 128, 0, None, 0)
@@ -0,0 +1,59 @@
+import pytest
+
+from moosetash import PythonTemplate, Template, TemplateCache
+from moosetash.cli import compile_directory, find_templates, main
+
+
+@pytest.fixture
+def template_directory(tmp_path):
+    templates = tmp_path / 'templates'
+    (templates / 'users').mkdir(parents=True)
+    (templates / 'page.mustache').write_text('Hello {{name}}!')
+    (templates / 'users' / 'row.mustache').write_text('{{#user}}{{name}}{{/user}}\n')
+    (templates / 'notes.txt').write_text('{{#ignored}}')
+    return templates
+
+
+def test_find_templates(template_directory):
+    assert [name for name, _ in find_templates(str(template_directory), '.mustache')] == [
+        'page',
+        'users/row',
+    ]
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+@pytest.mark.parametrize('python,template_class', [(False, Template), (True, PythonTemplate)])
+def test_compile_directory(tmp_path, template_directory, jobs, python, template_class):
+    output = str(tmp_path / 'cache')
+    results = compile_directory(str(template_directory), output, jobs=jobs, python=python)
+    assert [(result.name, result.compiled, result.error) for result in results] == [
+        ('page', True, None),
+        ('users/row', True, None),
+    ]
+
+    cache = TemplateCache(output, template_class)
+    template = cache.load('users/row', '{{#user}}{{name}}{{/user}}\n')
+    assert isinstance(template, template_class)
+    assert template.render({'user': {'name': 'moose'}}) == 'moose\n'
+
+    results = compile_directory(str(template_directory), output, jobs=jobs, python=python)
+    assert [result.compiled for result in results] == [False, False]
+
+
+def test_main(tmp_path, template_directory, capsys):
+    output = str(tmp_path / 'cache')
+    assert main(['compile', str(template_directory), '-o', output, '--jobs', '1']) == 0
+    assert capsys.readouterr().out == (
+        f'Compiled 2 of 2 templates into {output} (0 up to date, 0 failed)\n'
+    )
+
+    (template_directory / 'page.mustache').write_text('Hello\n{{#name}}!')
+    assert main(['compile', str(template_directory), '-o', output, '--jobs', '1']) == 1
+    captured = capsys.readouterr()
+    assert 'page.mustache: Unclosed section "name" beginning on line 2' in captured.err
+    assert captured.out == f'Compiled 0 of 2 templates into {output} (1 up to date, 1 failed)\n'
+
+    # A standalone tag is reported on its own line, not the line after it
+    (template_directory / 'page.mustache').write_text('Hello\n{{#name}}\n!\n')
+    assert main(['compile', str(template_directory), '-o', output, '--jobs', '1']) == 1
+    assert 'page.mustache: Unclosed section "name" beginning on line 2' in capsys.readouterr().err
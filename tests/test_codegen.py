@@ -0,0 +1,58 @@
+from typing import Any, List, Tuple
+import pytest
+from moosetash import MustacheSyntaxError, PythonTemplate, compile, compile_python
+from moosetash.codegen import generate_python
+from moosetash.template import parse
+
+RENDER_CASES: List[Tuple[str, Any, Any]] = [
+    ('Hello {{ variable }}!', {'variable': '<world>'}, None),
+    ('{{{ variable }}}{{& variable }}', {'variable': '<world>'}, None),
+    ('{{#list}}({{.}}){{/list}}', {'list': [1, 2, 3]}, None),
+    ('{{#section}}{{value}}{{/section}}', {'section': {'value': 'nested'}}, None),
+    ('{{^list}}empty{{/list}}{{^value}}not rendered{{/value}}', {'list': [], 'value': 1}, None),
+    ('{{#section}}{{/section}}{{^section}}{{/section}}', {}, None),
+    ('{{#lambda}}{{value}}{{/lambda}}', {'lambda': lambda text: f'[{text}]', 'value': 1}, None),
+    ('{{lambda}}', {'lambda': lambda: '{{value}}', 'value': '<>'}, None),
+    ('  {{>partial}}\n', {'value': 1}, {'partial': 'a\n{{value}}\n'}),
+    ('{{$block}}default{{/block}}', {}, None),
+    ('{{=| |=}}|#section||value||/section|', {'section': True, 'value': 'x'}, None),
+]
+
+
+@pytest.mark.parametrize('template,context,partials', RENDER_CASES)
+def test_render_matches_compile(template, context, partials):
+    assert compile_python(template).render(context, partials=partials) == compile(template).render(
+        context, partials=partials
+    )
+
+
+def test_render_options():
+    template = compile_python('{{variable}}')
+    assert isinstance(template, PythonTemplate)
+    assert template.render({'variable': '&'}, escape_html=False) == '&'
+    assert template.render({'variable': '&'}, serializer=lambda value: 'X') == 'X'
+
+
+def test_partials_are_compiled_to_python():
+    template = compile_python('{{>partial}}')
+    partials = {'partial': '{{#items}}{{.}}{{/items}}'}
+    assert template.render({'items': [1, 2]}, partials=partials) == '12'
+
+
+def test_deeply_nested_sections():
+    depth = 50
+    template = ''.join(f'{{{{#s{i}}}}}' for i in range(depth)) + 'deep'
+    template += ''.join(f'{{{{/s{i}}}}}' for i in reversed(range(depth)))
+    context = {f's{i}': True for i in range(depth)}
+    assert compile_python(template).render(context) == 'deep'
+
+
+def test_generate_python():
+    source = generate_python(parse('literal{{variable}}'))
+    assert "append('literal')" in source
+    assert "lookup(context_stack, 'variable', (('variable', None),), '{{ variable }}')" in source
+
+
+def test_compile_syntax_error():
+    with pytest.raises(MustacheSyntaxError, match='Unclosed section "section"'):
+        compile_python('{{#section}}')
@@ -1,6 +1,25 @@
-from unittest.mock import Mock
+from collections import defaultdict, namedtuple
+from dataclasses import dataclass
+from unittest.mock import MagicMock, Mock
 import pytest
-from moosetash.context import ContextAccessError, MissingVariable, deep_get, get, get_from_context
+from moosetash.context import (
+    ACCESSORS,
+    MISSING,
+    REGISTERED_ACCESSORS,
+    ContextAccessError,
+    MissingVariable,
+    deep_get,
+    find_in_context,
+    get,
+    get_from_context,
+    get_any,
+    get_attribute,
+    get_mapping,
+    get_sequence,
+    get_unit,
+    register_accessor,
+    split_name,
+)
 
 
 class Dummy:
@@ -72,3 +91,135 @@ GET_FROM_CONTEXT_CASES = [
 @pytest.mark.parametrize('contexts,variable,expected', GET_FROM_CONTEXT_CASES)
 def test_get_from_context(contexts, variable, expected):
     assert get_from_context(contexts, variable) == expected
+
+
+SPLIT_NAME_CASES = [
+    ('.', ()),
+    ('a', (('a', None),)),
+    ('a.b', (('a', None), ('b', None))),
+    ('a.1', (('a', None), ('1', 1))),
+]
+
+
+@pytest.mark.parametrize('variable,expected', SPLIT_NAME_CASES)
+def test_split_name(variable, expected):
+    assert split_name(variable) == expected
+
+
+GET_UNIT_CASES = GET_CASES + [
+    ({}, 'key', MISSING),
+    ([1, 2, 3], '4', MISSING),
+    ([1, 2, 3], 'key', MISSING),
+    ('string', 'key', MISSING),
+    (1, 'key', MISSING),
+    (None, 'key', MISSING),
+    ({'1': 'one'}, '1', 'one'),
+    ({1: 'one'}, '1', MISSING),
+]
+
+
+@pytest.mark.parametrize('context,variable,expected', GET_UNIT_CASES)
+def test_get_unit(context, variable, expected):
+    assert get_unit(context, variable, split_name(variable)[0][1]) == expected
+
+
+FIND_IN_CONTEXT_CASES = GET_FROM_CONTEXT_CASES + [
+    ([{'a': 'b'}, {}], 'missing', MISSING),
+    ([{'a': {'b': 'outer'}}, {'a': {}}], 'a.b', MISSING),
+    ([{'a': 'b'}, None, 1, 'string'], 'a', 'b'),
+    ([{'a': None}, {}], 'a', MISSING),
+    ([{'a': 'b'}, 'top'], '.', 'top'),
+    ([{'a': [1, 2]}], 'a.1', 2),
+]
+
+
+@pytest.mark.parametrize('contexts,variable,expected', FIND_IN_CONTEXT_CASES)
+def test_find_in_context(contexts, variable, expected):
+    assert find_in_context(contexts, variable, split_name(variable)) == expected
+
+
+def test_find_in_context_error():
+    with pytest.raises(ContextAccessError, match='a.test'):
+        find_in_context([{'a': DummyRaiser()}], 'a.test', split_name('a.test'))
+
+
+@dataclass
+class DataPoint:
+    x: int
+
+
+class Slotted:
+    __slots__ = ('x',)
+
+    def __init__(self, x):
+        self.x = x
+
+
+Point = namedtuple('Point', ['x', 'y'])
+
+
+class OrderedKeys(dict):
+    pass
+
+
+ACCESSOR_CASES = [
+    ({}, get_mapping),
+    (OrderedKeys(), get_mapping),
+    (defaultdict(int), get_any),
+    (DataPoint(1), get_attribute),
+    (Slotted(1), get_attribute),
+    (Mock(), get_attribute),
+    (MagicMock(), get_any),
+    (1, get_attribute),
+    (None, get_attribute),
+    ([], get_sequence),
+    (Point(1, 2), get_sequence),
+    ('string', get_sequence),
+    (range(3), get_sequence),
+]
+
+
+@pytest.mark.parametrize('obj,accessor', ACCESSOR_CASES)
+def test_accessor_chosen_per_type(obj, accessor):
+    get_unit(obj, 'x', None)
+    assert ACCESSORS[type(obj)] is accessor
+
+
+OBJECT_CASES = [
+    ([{'p': DataPoint(1)}], 'p.x', 1),
+    ([{'p': Slotted(2)}], 'p.x', 2),
+    ([{'p': Point(3, 4)}], 'p.y', 4),
+    ([{'p': Point(3, 4)}], 'p.1', 4),
+    ([{'p': Point(3, 4)}], 'p.2', MISSING),
+    ([{'p': defaultdict(lambda: 'default')}], 'p.x', 'default'),
+    ([{'x': 'outer'}, DataPoint(5)], 'x', 5),
+    ([{'y': 'outer'}, DataPoint(5)], 'y', 'outer'),
+]
+
+
+@pytest.mark.parametrize('contexts,variable,expected', OBJECT_CASES)
+def test_find_in_objects(contexts, variable, expected):
+    assert find_in_context(contexts, variable, split_name(variable)) == expected
+
+
+class Row:
+    def __init__(self, **values):
+        self.values = values
+
+
+class SubRow(Row):
+    pass
+
+
+@pytest.fixture
+def row_accessor():
+    register_accessor(Row, lambda row, name, index: row.values.get(name, MISSING))
+    yield
+    del REGISTERED_ACCESSORS[Row]
+    ACCESSORS.clear()
+
+
+def test_register_accessor(row_accessor):
+    assert get_from_context([{'row': Row(a=1)}], 'row.a') == 1
+    assert get_from_context([SubRow(a=2)], 'a') == 2
+    assert find_in_context([Row(a=1)], 'values', split_name('values')) is MISSING
@@ -17,6 +17,13 @@ SYNTAX_ERRORS: List[Tuple[str, Any, str]] = [
         {'variable': True},
         'Unclosed section "variable" beginning on line 1',
     ),
+    ('\n{{<parent}}{{$block}}{{/block}}', {}, 'Unclosed section "parent" beginning on line 2'),
+    ('x\n{{#a}}\n', {'a': True}, 'Unclosed section "a" beginning on line 2'),
+    (
+        'x\n{{#a}}\n{{/b}}\n',
+        {'a': True},
+        'Unexpected section end tag on line 3. Expected "a" got "b"',
+    ),
 ]
 
 
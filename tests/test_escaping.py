@@ -1,6 +1,10 @@
+import asyncio
+from html import escape as html_escape
+
 import pytest
 
-from moosetash import render
+from moosetash import SafeString, compile, compile_python, render, render_async
+from moosetash.escaping import ESCAPE_MEMO, EscapeMemo, escape, escape_value
 
 ESCAPING_CASES = [
     ('{{variable}}', {'variable': 'A & B'}, True, 'A &amp; B'),
@@ -11,3 +15,84 @@ ESCAPING_CASES = [
 @pytest.mark.parametrize('template,context,escape_html,expected', ESCAPING_CASES)
 def test_custom_serializer(template, context, escape_html, expected):
     assert render(template, context, escape_html=escape_html) == expected
+
+
+ESCAPE_CASES = ['', 'plain text', '&<>"\'', '<b>Fish & "chips"</b>', 'it\'s', '&amp;']
+
+
+@pytest.mark.parametrize('text', ESCAPE_CASES)
+def test_escape(text):
+    assert escape(text) == html_escape(text)
+
+
+def test_escape_returns_clean_text_unchanged():
+    text = 'nothing to escape here'
+    assert escape(text) is text
+
+
+class Markup:
+    def __init__(self, html):
+        self.html = html
+
+    def __html__(self):
+        return self.html
+
+
+def test_escape_value():
+    assert escape_value('<b>', str) == '&lt;b&gt;'
+    assert escape_value(SafeString('<b>'), str) == '<b>'
+    assert type(escape_value(SafeString('<b>'), str)) is str
+    assert escape_value(Markup('<i>'), str) == '<i>'
+    assert escape_value(1, lambda value: f'<{value}>') == '&lt;1&gt;'
+
+
+RENDERERS = [
+    lambda template, context: render(template, context),
+    lambda template, context: compile(template).render(context),
+    lambda template, context: compile_python(template).render(context),
+    lambda template, context: asyncio.run(render_async_joined(template, context)),
+]
+
+
+async def render_async_joined(template, context):
+    return ''.join([chunk async for chunk in render_async(template, context)])
+
+
+SAFE_CASES = [
+    ('{{value}}', {'value': SafeString('<b>bold</b>')}, '<b>bold</b>'),
+    ('{{value}}', {'value': Markup('<i>x</i>')}, '<i>x</i>'),
+    ('{{value}}', {'value': '<b>bold</b>'}, '&lt;b&gt;bold&lt;/b&gt;'),
+    ('{{&value}}', {'value': SafeString('<b>')}, '<b>'),
+    ('{{#values}}{{.}}{{/values}}', {'values': [SafeString('<a>'), '<a>']}, '<a>&lt;a&gt;'),
+]
+
+
+@pytest.mark.parametrize('renderer', RENDERERS)
+@pytest.mark.parametrize('template,context,expected', SAFE_CASES)
+def test_safe_values(renderer, template, context, expected):
+    assert renderer(template, context) == expected
+
+
+def test_escape_memo():
+    memo = EscapeMemo(maxsize=2, max_length=8)
+    assert memo.escape('R&D') == 'R&amp;D'
+    assert memo.escape('R&D') is memo.escape('R&D')
+    memo.escape('<a>')
+    memo.escape('<b>')
+    assert len(memo) == 1
+    memo.resize(0)
+    assert len(memo) == 0
+
+
+@pytest.fixture
+def enabled_escape_memo():
+    ESCAPE_MEMO.resize(16, max_length=8)
+    yield ESCAPE_MEMO
+    ESCAPE_MEMO.resize(0)
+
+
+def test_escape_uses_memo(enabled_escape_memo):
+    assert escape('R&D') == 'R&amp;D'
+    assert escape('longer than 8 & not memoized') == 'longer than 8 &amp; not memoized'
+    assert escape('clean') == 'clean'
+    assert enabled_escape_memo.escaped == {'R&D': 'R&amp;D'}
@@ -1,7 +1,11 @@
 import datetime as dt
+from decimal import Decimal
+import enum
+from numbers import Number
 import pytest
 from moosetash import (
     MissingPartial,
+    SerializerRegistry,
     MissingVariable,
     default_serializer,
     missing_partial_default,
@@ -10,6 +14,10 @@ from moosetash import (
     missing_variable_default,
     missing_variable_keep,
     missing_variable_raise,
+    compile,
+    compile_python,
+    passes_strings,
+    render,
 )
 
 
@@ -55,3 +63,78 @@ SERIALIZER_CASES = [
 @pytest.mark.parametrize('test_input,expected', SERIALIZER_CASES)
 def test_default_serializer(test_input, expected):
     assert default_serializer(test_input) == expected
+
+
+class Colour(enum.Enum):
+    RED = 'red'
+
+
+def serialize_date(value):
+    return value.strftime('%d/%m/%Y')
+
+
+REGISTRY = SerializerRegistry(
+    {
+        dt.date: serialize_date,
+        enum.Enum: lambda value: value.value,
+        Number: lambda value: f'#{value}',
+    }
+)
+
+REGISTRY_CASES = [
+    (dt.date(2020, 9, 1), '01/09/2020'),
+    (dt.datetime(2020, 9, 1, 12), '01/09/2020'),
+    (Colour.RED, 'red'),
+    (Decimal('1.50'), '#1.50'),
+    (2, '#2'),
+    ('string', 'string'),
+    (Dummy(), 'DUMMY STRING'),
+]
+
+
+@pytest.mark.parametrize('test_input,expected', REGISTRY_CASES)
+def test_serializer_registry(test_input, expected):
+    assert REGISTRY(test_input) == expected
+
+
+def test_serializer_registry_caches_resolution():
+    registry = SerializerRegistry()
+    assert registry(1) == '1'
+    assert registry.cache == {int: default_serializer}
+
+    @registry.register(int)
+    def serialize_int(value):
+        return f'int {value}'
+
+    assert registry.cache == {}
+    assert registry(True) == 'int True'
+    assert registry.resolve(bool) is serialize_int
+
+
+def test_passes_strings():
+    assert passes_strings(default_serializer)
+    assert passes_strings(REGISTRY)
+    assert not passes_strings(SerializerRegistry({str: str.upper}))
+    assert not passes_strings(SerializerRegistry({object: repr}))
+    assert not passes_strings(str.upper)
+
+
+@pytest.mark.parametrize(
+    'renderer',
+    [
+        lambda template, context, serializer: render(template, context, serializer=serializer),
+        lambda template, context, serializer: compile(template).render(
+            context, serializer=serializer
+        ),
+        lambda template, context, serializer: compile_python(template).render(
+            context, serializer=serializer
+        ),
+    ],
+)
+def test_render_with_serializer(renderer):
+    template = '{{date}} {{&text}} {{text}} {{number}}'
+    context = {'date': dt.date(2020, 9, 1), 'text': 'a&b', 'number': 3}
+    assert renderer(template, context, REGISTRY) == '01/09/2020 a&b a&amp;b #3'
+
+    upper = SerializerRegistry({str: str.upper})
+    assert renderer(template, context, upper) == '2020-09-01 A&B A&amp;B 3'
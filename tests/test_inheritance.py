@@ -0,0 +1,153 @@
+import asyncio
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+from moosetash import compile, compile_python, render, render_async
+from moosetash.template import PARTIAL_CACHE, Node, parse, resolve_blocks
+from moosetash.tokenizer import Token
+
+
+async def render_async_joined(template, context, partials):
+    return ''.join([chunk async for chunk in render_async(template, context, partials=partials)])
+
+
+RENDERERS = [
+    lambda template, context, partials: render(template, context, partials=partials),
+    lambda template, context, partials: compile(template).render(context, partials=partials),
+    lambda template, context, partials: compile_python(template).render(context, partials=partials),
+    lambda template, context, partials: asyncio.run(
+        render_async_joined(template, context, partials)
+    ),
+]
+
+INHERITANCE_CASES: List[Tuple[str, Any, Dict[str, str], str]] = [
+    ('{{<parent}}{{/parent}}', {}, {'parent': '{{$a}}default{{/a}}'}, 'default'),
+    (
+        '{{<parent}}{{$block}}child{{/block}}{{/parent}}',
+        {},
+        {'parent': 'p[{{$block}}default{{/block}}]'},
+        'p[child]',
+    ),
+    (
+        '{{<parent}}{{$stuff}}hello{{/stuff}}{{/parent}}',
+        {},
+        {'parent': '|{{$stuff}}...{{/stuff}}{{$default}} default{{/default}}|'},
+        '|hello default|',
+    ),
+    (
+        '{{<parent}}{{$ballmer}}peaked{{/ballmer}}{{/parent}}',
+        {},
+        {'parent': '{{$ballmer}}peaking{{/ballmer}}'},
+        'peaked',
+    ),
+    (
+        '|{{<parent}}{{$stuff}}new{{/stuff}}{{/parent}} {{<parent}}{{/parent}}|',
+        {},
+        {'parent': '{{$stuff}}old{{/stuff}}'},
+        '|new old|',
+    ),
+    (
+        '{{<parent}}{{$a}}c{{/a}}{{/parent}}',
+        {},
+        {
+            'parent': '{{<older}}{{$a}}p{{/a}}{{/older}}',
+            'older': '{{<grandParent}}{{$a}}o{{/a}}{{/grandParent}}',
+            'grandParent': '{{$a}}g{{/a}}',
+        },
+        'c',
+    ),
+    (
+        '{{<parent}}{{$a}}c{{/a}}{{/parent}}',
+        {},
+        {
+            'parent': '{{<older}}{{/older}}',
+            'older': '{{<grandParent}}{{/grandParent}}',
+            'grandParent': '{{$a}}g{{/a}}',
+        },
+        'c',
+    ),
+    (
+        '{{<parent}}{{$foo}}override{{/foo}}{{/parent}}',
+        {},
+        {
+            'parent': '{{$foo}}default content{{/foo}} {{$bar}}{{<parent2}}{{/parent2}}{{/bar}}',
+            'parent2': (
+                '{{$foo}}parent2 default content{{/foo}} '
+                '{{<parent}}{{$bar}}don\'t recurse{{/bar}}{{/parent}}'
+            ),
+        },
+        'override override override don\'t recurse',
+    ),
+    (
+        '{{<parent}}{{$block}}I say {{fruit}}.{{/block}}{{/parent}}',
+        {'fruit': 'bananas'},
+        {'parent': '{{$block}}{{/block}}'},
+        'I say bananas.',
+    ),
+    (
+        '{{<include}}{{$foo}}{{bar}}{{/foo}}{{/include}}',
+        {'bar': 'baz'},
+        {'include': '{{$foo}}{{/foo}}'},
+        'baz',
+    ),
+    (
+        '{{<parent}}{{$foo}}set{{/foo}} ignored text{{/parent}}',
+        {},
+        {'parent': '{{$foo}}default{{/foo}}'},
+        'set',
+    ),
+    ('{{$foo}}default{{/foo}}', {'foo': 'data'}, {}, 'default'),
+    (
+        '{{#section}}{{<parent}}{{$b}}{{value}}{{/b}}{{/parent}}{{/section}}',
+        {'section': [{'value': 1}, {'value': 2}]},
+        {'parent': '[{{$b}}{{/b}}]'},
+        '[1][2]',
+    ),
+    (
+        'Hi,\n  {{<parent}}\n  {{/parent}}\n',
+        {},
+        {'parent': 'one\ntwo\n'},
+        'Hi,\n  one\n  two\n',
+    ),
+    ('{{<missing}}{{$a}}x{{/a}}{{/missing}}', {}, {}, ''),
+]
+
+
+@pytest.mark.parametrize('renderer', RENDERERS)
+@pytest.mark.parametrize('template,context,partials,expected', INHERITANCE_CASES)
+def test_inheritance(renderer, template, context, partials, expected):
+    assert renderer(template, context, partials) == expected
+
+
+def test_resolve_blocks():
+    nodes = resolve_blocks(
+        parse('{{$a}}A{{/a}}{{<parent}}{{$b}}B{{/b}}text{{/parent}}'),
+        {'a': (Node(Token.LITERAL, 'x'),)},
+    )
+    assert nodes[0] == Node(Token.LITERAL, 'x')
+    assert nodes[1].token is Token.PARENT
+    assert nodes[1].children == (
+        Node(Token.SUBSTITUTION, 'a', children=(Node(Token.LITERAL, 'x'),)),
+        Node(Token.SUBSTITUTION, 'b', children=(Node(Token.LITERAL, 'B'),)),
+    )
+
+
+def test_parent_compiled_once_per_overrides():
+    PARTIAL_CACHE.clear()
+    template = compile('{{<parent}}{{$a}}child{{/a}}{{/parent}}')
+    partials = {'parent': '[{{$a}}{{/a}}]'}
+    assert template.render({}, partials=partials) == '[child]'
+    assert PARTIAL_CACHE.cache_info().misses == 1
+    assert template.render({}, partials=partials) == '[child]'
+    assert PARTIAL_CACHE.cache_info().misses == 1
+
+    other = compile('{{<parent}}{{$a}}other{{/a}}{{/parent}}')
+    assert other.render({}, partials=partials) == '[other]'
+    assert PARTIAL_CACHE.cache_info().misses == 2
+
+
+def test_changed_parent_is_recompiled():
+    template = compile('{{<parent}}{{$a}}child{{/a}}{{/parent}}')
+    assert template.render({}, partials={'parent': '[{{$a}}{{/a}}]'}) == '[child]'
+    assert template.render({}, partials={'parent': '({{$a}}{{/a}})'}) == '(child)'
@@ -0,0 +1,70 @@
+import pytest
+
+from moosetash import compile, compile_python, render
+from moosetash.template import LAMBDA_CACHE, Template
+from moosetash.tokenizer import TOKEN_CACHE, tokenize_cached, tokenize_sections
+
+
+@pytest.fixture(autouse=True)
+def clear_lambda_cache():
+    LAMBDA_CACHE.clear()
+    yield
+    LAMBDA_CACHE.clear()
+
+
+RENDERERS = [
+    lambda template, context: render(template, context),
+    lambda template, context: compile(template).render(context),
+    lambda template, context: compile_python(template).render(context),
+]
+
+
+@pytest.mark.parametrize('renderer', RENDERERS)
+def test_lambda_results_cached(renderer):
+    calls = []
+
+    def translate(text):
+        calls.append(text)
+        return '{{greeting}}, {{name}}'
+
+    template = '{{#people}}{{#translate}}Hello{{/translate}}|{{/people}}'
+    context = {
+        'people': [{'name': 'a', 'greeting': 'Hi'}, {'name': 'b', 'greeting': 'Hi'}],
+        'translate': translate,
+    }
+
+    assert renderer(template, context) == 'Hi, a|Hi, b|'
+    assert calls == ['Hello', 'Hello']
+    assert LAMBDA_CACHE.cache_info()[:2] == (1, 1)
+
+
+@pytest.mark.parametrize('renderer', RENDERERS)
+def test_lambda_results_cached_by_delimiters(renderer):
+    template = '{{#wrap}}x{{/wrap}}{{=| |=}}|#wrap|y|/wrap|'
+    context = {'wrap': lambda text: '|text|{{text}}', 'text': 'value'}
+
+    assert renderer(template, context) == '|text|value' + 'value{{text}}'
+    assert len(LAMBDA_CACHE) == 2
+
+
+def test_lambda_cache_kinds():
+    context = {'lambda': lambda: '{{value}}', 'value': 1}
+    render('{{lambda}}', context)
+    compile('{{lambda}}').render(context)
+    assert (tokenize_sections, '{{value}}', '{{', '}}') in LAMBDA_CACHE
+    assert (Template.compile, '{{value}}', '{{', '}}') in LAMBDA_CACHE
+
+
+def test_section_text_memoized():
+    TOKEN_CACHE.clear()
+    template = '{{#items}}{{#lambda}}text {{value}}{{/lambda}}{{/items}}'
+    seen = []
+
+    def section_lambda(text):
+        seen.append(text)
+        return text
+
+    context = {'items': [{'value': 1}, {'value': 2}], 'lambda': section_lambda}
+    assert render(template, context) == 'text 1text 2'
+    assert seen[0] is seen[1]
+    assert tokenize_cached(template).sections == {1: 'text {{value}}'}
@@ -0,0 +1,184 @@
+from typing import Any, Dict
+import asyncio
+import io
+import time
+
+import pytest
+
+from moosetash import (
+    DeadlineExceeded,
+    DepthLimitExceeded,
+    OutputLimitExceeded,
+    Profiler,
+    RenderLimitExceeded,
+    compile,
+    compile_python,
+    metrics,
+    render,
+    render_async,
+    render_iter,
+    render_many,
+    render_to,
+)
+
+
+def nested(depth):
+    context: Dict[str, Any] = {}
+    for _ in range(depth):
+        context = {'c': context}
+    return context
+
+
+def render_to_string(template, context, **options):
+    stream = io.StringIO()
+    render_to(stream, template, context, **options)
+    return stream.getvalue()
+
+
+def compiled_render_to_string(template, context, **options):
+    stream = io.StringIO()
+    compile(template).render_to(stream, context, **options)
+    return stream.getvalue()
+
+
+def render_async_string(template, context, **options):
+    async def collect():
+        return ''.join([chunk async for chunk in render_async(template, context, **options)])
+
+    return asyncio.run(collect())
+
+
+RENDERERS = [
+    render,
+    lambda template, context, **options: ''.join(render_iter(template, context, **options)),
+    render_to_string,
+    lambda template, context, **options: compile(template).render(context, **options),
+    lambda template, context, **options: compile_python(template).render(context, **options),
+    compiled_render_to_string,
+    render_async_string,
+    lambda template, context, **options: render_many(template, [context], **options)[0],
+]
+
+
+@pytest.mark.parametrize('renderer', RENDERERS)
+@pytest.mark.parametrize(
+    'template,context,partials,limits',
+    [
+        ('{{a}}', {'a': 'x' * 10}, {}, {'max_output_chars': 10}),
+        ('{{>p}}', {}, {'p': '{{>q}}', 'q': 'q'}, {'max_depth': 2}),
+        ('{{#l}}{{.}}{{/l}}', {'l': [1, 2, 3]}, {}, {'max_depth': 0, 'max_output_chars': 3}),
+        ('{{a}}', {'a': 'x'}, {}, {'deadline': time.monotonic() + 60}),
+    ],
+)
+def test_within_limits(renderer, template, context, partials, limits):
+    assert renderer(template, context, partials=partials, **limits) == render(
+        template, context, partials=partials
+    )
+
+
+@pytest.mark.parametrize('renderer', RENDERERS)
+@pytest.mark.parametrize(
+    'template,context,partials,limits,exception',
+    [
+        ('{{a}}', {'a': 'x' * 11}, {}, {'max_output_chars': 10}, OutputLimitExceeded),
+        ('{{#l}}ab{{/l}}', {'l': range(100)}, {}, {'max_output_chars': 150}, OutputLimitExceeded),
+        ('{{>p}}', {}, {'p': '{{>q}}', 'q': 'q'}, {'max_depth': 1}, DepthLimitExceeded),
+        ('{{>p}}', {}, {'p': '{{>p}}'}, {'max_depth': 50}, DepthLimitExceeded),
+        ('{{#l}}{{>p}}{{/l}}', {'l': [1]}, {'p': 'p'}, {'max_depth': 0}, DepthLimitExceeded),
+        ('{{f}}', {'f': lambda: '{{f}}'}, {}, {'max_depth': 10}, DepthLimitExceeded),
+        ('{{#f}}x{{/f}}', {'f': lambda text: text}, {}, {'max_depth': 0}, DepthLimitExceeded),
+        ('{{<p}}{{/p}}', {}, {'p': 'p'}, {'max_depth': 0}, DepthLimitExceeded),
+        ('{{a}}', {'a': 'x'}, {}, {'deadline': time.monotonic() - 1}, DeadlineExceeded),
+    ],
+)
+def test_limit_exceeded(renderer, template, context, partials, limits, exception):
+    with pytest.raises(exception):
+        renderer(template, context, partials=partials, **limits)
+
+
+def test_deadline_passed_during_render():
+    def slow():
+        time.sleep(0.001)
+        return 'x'
+
+    with pytest.raises(DeadlineExceeded):
+        render('{{#l}}{{f}}{{/l}}', {'l': range(1000), 'f': slow}, deadline=time.monotonic() + 0.02)
+
+
+@pytest.mark.parametrize(
+    'template,context,partials',
+    [
+        ('{{#l}}{{#hidden}}x{{/hidden}}{{/l}}done', {'l': [{'hidden': False}] * 3_000_000}, {}),
+        ('{{#l}}{{f}}{{/l}}', {'l': [1] * 3_000_000, 'f': lambda: ''}, {}),
+        ('{{#l}}{{>p}}{{/l}}', {'l': [{}] * 3_000_000}, {'p': '{{#hidden}}x{{/hidden}}'}),
+    ],
+)
+@pytest.mark.parametrize('renderer', RENDERERS)
+def test_deadline_passed_without_output(renderer, template, context, partials):
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        renderer(
+            template, context, partials=partials, max_depth=None, deadline=time.monotonic() + 0.05
+        )
+    assert time.monotonic() - started < 1
+
+
+@pytest.mark.parametrize('compiler', [compile, compile_python])
+@pytest.mark.parametrize(
+    'context,partials',
+    [
+        ({}, {'n': '{{>n}}'}),
+        ({'f': lambda: '{{f}}'}, {'n': '{{f}}'}),
+        (nested(2000), {'n': '{{#c}}{{>n}}{{/c}}'}),
+    ],
+)
+def test_compiled_render_too_deep_for_the_stack(compiler, context, partials):
+    with pytest.raises(DepthLimitExceeded):
+        compiler('{{>n}}').render(context, partials=partials)
+    with pytest.raises(DepthLimitExceeded):
+        compiler('{{>n}}').render(context, partials=partials, profiler=Profiler())
+
+
+def test_limits_share_a_base_class():
+    with pytest.raises(RenderLimitExceeded):
+        render('{{a}}', {'a': 'too long'}, max_output_chars=1)
+
+
+def test_limited_render_is_lazy():
+    chunks = render_iter('{{#l}}{{.}}{{/l}}', {'l': list('abcdefghij')}, max_output_chars=5)
+    assert [next(chunks) for _ in range(5)] == ['a', 'b', 'c', 'd', 'e']
+    with pytest.raises(OutputLimitExceeded):
+        next(chunks)
+
+
+@pytest.mark.parametrize(
+    'template,context,partials,limits,exception',
+    [
+        ('{{a}}', {'a': 'xx'}, {}, {'max_output_chars': 1}, OutputLimitExceeded),
+        (
+            '{{>n}}',
+            {'c': {'c': {}}},
+            {'n': '{{#c}}{{>n}}{{/c}}'},
+            {'max_depth': 1},
+            DepthLimitExceeded,
+        ),
+        ('{{a}}', {'a': 'x'}, {}, {'deadline': time.monotonic() - 1}, DeadlineExceeded),
+    ],
+)
+def test_profiled_render_is_limited(template, context, partials, limits, exception):
+    with pytest.raises(exception):
+        render(template, context, partials=partials, profiler=Profiler(), **limits)
+
+    metrics.configure(metrics.InMemorySink(), profile_rate=1)
+    try:
+        with pytest.raises(exception):
+            render(template, context, partials=partials, **limits)
+    finally:
+        metrics.configure(None)
+
+
+def test_profiled_render_nests_without_recursion():
+    partials = {'n': '{{#c}}{{>n}}{{/c}}x'}
+    assert render(
+        '{{>n}}', nested(600), partials=partials, profiler=Profiler(), max_depth=None
+    ) == ('x' * 600)
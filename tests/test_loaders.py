@@ -0,0 +1,92 @@
+import pickle
+
+import pytest
+
+from moosetash import ChoiceLoader, DictLoader, FileSystemLoader, compile, compile_python, render
+
+
+@pytest.fixture
+def templates(tmp_path):
+    (tmp_path / 'users').mkdir()
+    (tmp_path / 'users' / 'row.mustache').write_text('<{{name}}>\n')
+    (tmp_path / 'header.mustache').write_text('Header\n')
+    return tmp_path
+
+
+def test_dict_loader():
+    loader = DictLoader({'partial': 'value'})
+    assert loader.get('partial') == 'value'
+    assert loader.get('missing') is None
+
+
+def test_choice_loader():
+    loader = ChoiceLoader([DictLoader({'a': 'first'}), {'a': 'second', 'b': 'second'}])
+    assert loader.get('a') == 'first'
+    assert loader.get('b') == 'second'
+    assert loader.get('c') is None
+
+
+def test_file_system_loader(templates):
+    loader = FileSystemLoader(templates)
+    assert loader.get('header') == 'Header\n'
+    assert loader.get('users/row') == '<{{name}}>\n'
+    assert loader.get('missing') is None
+    assert loader.get('../outside') is None
+    assert loader.get('header') is loader.get('header')
+
+
+def test_file_system_loader_search_paths(templates, tmp_path_factory):
+    overrides = tmp_path_factory.mktemp('overrides')
+    (overrides / 'header.txt').write_text('Override\n')
+    (templates / 'footer.txt').write_text('Footer\n')
+
+    loader = FileSystemLoader([str(overrides), templates], extension='.txt')
+    assert loader.get('header') == 'Override\n'
+    assert loader.get('footer') == 'Footer\n'
+
+
+def test_file_system_loader_revalidates(templates):
+    loader = FileSystemLoader(templates, check_interval=0)
+    assert loader.get('header') == 'Header\n'
+    (templates / 'header.mustache').write_text('New header\n')
+    assert loader.get('header') == 'New header\n'
+    (templates / 'header.mustache').unlink()
+    assert loader.get('header') is None
+
+
+def test_file_system_loader_check_interval(templates):
+    loader = FileSystemLoader(templates, check_interval=None)
+    assert loader.get('header') == 'Header\n'
+    (templates / 'header.mustache').write_text('New header\n')
+    assert loader.get('header') == 'Header\n'
+    loader.clear()
+    assert loader.get('header') == 'New header\n'
+
+
+def test_file_system_loader_pickles(templates):
+    loader = FileSystemLoader(templates, check_interval=5)
+    loader.get('header')
+    unpickled = pickle.loads(pickle.dumps(loader))
+    assert unpickled.files == {}
+    assert unpickled.check_interval == 5
+    assert unpickled.get('header') == 'Header\n'
+
+
+@pytest.mark.parametrize(
+    'renderer',
+    [
+        lambda template, context, partials: render(template, context, partials=partials),
+        lambda template, context, partials: compile(template).render(context, partials=partials),
+        lambda template, context, partials: compile_python(template).render(
+            context, partials=partials
+        ),
+    ],
+)
+def test_render_with_loader(templates, renderer):
+    loader = ChoiceLoader([FileSystemLoader(templates, check_interval=0), {'footer': 'Footer'}])
+    template = '{{>header}}\n{{#users}}\n  {{>users/row}}\n{{/users}}\n{{>footer}}'
+    context = {'users': [{'name': 'a'}, {'name': 'b'}]}
+
+    assert renderer(template, context, loader) == 'Header\n  <a>\n  <b>\nFooter'
+    (templates / 'users' / 'row.mustache').write_text('[ {{name}} ]\n')
+    assert renderer(template, context, loader) == 'Header\n  [ a ]\n  [ b ]\nFooter'
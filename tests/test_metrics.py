@@ -0,0 +1,180 @@
+import asyncio
+import io
+
+import pytest
+
+from moosetash import compile, compile_python, metrics, render, render_async, render_to
+from moosetash.handlers import missing_variable_keep
+from moosetash.template import PARTIAL_CACHE
+from moosetash.tokenizer import TOKEN_CACHE
+
+TEMPLATE = '{{#items}}{{>row}}{{/items}}{{missing}}{{>absent}}{{lambda}}'
+CONTEXT = {'items': [{'v': 1}, {'v': 2}], 'lambda': lambda: 'x'}
+PARTIALS = {'row': '<{{v}}>'}
+OUTPUT = '<1><2>x'
+
+RENDERERS = [
+    lambda **options: render(TEMPLATE, CONTEXT, partials=PARTIALS, **options),
+    lambda **options: compile(TEMPLATE).render(CONTEXT, partials=PARTIALS, **options),
+    lambda **options: compile_python(TEMPLATE).render(CONTEXT, partials=PARTIALS, **options),
+]
+
+
+@pytest.fixture
+def sink():
+    sink = metrics.InMemorySink()
+    yield sink
+    metrics.configure(None)
+
+
+@pytest.mark.parametrize('renderer', RENDERERS)
+def test_render_metrics(sink, renderer):
+    metrics.configure(sink)
+    assert renderer(name='page') == OUTPUT
+    assert sink.counter('render.count', template='page') == 1
+    assert sink.counter('render.output_chars', template='page') == len(OUTPUT)
+    assert len(sink.timings[metrics.tag_key('render.duration', {'template': 'page'})]) == 1
+    assert sink.counter('missing_variable') == 1
+    assert sink.counter('missing_partial') == 1
+    assert sink.counter('lambda.calls') == 1
+
+
+def test_unnamed_render(sink):
+    metrics.configure(sink)
+    render('{{a}}', {'a': 1})
+    assert sink.counter('render.count', template=metrics.UNNAMED) == 1
+
+
+def test_metrics_off():
+    metrics.configure(None)
+    assert metrics.RECORDER is None
+    assert render(TEMPLATE, CONTEXT, partials=PARTIALS, name='page') == OUTPUT
+
+
+def test_counted_handler_keeps_behaviour(sink):
+    metrics.configure(sink)
+    assert render('{{missing}}', {}, missing_variable_handler=missing_variable_keep) == (
+        '{{ missing }}'
+    )
+    assert sink.counter('missing_variable') == 1
+
+
+@pytest.mark.parametrize(
+    'renderer',
+    [
+        lambda stream: render_to(stream, TEMPLATE, CONTEXT, partials=PARTIALS, name='page'),
+        lambda stream: compile(TEMPLATE).render_to(
+            stream, CONTEXT, partials=PARTIALS, buffer_size=2, name='page'
+        ),
+    ],
+)
+def test_render_to_metrics(sink, renderer):
+    metrics.configure(sink)
+    stream = io.StringIO()
+    renderer(stream)
+    assert stream.getvalue() == OUTPUT
+    assert sink.counter('render.output_chars', template='page') == len(OUTPUT)
+
+
+def test_async_handler_metrics(sink):
+    metrics.configure(sink)
+
+    async def collect():
+        return ''.join(
+            [chunk async for chunk in render_async(TEMPLATE, CONTEXT, partials=PARTIALS)]
+        )
+
+    assert asyncio.run(collect()) == OUTPUT
+    assert sink.counter('missing_variable') == 1
+    assert sink.counter('lambda.calls') == 1
+
+
+@pytest.mark.parametrize('renderer', RENDERERS)
+def test_slow_render(sink, renderer):
+    slow = []
+    metrics.configure(sink, slow_render_threshold=0, on_slow_render=slow.append, profile_rate=1)
+    renderer(name='page')
+    assert sink.counter('render.slow', template='page') == 1
+    [slow_render] = slow
+    assert slow_render.name == 'page'
+    assert slow_render.duration >= 0
+    assert {(stats.kind, stats.name) for stats in slow_render.hottest_sections} == {
+        ('section', 'items'),
+        ('partial', 'row'),
+        ('partial', 'absent'),
+        ('lambda', 'lambda'),
+    }
+
+
+def nested(depth):
+    context = {}
+    for _ in range(depth):
+        context = {'c': context}
+    return context
+
+
+SAMPLED_CASES = [
+    (TEMPLATE, CONTEXT, PARTIALS, {}),
+    ('{{>absent}}{{>absent}}{{#items}}{{>absent}}{{/items}}', CONTEXT, {}, {}),
+    ('{{>n}}', nested(10), {'n': '{{#c}}{{>n}}{{/c}}x'}, {'max_depth': 3}),
+    ('{{>n}}', nested(600), {'n': '{{#c}}{{>n}}{{/c}}x'}, {'max_depth': None}),
+    ('{{#a}}\n{{/b}}', {'a': True}, {}, {}),
+    ('{{#l}}{{f}}{{/l}}', {'l': [1, 2], 'f': lambda: '{{missing}}'}, {}, {'max_output_chars': 1}),
+]
+
+
+def outcome(sink, template, context, partials, options):
+    try:
+        result = render(template, context, partials=partials, **options)
+    except Exception as ex:  # pylint:disable=broad-except
+        result = (type(ex), str(ex))
+    counters = {key: value for key, value in sink.counters.items() if key[0] != 'render.count'}
+    sink.counters.clear()
+    return result, counters
+
+
+@pytest.mark.parametrize('template,context,partials,options', SAMPLED_CASES)
+def test_sampled_render_matches_unsampled(sink, template, context, partials, options):
+    metrics.configure(sink)
+    unsampled = outcome(sink, template, context, partials, options)
+    metrics.configure(sink, profile_rate=1)
+    assert outcome(sink, template, context, partials, options) == unsampled
+
+
+def test_slow_render_without_profile(sink):
+    slow = []
+    metrics.configure(sink, slow_render_threshold=0, on_slow_render=slow.append)
+    render(TEMPLATE, CONTEXT, partials=PARTIALS)
+    assert slow == [metrics.SlowRender(metrics.UNNAMED, slow[0].duration, [])]
+
+
+def test_fast_render_is_not_slow(sink):
+    slow = []
+    metrics.configure(sink, slow_render_threshold=60, on_slow_render=slow.append)
+    render(TEMPLATE, CONTEXT, partials=PARTIALS)
+    assert slow == []
+    assert sink.counter('render.slow', template=metrics.UNNAMED) == 0
+
+
+def test_cache_gauges(sink):
+    metrics.configure(sink, collect_interval=None)
+    TOKEN_CACHE.clear()
+    render('{{a}}', {})
+    render('{{a}}', {})
+    assert sink.gauges == {}
+
+    metrics.collect()
+    assert sink.gauges[metrics.tag_key('cache.tokens.misses', None)] == 1
+    assert sink.gauges[metrics.tag_key('cache.tokens.hits', None)] == 1
+    assert sink.gauges[metrics.tag_key('cache.tokens.size', None)] == 1
+    assert (
+        sink.gauges[metrics.tag_key('cache.partials.size', None)]
+        == PARTIAL_CACHE.cache_info().currsize
+    )
+    assert metrics.tag_key('cache.lambdas.evictions', None) in sink.gauges
+
+
+def test_cache_gauges_collected_after_render(sink):
+    metrics.configure(sink, collect_interval=0)
+    render('{{a}}', {})
+    assert metrics.tag_key('cache.tokens.hits', None) in sink.gauges
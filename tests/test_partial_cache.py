@@ -0,0 +1,71 @@
+import pytest
+
+from moosetash import compile, compile_python, render
+from moosetash.render import tokenize_partial
+from moosetash.template import PARTIAL_CACHE, Template, cached_partial
+
+
+@pytest.fixture(autouse=True)
+def clear_partial_cache():
+    PARTIAL_CACHE.clear()
+    yield
+    PARTIAL_CACHE.clear()
+
+
+def test_cached_partial_reuses_built_partial():
+    built = []
+
+    def build(template):
+        built.append(template)
+        return template.upper()
+
+    assert cached_partial('kind', 'name', 'a\nb\n', '  ', build) == '  A\n  B\n'
+    assert cached_partial('kind', 'name', 'a\nb\n', '  ', build) == '  A\n  B\n'
+    assert built == ['  a\n  b\n']
+
+    assert cached_partial('kind', 'name', 'a\nb\n', '', build) == 'A\nB\n'
+    assert cached_partial('other', 'name', 'a\nb\n', '  ', build) == '  A\n  B\n'
+    assert len(built) == 3
+
+
+def test_cached_partial_rebuilds_changed_source():
+    assert cached_partial('kind', 'name', 'one', '', str.upper) == 'ONE'
+    assert cached_partial('kind', 'name', 'two', '', str.upper) == 'TWO'
+    assert len(PARTIAL_CACHE) == 1
+
+
+@pytest.mark.parametrize(
+    'renderer',
+    [
+        lambda template, context, partials: render(template, context, partials=partials),
+        lambda template, context, partials: compile(template).render(context, partials=partials),
+        lambda template, context, partials: compile_python(template).render(
+            context, partials=partials
+        ),
+    ],
+)
+def test_partials_mapping_changes(renderer):
+    template = '{{#items}}\n  {{>item}}\n{{/items}}'
+    context = {'items': [1, 2]}
+
+    assert renderer(template, context, {'item': '<{{.}}>\n'}) == '  <1>\n  <2>\n'
+    assert renderer(template, context, {'item': '[{{.}}]\n'}) == '  [1]\n  [2]\n'
+    assert renderer(template, context, {}) == ''
+    assert renderer(template, context, {'item': '<{{.}}>\n'}) == '  <1>\n  <2>\n'
+
+
+def test_partial_tokens_cached_per_indentation():
+    partials = {'item': '{{.}}\n'}
+    assert render('{{>item}}\n  {{>item}}\n', 1, partials=partials) == '1\n  1\n'
+    assert render('{{>item}}\n  {{>item}}\n', 2, partials=partials) == '2\n  2\n'
+    assert (tokenize_partial, 'item', '') in PARTIAL_CACHE
+    assert (tokenize_partial, 'item', '  ') in PARTIAL_CACHE
+    assert PARTIAL_CACHE.cache_info().misses == 2
+
+
+def test_compiled_partials_cached_per_template_class():
+    partials = {'item': '{{.}}'}
+    compile('{{>item}}').render(1, partials=partials)
+    compile_python('{{>item}}').render(1, partials=partials)
+    assert (Template.compile, 'item', '') in PARTIAL_CACHE
+    assert len(PARTIAL_CACHE) == 2
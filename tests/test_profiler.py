@@ -0,0 +1,129 @@
+import io
+from itertools import count
+
+import pytest
+
+from moosetash import LambdaException, Profiler, compile, compile_python, render
+
+TEMPLATE = 'Hi {{name}}\n{{#items}}\n  {{>row}}\n{{/items}}\n{{^items}}none{{/items}}{{lambda}}'
+CONTEXT = {'name': 'moose', 'items': [{'v': 1}, {'v': 2}], 'lambda': lambda: '{{name}}'}
+PARTIALS = {'row': '<{{v}}>\n'}
+
+RENDERERS = [
+    lambda template, **options: render(template, CONTEXT, partials=PARTIALS, **options),
+    lambda template, **options: compile(template).render(CONTEXT, partials=PARTIALS, **options),
+    lambda template, **options: compile_python(template).render(
+        CONTEXT, partials=PARTIALS, **options
+    ),
+]
+
+
+@pytest.mark.parametrize('renderer', RENDERERS)
+def test_profiled_render(renderer):
+    profiler = Profiler()
+    assert renderer(TEMPLATE, profiler=profiler) == renderer(TEMPLATE)
+    calls = {
+        (stats.kind, stats.name, stats.location): stats.calls for stats in profiler.stats.values()
+    }
+    assert calls == {
+        ('variable', 'name', '<template>:1'): 1,
+        ('serialize', 'name', '<template>:1'): 1,
+        ('section', 'items', '<template>:2'): 1,
+        ('partial', 'row', '<template>:3'): 2,
+        ('variable', 'v', 'row:1'): 2,
+        ('serialize', 'v', 'row:1'): 2,
+        ('inverted', 'items', '<template>:5'): 1,
+        ('variable', 'lambda', '<template>:5'): 1,
+        ('lambda', 'lambda', '<template>:5'): 1,
+        ('variable', 'name', 'lambda (lambda):1'): 1,
+        ('serialize', 'name', 'lambda (lambda):1'): 1,
+        ('serialize', 'lambda', '<template>:5'): 1,
+    }
+
+
+@pytest.mark.parametrize(
+    'renderer',
+    [
+        lambda template, context, **options: render(template, context, **options),
+        lambda template, context, **options: compile(template).render(context, **options),
+    ],
+)
+def test_profiled_times(renderer):
+    # Each reading of the timer advances it by one second
+    profiler = Profiler(timer=count().__next__)
+    renderer('{{#items}}{{value}}{{/items}}', {'items': [{'value': 1}]}, profiler=profiler)
+    section, variable, serialize = profiler.sorted_stats('cumulative')
+    assert (section.kind, section.cumulative_time, section.own_time) == ('section', 5, 2)
+    assert (variable.kind, variable.cumulative_time, variable.own_time) == ('variable', 3, 2)
+    assert (serialize.kind, serialize.cumulative_time, serialize.own_time) == ('serialize', 1, 1)
+
+
+def test_profiled_lambda_section():
+    profiler = Profiler()
+    template = compile('{{#wrap}}{{name}}{{/wrap}}')
+    context = {'wrap': lambda text: f'<b>{text}</b>', 'name': 'moose'}
+    assert template.render(context, profiler=profiler) == '<b>moose</b>'
+    assert [(stats.kind, stats.location) for stats in profiler.sorted_stats('line')] == [
+        ('lambda', '<template>:1'),
+        ('section', '<template>:1'),
+        ('serialize', 'wrap (lambda):1'),
+        ('variable', 'wrap (lambda):1'),
+    ]
+
+
+def test_profiled_parent():
+    profiler = Profiler()
+    template = compile('{{<parent}}{{$block}}{{name}}{{/block}}{{/parent}}')
+    partials = {'parent': '[\n{{$block}}{{/block}}]'}
+    assert template.render({'name': 'moose'}, partials=partials, profiler=profiler) == '[\nmoose]'
+    assert {(stats.kind, stats.location) for stats in profiler.stats.values()} == {
+        ('parent', '<template>:1'),
+        ('variable', 'parent:1'),
+        ('serialize', 'parent:1'),
+    }
+
+
+@pytest.mark.parametrize(
+    'renderer',
+    [
+        lambda template, context, **options: render(template, context, **options),
+        lambda template, context, **options: compile(template).render(context, **options),
+        lambda template, context, **options: compile_python(template).render(context, **options),
+    ],
+)
+def test_profiler_reused_after_failed_render(renderer):
+    profiler = Profiler()
+    with pytest.raises(LambdaException):
+        renderer(
+            '{{>p}}', {'f': lambda text: 1 / 0}, partials={'p': '{{#f}}x{{/f}}'}, profiler=profiler
+        )
+    assert not profiler.templates and not profiler.child_times
+
+    renderer('{{a}}', {'a': 1}, profiler=profiler)
+    assert ('variable', 'a', '<template>', 1) in profiler.stats
+
+
+def test_report():
+    profiler = Profiler()
+    render('{{a}}{{b}}{{b}}', {'a': 1, 'b': 2}, profiler=profiler)
+    report = profiler.report(sort='calls', limit=1)
+    assert report.startswith('4 tags profiled, sorted by calls\n')
+    assert report.splitlines()[-1].startswith('        2 ')
+
+    stream = io.StringIO()
+    profiler.print_stats(stream=stream)
+    assert len(stream.getvalue().splitlines()) == 7
+
+    with pytest.raises(ValueError, match='Unknown sort key'):
+        profiler.report(sort='unknown')
+
+    profiler.clear()
+    assert not profiler.stats
+
+
+def test_render_to_profiled():
+    profiler = Profiler()
+    stream = io.StringIO()
+    compile('{{a}}').render_to(stream, {'a': 1}, profiler=profiler)
+    assert stream.getvalue() == '1'
+    assert len(profiler.stats) == 2
@@ -0,0 +1,133 @@
+import os
+from pathlib import Path
+import re
+import sys
+
+import pytest
+
+from moosetash import InvalidCacheEntry, PythonTemplate, Template, TemplateCache, compile
+from moosetash.codegen import compile_python
+from moosetash.storage import dumps, dumps_tokens, loads, loads_tokens, pack
+from moosetash.tokenizer import TOKEN_CACHE, tokenize_sections
+from moosetash.version import __version__
+
+TEMPLATES = [
+    'Hello {{name}}!',
+    '{{#items}}<{{.}}>{{/items}}{{^items}}none{{/items}}',
+    '{{=<% %>=}}<% a.b.0 %><%={{ }}=%>{{{c}}}',
+    '  {{>partial}}\n{{<parent}}{{$block}}child{{/block}}{{/parent}}',
+]
+
+
+@pytest.mark.parametrize('template', TEMPLATES)
+@pytest.mark.parametrize('compile_template', [compile, compile_python])
+def test_dumps_round_trip(template, compile_template):
+    compiled = compile_template(template)
+    loaded = loads(dumps(compiled), template)
+    assert type(loaded) is type(compiled)
+    assert loaded.source == compiled.source
+    assert loaded.nodes == compiled.nodes
+    context = {'name': 'moose', 'items': [1, 2], 'a': {'b': ['x']}, 'c': '<c>'}
+    partials = {'partial': '{{name}}\n', 'parent': '[{{$block}}{{/block}}]'}
+    assert loaded.render(context, partials=partials) == compiled.render(context, partials=partials)
+
+
+@pytest.mark.parametrize('template', TEMPLATES)
+def test_dumps_tokens_round_trip(template):
+    tokenized = tokenize_sections(template)
+    loaded = loads_tokens(dumps_tokens(template, tokenized), template)
+    assert loaded.tokens == tokenized.tokens
+    assert loaded.section_ends == tokenized.section_ends
+
+
+INVALID_CASES = [
+    (b'not a template', 'Hello', 'corrupt'),
+    (pack('Template', 'Hello', ()), 'Hello', 'corrupt'),
+    (dumps(compile('Hello')), 'Goodbye', 'different source'),
+    (dumps_tokens('Hello', tokenize_sections('Hello')), 'Hello', 'not a template'),
+]
+
+
+@pytest.mark.parametrize('data,source,message', INVALID_CASES)
+def test_loads_invalid(data, source, message):
+    with pytest.raises(InvalidCacheEntry, match=message):
+        loads(data, source)
+
+
+def test_loads_other_version(monkeypatch):
+    data = dumps(compile('Hello'))
+    monkeypatch.setattr('moosetash.storage.__version__', '0.0.1')
+    with pytest.raises(InvalidCacheEntry, match='moosetash 1'):
+        loads(data, 'Hello')
+
+
+def test_version_matches_pyproject():
+    # Serialized templates are invalidated by version, so it must change with each release
+    pyproject = (Path(__file__).parent.parent / 'pyproject.toml').read_text()
+    assert re.search(r'^version = "(.*)"$', pyproject, re.MULTILINE).group(1) == __version__
+
+
+def test_loads_other_python(monkeypatch):
+    data = dumps(compile_python('Hello'))
+    cache_tag = sys.implementation.cache_tag
+    monkeypatch.setattr('sys.implementation.cache_tag', 'other-python')
+    with pytest.raises(InvalidCacheEntry, match=f'written by {cache_tag}'):
+        loads(data, 'Hello')
+
+
+def test_loads_tokens_other_delimiters():
+    data = dumps_tokens('Hello', tokenize_sections('Hello'))
+    with pytest.raises(InvalidCacheEntry, match='different delimiters'):
+        loads_tokens(data, 'Hello', '<%', '%>')
+
+
+@pytest.mark.parametrize('template_class', [Template, PythonTemplate])
+def test_template_cache(tmp_path, template_class):
+    cache = TemplateCache(tmp_path, template_class)
+    assert cache.load('users/row', '{{name}}') is None
+
+    template = cache.get('users/row', '{{name}}')
+    assert isinstance(template, template_class)
+    assert os.listdir(tmp_path) == [
+        os.path.basename(cache.path('users/row', template_class.__name__))
+    ]
+
+    loaded = TemplateCache(tmp_path, template_class).load('users/row', '{{name}}')
+    assert loaded is not None
+    assert loaded.render({'name': 'moose'}) == 'moose'
+
+
+def test_template_cache_recompiles_stale(tmp_path):
+    cache = TemplateCache(tmp_path)
+    cache.get('page', 'old {{name}}')
+    assert cache.load('page', 'new {{name}}') is None
+    assert cache.get('page', 'new {{name}}').render({'name': 'moose'}) == 'new moose'
+    assert cache.load('page', 'new {{name}}') is not None
+
+
+def test_template_cache_ignores_corrupt_files(tmp_path):
+    cache = TemplateCache(tmp_path)
+    path = cache.path('page', 'Template')
+    with open(path, 'wb') as cache_file:
+        cache_file.write(b'corrupt')
+    assert cache.load('page', 'Hello') is None
+    assert cache.get('page', 'Hello').render({}) == 'Hello'
+
+
+def test_template_cache_tokens(tmp_path):
+    TOKEN_CACHE.clear()
+    cache = TemplateCache(tmp_path)
+    tokenized = cache.get_tokens('page', 'Hello {{name}}')
+    assert ('Hello {{name}}', '{{', '}}') in TOKEN_CACHE
+
+    TOKEN_CACHE.clear()
+    assert TemplateCache(tmp_path).get_tokens('page', 'Hello {{name}}').tokens == tokenized.tokens
+    assert ('Hello {{name}}', '{{', '}}') in TOKEN_CACHE
+
+
+def test_template_cache_rejects_unknown_classes(tmp_path):
+    class CustomTemplate(Template):
+        pass
+
+    with pytest.raises(TypeError):
+        TemplateCache(tmp_path, CustomTemplate)
@@ -0,0 +1,111 @@
+from types import GeneratorType
+import io
+import pytest
+from moosetash import compile, compile_python, render, render_iter, render_to
+from moosetash.template import StreamWriter
+
+STREAMING_CASES = [
+    ('Hello {{ variable }}!', {'variable': 'world'}, None),
+    ('{{#list}}<{{.}}>{{/list}}', {'list': [1, 2, 3]}, None),
+    ('{{#lambda}}text{{/lambda}}', {'lambda': lambda text: f'[{text}]'}, None),
+    ('[{{>partial}}]', {'name': 'partial'}, {'partial': '{{name}}\n'}),
+    ('  {{>partial}}\n', {'name': 'partial'}, {'partial': '{{name}}\n{{name}}\n'}),
+]
+
+
+@pytest.mark.parametrize('template,context,partials', STREAMING_CASES)
+def test_render_iter_matches_render(template, context, partials):
+    assert ''.join(render_iter(template, context, partials=partials)) == render(
+        template, context, partials=partials
+    )
+
+
+def test_render_iter_yields_chunks():
+    chunks = render_iter('{{#list}}<{{.}}>{{/list}}', {'list': [1, 2]})
+    assert isinstance(chunks, GeneratorType)
+    assert list(chunks) == ['<', '1', '>', '<', '2', '>']
+
+
+def test_render_iter_streams_partials():
+    chunks = render_iter('{{>partial}}!', {'value': 1}, partials={'partial': '[{{value}}]'})
+    assert list(chunks) == ['[', '1', ']', '!']
+
+
+def test_render_iter_is_lazy():
+    calls = []
+
+    def func():
+        calls.append(True)
+        return 'lambda'
+
+    chunks = render_iter('first {{func}}', {'func': func})
+    assert next(chunks) == 'first '
+    assert not calls
+    assert next(chunks) == 'lambda'
+    assert calls
+
+
+def test_render_partial_ending_with_newline():
+    assert render('{{>partial}}', {}, partials={'partial': 'line\n'}) == 'line\n'
+
+
+class RecordingStream(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+
+    def write(self, text):
+        self.writes.append(text)
+        return super().write(text)
+
+
+RENDER_TO_CASES = [
+    ('{{#list}}{{.}},{{/list}}', {'list': list(range(1, 100))}, None),
+    ('{{>partial}}{{variable}}', {'variable': '<>'}, {'partial': '{{#a}}{{.}}{{/a}}'}),
+]
+
+
+@pytest.mark.parametrize('template,context,partials', RENDER_TO_CASES)
+def test_render_to(template, context, partials):
+    stream = RecordingStream()
+    render_to(stream, template, context, partials=partials)
+    assert stream.getvalue() == render(template, context, partials=partials)
+
+
+@pytest.mark.parametrize('template,context,partials', RENDER_TO_CASES)
+def test_template_render_to(template, context, partials):
+    for compiler in [compile, compile_python]:
+        stream = RecordingStream()
+        compiler(template).render_to(stream, context, partials=partials)
+        assert stream.getvalue() == render(template, context, partials=partials)
+
+
+def test_render_to_buffers_writes():
+    stream = RecordingStream()
+    render_to(stream, '{{#list}}{{.}},{{/list}}', {'list': list(range(1, 100))}, buffer_size=50)
+    assert len(stream.writes) > 1
+    assert all(len(text) >= 50 for text in stream.writes[:-1])
+    assert ''.join(stream.writes) == ','.join(str(item) for item in range(1, 100)) + ','
+
+
+def test_render_to_options():
+    stream = RecordingStream()
+    render_to(stream, '{{variable}}', {'variable': '&'}, escape_html=False)
+    assert stream.getvalue() == '&'
+
+    stream = RecordingStream()
+    compile('{{variable}}').render_to(stream, {'variable': 1}, serializer=lambda value: 'X')
+    assert stream.getvalue() == 'X'
+
+
+def test_stream_writer():
+    stream = RecordingStream()
+    writer = StreamWriter(stream, buffer_size=4)
+    writer.append('ab')
+    assert stream.writes == []
+    writer.append('cd')
+    assert stream.writes == ['abcd']
+    writer.append('e')
+    writer.flush()
+    writer.flush()
+    assert stream.writes == ['abcd', 'e']
@@ -0,0 +1,123 @@
+from typing import Any, List, Tuple
+import pytest
+from moosetash import MustacheSyntaxError, Template, compile, render
+from moosetash.template import Node, indent, parse
+from moosetash.tokenizer import Token
+
+PARSE_CASES = [
+    ('literal', (Node(Token.LITERAL, 'literal'),)),
+    (
+        '{{ variable }}',
+        (Node(Token.VARIABLE, 'variable', '{{ variable }}', path=(('variable', None),)),),
+    ),
+    ('{{ a.0 }}', (Node(Token.VARIABLE, 'a.0', '{{ a.0 }}', path=(('a', None), ('0', 0))),)),
+    ('{{ . }}', (Node(Token.VARIABLE, '.', '{{ . }}'),)),
+    (
+        '{{#section}}{{&value}}{{/section}}',
+        (
+            Node(
+                Token.SECTION,
+                'section',
+                '{{ section }}',
+                (Node(Token.NO_ESCAPE, 'value', '{{ value }}', path=(('value', None),)),),
+                section_text='{{&value}}',
+                path=(('section', None),),
+            ),
+        ),
+    ),
+    (
+        '{{=| |=}}|^section||/section|',
+        (
+            Node(
+                Token.INVERTED,
+                'section',
+                '| section |',
+                delimiters=('|', '|'),
+                path=(('section', None),),
+            ),
+        ),
+    ),
+    ('  {{>partial}}\n', (Node(Token.PARTIAL, 'partial', '{{ partial }}', indentation='  '),)),
+]
+
+
+@pytest.mark.parametrize('template,expected', PARSE_CASES)
+def test_parse(template, expected):
+    assert parse(template) == expected
+
+
+INDENT_CASES = [
+    ('a\nb', '', 'a\nb'),
+    ('a\nb', '  ', '  a\n  b'),
+    ('a\nb\n', '  ', '  a\n  b\n'),
+]
+
+
+@pytest.mark.parametrize('template,indentation,expected', INDENT_CASES)
+def test_indent(template, indentation, expected):
+    assert indent(template, indentation) == expected
+
+
+RENDER_CASES: List[Tuple[str, Any, Any, str]] = [
+    ('Hello {{ variable }}!', {'variable': 'world'}, None, 'Hello world!'),
+    ('{{#list}}({{.}}){{/list}}', {'list': [1, 2, 3]}, None, '(1)(2)(3)'),
+    ('{{#list}}({{.}}){{/list}}', {'list': [0, 1]}, None, '(0)(1)'),
+    ('{{^list}}empty{{/list}}', {'list': []}, None, 'empty'),
+    ('{{#a}}{{#b}}{{c}}{{/b}}{{/a}}', {'a': {'b': True}, 'c': 'outer'}, None, 'outer'),
+    ('{{#lambda}}text{{/lambda}}', {'lambda': lambda text: f'<{text}>'}, None, '<text>'),
+    ('[{{>partial}}]', {'name': 'partial'}, {'partial': '{{name}}'}, '[partial]'),
+    ('{{#items}}{{>item}}{{/items}}', {'items': [1, 2]}, {'item': '{{.}},'}, '1,2,'),
+]
+
+
+@pytest.mark.parametrize('template,context,partials,expected', RENDER_CASES)
+def test_render(template, context, partials, expected):
+    assert compile(template).render(context, partials=partials) == expected
+
+
+def test_render_many_times():
+    template = compile('{{#names}}{{.}} {{/names}}')
+    assert isinstance(template, Template)
+    assert template.render({'names': ['a', 'b']}) == 'a b '
+    assert template.render({'names': ['c']}) == 'c '
+
+
+def test_render_delimiters():
+    template = compile('[ variable ]', left_delimiter='[', right_delimiter=']')
+    assert template.render({'variable': 'value'}) == 'value'
+
+
+def test_render_matches_render():
+    template = '{{#section}}\n  {{variable}}\n{{/section}}\n{{! comment }}\n{{=| |=}}|variable|'
+    context = {'section': [1, 2], 'variable': '<b>'}
+    assert compile(template).render(context) == render(template, context)
+
+
+SYNTAX_ERRORS = [
+    ('{{ variable', 'Unclosed tag on line 1'),
+    ('{{#variable}}{{/bad}}', 'Unexpected section end tag on line 1. Expected "variable" got "bad'),
+    ('\n{{/variable}}', 'Unexpected section end tag on line 2. Got "variable"'),
+    ('\n{{#section}} {{^variable}}{{/variable}}', 'Unclosed section "section" beginning on line 2'),
+    ('x\n{{#a}}\n', 'Unclosed section "a" beginning on line 2'),
+    ('x\n{{#a}}\n{{/b}}\n', 'Unexpected section end tag on line 3. Expected "a" got "b"'),
+]
+
+
+@pytest.mark.parametrize('template,expected', SYNTAX_ERRORS)
+def test_compile_syntax_error(template, expected):
+    with pytest.raises(MustacheSyntaxError, match=expected):
+        compile(template)
+
+
+def test_parse_lines():
+    nodes = parse('a\n{{#s}}\n{{b}}\n{{/s}}\nc {{d}}')
+    assert [(node.token, node.line) for node in nodes] == [
+        (Token.LITERAL, 1),
+        (Token.SECTION, 2),
+        (Token.LITERAL, 5),
+        (Token.VARIABLE, 5),
+    ]
+    assert [(node.token, node.line) for node in nodes[1].children] == [
+        (Token.VARIABLE, 3),
+        (Token.LITERAL, 3),
+    ]
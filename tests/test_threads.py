@@ -0,0 +1,130 @@
+from concurrent.futures import ThreadPoolExecutor
+import sys
+import threading
+
+import pytest
+
+from moosetash import compile, compile_python, metrics, render
+from moosetash.cache import LRUCache
+from moosetash.escaping import ESCAPE_MEMO
+from moosetash.template import LAMBDA_CACHE, PARTIAL_CACHE
+from moosetash.tokenizer import TOKEN_CACHE
+
+THREADS = 8
+ITERATIONS = 200
+
+TEMPLATE = (
+    '{{title}}\n'
+    '{{#items}}\n'
+    '  {{>row}}\n'
+    '{{/items}}\n'
+    '{{^items}}none{{/items}}'
+    '{{#bold}}{{title}}{{/bold}}\n'
+    '{{<layout}}{{$body}}{{user.name}}{{/body}}{{/layout}}'
+)
+PARTIALS = {
+    'row': '<{{name}} & {{value}}>\n',
+    'layout': '[{{$body}}default{{/body}}]',
+}
+
+
+def context(index):
+    return {
+        'title': f'Title <{index % 5}>',
+        'items': [{'name': f'item {i}', 'value': i * index} for i in range(index % 4)],
+        'bold': lambda text: f'<b>{text}</b>',
+        'user': {'name': f'user {index}'},
+    }
+
+
+RENDERERS = [
+    lambda template, context: render(template, context, partials=PARTIALS),
+    lambda template, context: render(template, context, partials=PARTIALS, cache_tokens=False),
+    lambda template, context: compile(template).render(context, partials=PARTIALS),
+    lambda template, context: compile_python(template).render(context, partials=PARTIALS),
+]
+
+
+@pytest.fixture
+def contended():
+    """Switch threads as often as possible, and shrink the shared caches so they evict"""
+    interval = sys.getswitchinterval()
+    caches = [TOKEN_CACHE, PARTIAL_CACHE, LAMBDA_CACHE]
+    limits = [(cache.maxsize, cache.max_bytes) for cache in caches]
+    escape_limits = (ESCAPE_MEMO.maxsize, ESCAPE_MEMO.max_length)
+    sys.setswitchinterval(1e-6)
+    for cache in caches:
+        cache.resize(maxsize=2)
+    ESCAPE_MEMO.resize(4)
+    yield
+    sys.setswitchinterval(interval)
+    for cache, (maxsize, max_bytes) in zip(caches, limits):
+        cache.clear()
+        cache.resize(maxsize, max_bytes)
+    ESCAPE_MEMO.resize(*escape_limits)
+
+
+def render_concurrently(task):
+    barrier = threading.Barrier(THREADS)
+
+    def worker(thread):
+        barrier.wait()
+        return [task(thread, iteration) for iteration in range(ITERATIONS)]
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        return list(executor.map(worker, range(THREADS)))
+
+
+@pytest.mark.parametrize('renderer', RENDERERS)
+def test_shared_templates_and_caches(contended, renderer):
+    # Several templates, so the token cache evicts entries other threads are using
+    templates = [f'{index}: {TEMPLATE}' for index in range(4)]
+    compiled = [compile(template) for template in templates]
+    expected = {
+        (template_index, index): compiled[template_index].render(context(index), partials=PARTIALS)
+        for template_index in range(len(templates))
+        for index in range(10)
+    }
+
+    def task(thread, iteration):
+        template_index, index = (thread + iteration) % len(templates), iteration % 10
+        return expected[template_index, index] == renderer(
+            templates[template_index], context(index)
+        )
+
+    results = render_concurrently(task)
+    assert all(all(thread_results) for thread_results in results)
+
+
+def test_shared_compiled_template(contended):
+    template = compile_python(TEMPLATE)
+    expected = [template.render(context(index), partials=PARTIALS) for index in range(10)]
+
+    def task(thread, iteration):
+        index = (thread * ITERATIONS + iteration) % 10
+        return template.render(context(index), partials=PARTIALS) == expected[index]
+
+    assert all(all(thread_results) for thread_results in render_concurrently(task))
+
+
+def test_cache_statistics_are_consistent(contended):
+    cache = LRUCache(maxsize=16)
+
+    def task(thread, iteration):
+        return cache.get_or_set((thread + iteration) % 32, lambda: iteration)
+
+    render_concurrently(task)
+    info = cache.cache_info()
+    assert info.hits + info.misses == THREADS * ITERATIONS
+    assert info.currsize <= 16
+
+
+def test_concurrent_metrics(contended):
+    sink = metrics.InMemorySink()
+    metrics.configure(sink)
+    try:
+        render_concurrently(lambda thread, iteration: render('{{a}}{{b}}', {}, name='page'))
+    finally:
+        metrics.configure(None)
+    assert sink.counter('render.count', template='page') == THREADS * ITERATIONS
+    assert sink.counter('missing_variable') == 2 * THREADS * ITERATIONS
@@ -1,5 +1,14 @@
 import pytest
-from moosetash.tokenizer import Token, find_next_pointer, find_next_tag, parse_tag, tokenize
+from moosetash.tokenizer import (
+    TOKEN_CACHE,
+    Token,
+    find_next_pointer,
+    find_section_ends,
+    find_next_tag,
+    parse_tag,
+    tokenize,
+    tokenize_cached,
+)
 
 FIND_NEXT_TAG_CASES = [
     (('PRETAGSTRING{{ }}', 0, '{{'), ('PRETAGSTRING', 12)),
@@ -15,6 +24,9 @@ def test_find_next_tag(test_input, expected):
 
 NEXT_POINTER_CASES = [
     (('{{ variable }}', 0, 14), (True, 14, 0)),
+    (('{{ variable }}\n', 0, 14), (True, 15, 0)),
+    (('{{ variable }}!', 0, 14), (False, 14, 0)),
+    (('  {{ variable }}  ', 2, 16), (True, 18, 0)),
 ]
 
 
@@ -96,3 +108,31 @@ PARSE_TAG_CASES = [
 @pytest.mark.parametrize('test_input,expected', PARSE_TAG_CASES)
 def test_parse_tag(test_input, expected):
     assert parse_tag(*test_input) == expected
+
+
+def test_tokenize_cached():
+    TOKEN_CACHE.clear()
+    tokenized = tokenize_cached('{{ variable }} LITERAL')
+    assert tokenized.tokens == tuple(tokenize('{{ variable }} LITERAL'))
+    assert tokenized.section_ends == {}
+    assert tokenize_cached('{{ variable }} LITERAL') is tokenized
+    assert tokenize_cached('{{ variable }} LITERAL', '[', ']').tokens != tokenized.tokens
+    info = TOKEN_CACHE.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 2, 2)
+    assert info.currbytes > 0
+
+
+SECTION_ENDS_CASES = [
+    ('{{#a}}{{/a}}', {0: 2}),
+    ('{{#a}}x{{^b}}y{{/b}}{{/a}}', {0: 6, 2: 5}),
+    ('{{#a}}{{#a}}{{/a}}{{/a}}', {0: 4, 1: 3}),
+    ('{{<a}}{{$a}}x{{/a}}{{/a}}', {0: 5, 1: 4}),
+    ('{{#a}}{{#b}}{{/a}}', {0: 3}),
+    ('{{#a}}{{/b}}', {}),
+    ('{{/a}}', {}),
+]
+
+
+@pytest.mark.parametrize('test_input,expected', SECTION_ENDS_CASES)
+def test_find_section_ends(test_input, expected):
+    assert find_section_ends(tuple(tokenize(test_input))) == expected
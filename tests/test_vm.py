@@ -0,0 +1,107 @@
+import pytest
+
+from moosetash import (
+    DepthLimitExceeded,
+    compile,
+    missing_variable_keep,
+    render,
+)
+from moosetash.render import MAX_DEPTH
+from moosetash.template import LAMBDA_CACHE, PARTIAL_CACHE
+
+# Templates the interpreter renders in the same loop as their partials, parents and lambdas, and
+# so the same way as the compiled renderer
+NESTED_CASES = [
+    ('{{#a}}{{>p}}{{/a}}', {'a': {'x': 1}, 'y': 2}, {'p': '{{x}}{{y}}'}),
+    ('{{#a}}{{f}}{{/a}}', {'a': {'x': 1}, 'y': 2, 'f': lambda: '{{x}}{{y}}'}, {}),
+    ('{{#a}}{{#f}}{{y}}{{/f}}{{/a}}', {'a': {'x': 1}, 'y': 2, 'f': lambda text: text}, {}),
+    ('{{#l}}[{{.}}]{{/l}}', {'l': [0, 1, '', None, False]}, {}),
+    ('{{^a}}{{.}}{{/a}}', 'context', {}),
+    ('{{>p}}', {'v': '<&>'}, {'p': '{{v}}{{{v}}}{{>q}}', 'q': '{{&v}}'}),
+    ('{{f}}|{{{f}}}', {'f': lambda: '<{{v}}>', 'v': '&'}, {}),
+    ('{{<p}}{{$b}}{{>q}}{{/b}}{{/p}}', {'v': 1}, {'p': '[{{$b}}{{/b}}]', 'q': '{{v}}'}),
+    ('{{>p}}', {}, {'p': '{{=<% %>=}}<%>q%>', 'q': '{{=| |=}}q'}),
+    ('  {{>p}}\n', {'l': [1, 2]}, {'p': '{{#l}}\n{{.}}\n{{/l}}\n'}),
+]
+
+
+@pytest.mark.parametrize('template,context,partials', NESTED_CASES)
+def test_same_as_compiled(template, context, partials):
+    assert render(template, context, partials=partials) == compile(template).render(
+        context, partials=partials
+    )
+
+
+def test_iterates_any_iterable():
+    context = {'l': ({'v': v} for v in 'ab')}
+    assert render('{{#l}}{{>p}}{{/l}}', context, partials={'p': '<{{v}}>'}) == '<a><b>'
+
+
+@pytest.mark.parametrize(
+    'template,context,partials,options,expected',
+    [
+        ('{{>p}}', {'v': '&'}, {'p': '{{v}}'}, {'escape_html': False}, '&'),
+        ('{{f}}', {'f': lambda: '{{v}}', 'v': '&'}, {}, {'escape_html': False}, '&'),
+        (
+            '{{>p}}',
+            {},
+            {'p': '{{missing}}'},
+            {'missing_variable_handler': missing_variable_keep},
+            '{{ missing }}',
+        ),
+        (
+            '{{#f}}x{{/f}}',
+            {'f': lambda text: '{{missing}}'},
+            {},
+            {'missing_variable_handler': missing_variable_keep},
+            '{{ missing }}',
+        ),
+        (
+            '{{>p}}',
+            {},
+            {'p': '{{>missing}}'},
+            {'missing_partial_handler': lambda name, tag: f'[{name}]'},
+            '[missing]',
+        ),
+        ('{{>p}}', {'v': 1}, {'p': '{{v}}'}, {'serializer': lambda value: f'[{value}]'}, '[1]'),
+    ],
+)
+def test_options_propagate(template, context, partials, options, expected):
+    assert render(template, context, partials=partials, **options) == expected
+
+
+def test_cache_tokens_propagates():
+    PARTIAL_CACHE.clear()
+    LAMBDA_CACHE.clear()
+    context = {'f': lambda: '{{v}}', 'v': 1}
+    assert render('{{>p}}{{f}}', context, partials={'p': 'p'}, cache_tokens=False) == 'p1'
+    assert len(PARTIAL_CACHE) == 0
+    assert len(LAMBDA_CACHE) == 0
+
+    assert render('{{>p}}{{f}}', context, partials={'p': 'p'}) == 'p1'
+    assert len(PARTIAL_CACHE) == 1
+    assert len(LAMBDA_CACHE) == 1
+
+
+def test_deep_nesting_does_not_recurse():
+    depth = 5000
+    partials = {f'p{index}': f'{{{{>p{index + 1}}}}}' for index in range(depth)}
+    partials[f'p{depth}'] = 'bottom'
+    assert render('{{>p0}}', {}, partials=partials, max_depth=None) == 'bottom'
+
+    with pytest.raises(DepthLimitExceeded):
+        render('{{>p0}}', {}, partials=partials)
+
+
+def test_recursive_partial_is_limited_by_default():
+    with pytest.raises(DepthLimitExceeded, match=str(MAX_DEPTH)):
+        render('{{>p}}', {}, partials={'p': '{{>p}}'})
+
+
+def test_recursive_partial_with_data():
+    partials = {'node': '{{name}}({{#children}}{{>node}}{{/children}})'}
+    context = {
+        'name': 'a',
+        'children': [{'name': 'b', 'children': [{'name': 'c', 'children': []}]}],
+    }
+    assert render('{{>node}}', context, partials=partials) == 'a(b(c()))'